@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FIWARE project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+
+
+from commons.constants import CIRCUIT_BREAKER_FAILURE_THRESHOLD, CIRCUIT_BREAKER_RESET_TIMEOUT
+from commons.watchdog import TestTimeout
+import threading
+import functools
+import time
+
+
+class CircuitOpenError(Exception):
+    """
+    Error raised instead of invoking an endpoint of a region considered unreachable (circuit breaker is open).
+    """
+
+
+class CircuitBreaker(object):
+    """
+    Breaker shared by the API clients of a region: after a number of consecutive connection failures (or timeouts,
+    including requests interrupted by the watchdog of a test) it opens, so that subsequent requests fail at once with
+    a CircuitOpenError instead of waiting for their timeout. Once a given time has elapsed, a single request is let
+    through to probe the region (half-open state): it closes the breaker on success and opens it again on failure.
+    """
+
+    STATE_CLOSED = "closed"
+    STATE_OPEN = "open"
+    STATE_HALF_OPEN = "half-open"
+
+    def __init__(self, logger, region_name, failure_threshold=CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout=CIRCUIT_BREAKER_RESET_TIMEOUT):
+        """
+        Init the breaker (closed).
+        :param logger: Logger object
+        :param region_name: FIWARE Region name
+        :param failure_threshold: Number of consecutive connection failures to open the breaker
+        :param reset_timeout: Seconds to wait since opening the breaker before probing the region
+        """
+        self.logger = logger
+        self.region_name = region_name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.STATE_CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.last_failure = None
+        self.lock = threading.Lock()
+
+    def protect(self, obj, method_name, failure_types):
+        """
+        Make the given method of an object (i.e. the one performing HTTP requests of an API client) go through the
+        breaker.
+        :param obj: Object whose method is replaced (only this instance)
+        :param method_name: Name of the method
+        :param failure_types: Tuple of exception types considered connection failures
+        :return: None
+        """
+        method = getattr(obj, method_name)
+
+        @functools.wraps(method)
+        def protected_method(*args, **kwargs):
+            return self.call(failure_types, method, *args, **kwargs)
+
+        setattr(obj, method_name, protected_method)
+
+    def call(self, failure_types, function, *args, **kwargs):
+        """
+        Invoke a function through the breaker.
+        :param failure_types: Tuple of exception types considered connection failures
+        :param function: Function to invoke
+        :return: The value returned by the function
+        """
+        self.__before_call__()
+        try:
+            value = function(*args, **kwargs)
+        except failure_types + (TestTimeout,) as e:
+            self.__on_failure__(e)
+            raise
+        except Exception:
+            self.__on_success__()
+            raise
+        except BaseException:
+            self.__on_interrupted__()
+            raise
+        self.__on_success__()
+        return value
+
+    def __before_call__(self):
+        """
+        Check whether a call is allowed, either because the breaker is closed or because it is time to probe.
+        """
+        with self.lock:
+            if self.state == self.STATE_CLOSED:
+                return
+            if self.state == self.STATE_OPEN and time.time() - self.opened_at >= self.reset_timeout:
+                self.logger.info("Probing endpoints of region %s after %d seconds", self.region_name,
+                                 self.reset_timeout)
+                self.state = self.STATE_HALF_OPEN
+                return
+        raise CircuitOpenError("Endpoints of region {0} unreachable after {1} consecutive failures "
+                               "(last one: {2})".format(self.region_name, self.failures, self.last_failure))
+
+    def __on_success__(self):
+        """
+        Close the breaker after a call reaching the region (even with an error response).
+        """
+        with self.lock:
+            if self.state != self.STATE_CLOSED:
+                self.logger.info("Endpoints of region %s reachable again", self.region_name)
+            self.state = self.STATE_CLOSED
+            self.failures = 0
+
+    def __on_interrupted__(self):
+        """
+        Neither a success nor a failure (i.e. KeyboardInterrupt): should it be probing, let the next call probe again.
+        """
+        with self.lock:
+            if self.state == self.STATE_HALF_OPEN:
+                self.state = self.STATE_OPEN
+
+    def __on_failure__(self, error):
+        """
+        Count a connection failure, opening the breaker when reaching the threshold (or when probing failed).
+        """
+        with self.lock:
+            self.failures += 1
+            self.last_failure = error
+            if self.state == self.STATE_HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.STATE_OPEN:
+                    self.logger.error("Endpoints of region %s unreachable after %d consecutive failures: "
+                                      "further requests will fail at once", self.region_name, self.failures)
+                self.state = self.STATE_OPEN
+                self.opened_at = time.time()
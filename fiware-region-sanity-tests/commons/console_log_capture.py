@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FIWARE project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+
+
+from commons.constants import LOGGING_OUTPUT_NOVA_CONSOLE_LOG_TEMPLATE, CONSOLE_LOG_POLLING_INTERVAL, \
+    CONSOLE_LOG_TAIL_LINES, CONSOLE_LOG_MAX_SIZE
+import threading
+import os
+
+CONSOLE_LOG_GAP_MARKER = "[... lines not captured ...]\n"
+CONSOLE_LOG_TRUNCATED_MARKER = "[... console log truncated at {0} bytes ...]\n"
+
+
+class ConsoleLogCapture(threading.Thread):
+    """
+    Background thread capturing the Nova console log of a server while a connectivity check waits for it (i.e. SSH
+    connection or PhoneHome request), for boot diagnostics in case the check fails. Only the tail of the console is
+    requested each time (using `length` parameter), appending to the log file the lines not yet captured, up to a
+    maximum size. The log file is kept only if the check fails; used as a context manager, that means the block
+    raised an exception (i.e. a failed assertion). Lines are only appended during the wait as long as it releases the
+    GIL (as the PhoneHome main loop does once GLib threads are initialized, see `commons/dbus_phonehome_service.py`).
+    """
+
+    def __init__(self, logger, nova_operations, region_name, server_id, polling_interval=CONSOLE_LOG_POLLING_INTERVAL,
+                 tail_lines=CONSOLE_LOG_TAIL_LINES, max_size=CONSOLE_LOG_MAX_SIZE):
+        """
+        Init the capture (to be started).
+        :param logger: Logger object
+        :param nova_operations: FiwareNovaOperations object
+        :param region_name: Name of the region
+        :param server_id: Server ID whose console log is captured
+        :param polling_interval: Seconds between requests of the console log
+        :param tail_lines: Number of lines requested from the tail of the console log each time
+        :param max_size: Maximum size (bytes) of the log file
+        """
+        threading.Thread.__init__(self, name="ConsoleLogCapture")
+        self.daemon = True
+        self.logger = logger
+        self.nova_operations = nova_operations
+        self.server_id = server_id
+        self.polling_interval = polling_interval
+        self.tail_lines = tail_lines
+        self.max_size = max_size
+        self.filename = LOGGING_OUTPUT_NOVA_CONSOLE_LOG_TEMPLATE.format(region_name=region_name.lower(),
+                                                                        server_id=server_id)
+        self.initial_size = os.path.getsize(self.filename) if os.path.isfile(self.filename) else None
+        self.last_lines = []
+        self.size = 0
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.stop(keep=exc_type is not None)
+        return False
+
+    @staticmethod
+    def get_new_lines(last_lines, lines):
+        """
+        Get the lines of the tail of the console not captured yet, i.e. those after the longest overlap between the
+        end of the lines already captured and the start of the tail.
+        :param last_lines: List of the lines of the tail of the console previously captured
+        :param lines: List of the lines of the tail of the console just requested
+        :return: Tuple with the list of new lines and whether some lines were missed in between (no overlap found)
+        """
+        for overlap in range(min(len(last_lines), len(lines)), 0, -1):
+            if last_lines[-overlap:] == lines[:overlap]:
+                return lines[overlap:], False
+        return lines, bool(last_lines and lines)
+
+    def capture(self):
+        """
+        Request the tail of the console log and append the lines not captured yet to the log file.
+        :return: True if more lines may be captured (maximum size not reached)
+        """
+        with self.lock:
+            if self.size >= self.max_size:
+                return False
+
+            output = self.nova_operations.get_nova_console_log(self.server_id, length=self.tail_lines) or ""
+            lines = output.splitlines(True)
+            if lines and not lines[-1].endswith("\n"):
+                lines.pop()  # incomplete line, to be captured once finished
+            new_lines, gap = self.get_new_lines(self.last_lines, lines)
+            if lines:
+                self.last_lines = lines
+
+            data = (CONSOLE_LOG_GAP_MARKER if gap else "") + "".join(new_lines)
+            if self.size + len(data) > self.max_size:
+                data = data[:self.max_size - self.size] + "\n" + CONSOLE_LOG_TRUNCATED_MARKER.format(self.max_size)
+            if data:
+                with open(self.filename, "a") as log_file:
+                    log_file.write(data.encode("utf-8") if isinstance(data, unicode) else data)
+                self.size += len(data)
+            return self.size < self.max_size
+
+    def run(self):
+        while not self.stopped.wait(self.polling_interval):
+            try:
+                if not self.capture():
+                    break
+            except Exception as e:
+                self.logger.debug("Could not get console log of server %s: %s", self.server_id, e)
+
+    def stop(self, keep):
+        """
+        Stop the capture, either keeping the log file (once the latest lines are captured) or removing it (just the
+        lines captured, should the file be kept by a previous capture of the same server).
+        :param keep: Whether the log file is kept (i.e. the connectivity check failed)
+        :return: None
+        """
+        self.stopped.set()
+        if self.is_alive():
+            self.join()
+        if keep:
+            try:
+                self.capture()
+            except Exception as e:
+                self.logger.debug("Could not get console log of server %s: %s", self.server_id, e)
+            if self.size:
+                self.logger.debug("Console log of server %s written to %s", self.server_id, self.filename)
+        elif self.initial_size is not None:
+            with open(self.filename, "r+") as log_file:
+                log_file.truncate(self.initial_size)
+        elif os.path.isfile(self.filename):
+            os.remove(self.filename)
@@ -53,6 +53,7 @@ PROPERTIES_CONFIG_REGION_SHARED_NET = "shared_network_name"
 PROPERTIES_CONFIG_REGION_TEST_FLAVOR = "test_flavor"
 PROPERTIES_CONFIG_REGION_TEST_IMAGE = "test_image"
 PROPERTIES_CONFIG_REGION_TEST_LOGIN_NAME = "test_login_name"
+PROPERTIES_CONFIG_REGION_TEST_BATCH_SIZE = "test_batch_size"
 PROPERTIES_CONFIG_KEY_TEST_CASES = "key_test_cases"
 PROPERTIES_CONFIG_OPT_TEST_CASES = "opt_test_cases"
 PROPERTIES_CONFIG_GLANCE = "glance_configuration"
@@ -71,6 +72,21 @@ MAX_CIDR_SUBNET_ITERATIONS = 5
 OBJECT_STORE_MAX_RETRIES = 2
 SLEEP_TIME = 5
 
+# KEYPAIR POOL (number of SSH keys generated in advance, and their size)
+KEYPAIR_POOL_SIZE = 4
+KEYPAIR_POOL_KEY_BITS = 2048
+
+# CATALOG CACHE (seconds to keep the lists of flavors and images of a region)
+CATALOG_CACHE_TTL = 300
+
+# POLLING (of server status: first interval, backoff factor, maximum interval, random jitter as a ratio of the interval,
+# and overall deadline, all in seconds)
+POLLING_INITIAL_INTERVAL = 1
+POLLING_BACKOFF_FACTOR = 1.5
+POLLING_MAX_INTERVAL = 10
+POLLING_JITTER = 0.2
+POLLING_DEADLINE = MAX_WAIT_ITERATIONS * SLEEP_TIME
+
 # TEST DATA
 DEFAULT_DNS_SERVER = "8.8.8.8"
 TEST_FLAVOR_DEFAULT = "small"
@@ -92,10 +108,55 @@ TEST_BIG_OBJECT_REMOTE = "_remote_"
 TEST_TEXT_FILE_EXTENSION = ".txt"
 TEST_BIG_FILE_EXTENSION = ".zip"
 
+# TEST SCHEDULING (resources whose availability limits the number of tests running concurrently in a region)
+RESOURCE_INSTANCES = "instances"
+RESOURCE_FLOATING_IPS = "floating_ips"
+RESOURCE_NETWORKS = "networks"
+RESOURCE_ROUTERS = "routers"
+RESOURCE_PHONEHOME = "phonehome"
+SCHEDULER_POLLING_INTERVAL = 1
+
+# TEST HISTORY (xUnit reports of previous executions, as stored by Jenkins jobs)
+HISTORY_REPORT_PATTERN = "*_{region_name}_results.xml"
+HISTORY_MAX_REPORTS = 10
+
+# DAEMON (factors of the interval between checks of a region, by its last global status, in staleness schedule)
+DAEMON_RECHECK_FACTORS = {"OK": 1.0, "POK": 0.5, "NOK": 0.25}
+
+# CIRCUIT BREAKER (consecutive connection failures to consider a region unreachable, and seconds until probing it)
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = 3
+CIRCUIT_BREAKER_RESET_TIMEOUT = 60
+
+# TOKEN CACHE (file shared by processes, unless overridden by $FIHEALTH_TOKEN_CACHE; seconds before token expiration
+# to consider it no longer valid)
+TOKEN_CACHE_DEFAULT_FILE = "~/.fihealth/token_cache.json"
+TOKEN_CACHE_EXPIRY_MARGIN = 300
+
+# TOKEN REFRESH (seconds before token expiration to refresh it in background, to check for it and to retry refresh)
+TOKEN_REFRESH_MARGIN = 600
+TOKEN_REFRESH_POLLING_INTERVAL = 60
+TOKEN_REFRESH_RETRY_INTERVAL = 30
+
+# WORK QUEUE (to distribute the regions to test among workers in several hosts; seconds between heartbeats of a
+# worker testing a region, seconds without them to consider the worker lost, attempts of a region before giving up,
+# and seconds for the coordinator to wait for all the regions)
+WORK_QUEUE_CONNECT_RETRIES = 12
+WORK_QUEUE_CONNECT_INTERVAL = 5
+WORK_QUEUE_HEARTBEAT_INTERVAL = 30
+WORK_QUEUE_HEARTBEAT_TIMEOUT = 180
+WORK_QUEUE_MAX_ATTEMPTS = 2
+WORK_QUEUE_DEADLINE = 6 * 3600
+
 # SWIFT CONSTANTS
 SWIFT_RESOURCES_PATH = "resources/swift_objects/"
 SWIFT_TMP_RESOURCES_PATH = "/tmp/swift_objects/"
 
+# NOVA CONSOLE LOG (captured while connectivity checks wait for a server, and kept only if they fail: seconds between
+# requests, lines requested from the tail of the console each time, and maximum size in bytes of each log file)
+CONSOLE_LOG_POLLING_INTERVAL = 10
+CONSOLE_LOG_TAIL_LINES = 100
+CONSOLE_LOG_MAX_SIZE = 256 * 1024
+
 # SSH CONNECTION (timeouts in seconds)
 SSH_CONNECTION_PORT = 22
 SSH_CONNECTION_TIMEOUT = 8
@@ -103,6 +164,7 @@ SSH_CONNECTION_TIMEOUT = 8
 # PHONEHOME SERVER (timeouts in seconds)
 PHONEHOME_USERDATA_PATH = "resources/templates/userdata/test.snat.phonehome.template"
 PHONEHOME_USERDATA_METADATA_PATH = "resources/templates/userdata/test.meta.phonehome.template"
+PHONEHOME_USERDATA_SHARED_PATH = "resources/templates/userdata/test.shared.phonehome.template"
 PHONEHOME_TIMEOUT = 175
 PHONEHOME_DBUS_NAME = "org.fiware.fihealth"
 PHONEHOME_DBUS_OBJECT_PATH = "/phonehome"
@@ -29,10 +29,15 @@ from dbus import SystemBus
 from dbus.exceptions import DBusException
 from dbus.service import BusName
 from dbus.mainloop.glib import DBusGMainLoop
+import dbus.mainloop.glib
 import dbus
 import gobject
 import re
 
+# Let other Python threads (concurrent tests, watchdogs, console log captures...) run while waiting in the GLib main
+# loop, which otherwise holds the GIL for the whole wait (older pygobject versions); to be done before DBusGMainLoop
+gobject.threads_init()
+dbus.mainloop.glib.threads_init()
 
 log_message_data_out_of_sequence =\
     "Received data are not for this FIWARE Node. Probably they come from another SanityCheck execution running "\
@@ -42,6 +47,8 @@ log_message_data_out_of_sequence =\
 class DbusPhoneHomeClient:
 
     expected_signal_hostname = None
+    expected_signals = None
+    signals_received = None
     mainloop = None
     data_received = None
     logger = None
@@ -87,8 +94,7 @@ class DbusPhoneHomeClient:
         if DbusPhoneHomeClient.expected_signal_hostname == hostname:
             DbusPhoneHomeClient.logger.debug("Received hostname: '%s'",
                                              DbusPhoneHomeClient.expected_signal_hostname)
-            DbusPhoneHomeClient.data_received = phonehome_http_data
-            DbusPhoneHomeClient.mainloop.quit()
+            DbusPhoneHomeClient.signal_received(PHONEHOME_SIGNAL, phonehome_http_data)
         else:
             DbusPhoneHomeClient.logger.debug(log_message_data_out_of_sequence)
 
@@ -104,11 +110,22 @@ class DbusPhoneHomeClient:
 
         if DbusPhoneHomeClient.expected_signal_hostname == hostname:
             DbusPhoneHomeClient.logger.debug("Received hostname: '%s'", hostname)
-            DbusPhoneHomeClient.data_received = phonehome_http_data
-            DbusPhoneHomeClient.mainloop.quit()
+            DbusPhoneHomeClient.signal_received(PHONEHOME_METADATA_SIGNAL, phonehome_http_data)
         else:
             DbusPhoneHomeClient.logger.debug(log_message_data_out_of_sequence)
 
+    @staticmethod
+    def signal_received(phonehome_signal, phonehome_http_data):
+        """Records the data of an expected signal. Once all expected signals are received, main loop finishes.
+        :param phonehome_signal: Signal received (either `PHONEHOME_SIGNAL` or `PHONEHOME_METADATA_SIGNAL`)
+        :param phonehome_http_data: Data the VM emitted in the signal.
+        :return: None
+        """
+        DbusPhoneHomeClient.data_received = phonehome_http_data
+        DbusPhoneHomeClient.signals_received[phonehome_signal] = phonehome_http_data
+        if DbusPhoneHomeClient.expected_signals.issubset(DbusPhoneHomeClient.signals_received):
+            DbusPhoneHomeClient.mainloop.quit()
+
     def connect_and_wait_for_phonehome_signal(self, bus_name, object_path, phonehome_signal, data_expected):
         """Connects to Bus and gets the published object (PhoneHome DBus object).
         :param bus_name: str
@@ -121,25 +138,47 @@ class DbusPhoneHomeClient:
          When received, main loop will be finished and data received from the signal will be returned.
         :return: None if signal has not been received after the timewait; Else, the content received in the signal
         """
-        DbusPhoneHomeClient.data_received = None
+        signals_received = self.connect_and_wait_for_phonehome_signals(bus_name, {object_path: phonehome_signal},
+                                                                       data_expected)
+        if signals_received is False:
+            return False
 
-        self.logger.debug("Connecting to PhoneHome DBus Service in bus '%s' and getting PhoneHome object "
-                          "with path '%s'", bus_name, object_path)
-        DbusPhoneHomeClient.expected_signal_hostname = data_expected
+        return signals_received.get(phonehome_signal)
 
-        try:
-            object = self.bus.get_object(bus_name, object_path)
-            phonehome_interface = dbus.Interface(object, bus_name)
-        except DBusException as e:
-            self.logger.error("PhoneHome bus or object not found. Please check the PhoneHome services. %s", str(e))
-            return False
+    def connect_and_wait_for_phonehome_signals(self, bus_name, phonehome_signals, data_expected):
+        """Connects to Bus and gets the published objects (PhoneHome DBus objects), waiting for several signals at
+        once (i.e. those of a VM calling home both with its hostname and its metadata).
+        :param bus_name: str
+                A bus name (either the unique name or a well-known name)
+                of the application owning the objects. PhoneHome DBus service.
+        :param phonehome_signals: Python dict with the signal to wait for, by object path of the PhoneHome Object.
+        :param data_expected: The PhoneHome client will wait for the signals with this data value.
+         When all of them are received, main loop will be finished.
+        :return: False if bus or objects were not found; Else, Python dict with the content received in each signal
+         (signals not received after the timewait are missing)
+        """
+        DbusPhoneHomeClient.data_received = None
+        DbusPhoneHomeClient.signals_received = {}
+        DbusPhoneHomeClient.expected_signals = set(phonehome_signals.values())
+        DbusPhoneHomeClient.expected_signal_hostname = data_expected
 
-        # Connect to signal
-        self.logger.debug("Connecting to signal '%s'", phonehome_signal)
-        if phonehome_signal == PHONEHOME_SIGNAL:
-            phonehome_interface.connect_to_signal(phonehome_signal, self.phonehome_signal_handler)
-        elif phonehome_signal == PHONEHOME_METADATA_SIGNAL:
-            phonehome_interface.connect_to_signal(PHONEHOME_METADATA_SIGNAL, self.phonehome_signal_handler_metadata)
+        for object_path, phonehome_signal in phonehome_signals.items():
+            self.logger.debug("Connecting to PhoneHome DBus Service in bus '%s' and getting PhoneHome object "
+                              "with path '%s'", bus_name, object_path)
+            try:
+                object = self.bus.get_object(bus_name, object_path)
+                phonehome_interface = dbus.Interface(object, bus_name)
+            except DBusException as e:
+                self.logger.error("PhoneHome bus or object not found. Please check the PhoneHome services. %s", str(e))
+                return False
+
+            # Connect to signal
+            self.logger.debug("Connecting to signal '%s'", phonehome_signal)
+            if phonehome_signal == PHONEHOME_SIGNAL:
+                phonehome_interface.connect_to_signal(phonehome_signal, self.phonehome_signal_handler)
+            elif phonehome_signal == PHONEHOME_METADATA_SIGNAL:
+                phonehome_interface.connect_to_signal(PHONEHOME_METADATA_SIGNAL,
+                                                      self.phonehome_signal_handler_metadata)
 
         # Attach to a main loop
         self.logger.debug("Creating main loop")
@@ -149,12 +188,13 @@ class DbusPhoneHomeClient:
         self.logger.debug("Setting time out to: %d", phonehome_timeout)
         gobject.timeout_add(phonehome_timeout, self.timeout, DbusPhoneHomeClient.mainloop, self.logger, priority=100)
 
-        self.logger.debug("Waiting for signal '%s' with value or header 'hostname=%s' ."
-                          " Timeout set to %s seconds", phonehome_signal, data_expected, PHONEHOME_TIMEOUT)
+        self.logger.debug("Waiting for signals %s with value or header 'hostname=%s' ."
+                          " Timeout set to %s seconds", sorted(DbusPhoneHomeClient.expected_signals), data_expected,
+                          PHONEHOME_TIMEOUT)
         DbusPhoneHomeClient.mainloop.run()
         self.logger.debug("Dbus PhoneHome Service stopped")
 
-        return DbusPhoneHomeClient.data_received
+        return DbusPhoneHomeClient.signals_received
 
 
 class DbusPhoneHomeObject(dbus.service.Object):
@@ -22,25 +22,23 @@
 # contact with opensource@tid.es
 
 
-from keystoneclient import session
-from keystoneclient.exceptions import ClientException as KeystoneClientException
-from keystoneclient.exceptions import ConnectionRefused as KeystoneConnectionRefused
-from keystoneclient.exceptions import RequestTimeout as KeystoneRequestTimeout
-from novaclient.exceptions import NotFound, ClientException as NovaClientException
-from novaclient.exceptions import ConnectionRefused as NovaConnectionRefused
-from neutronclient.common.exceptions import NeutronClientException
-from swiftclient.exceptions import ClientException as SwiftClientException
-from requests.exceptions import ConnectionError
 from commons.nova_operations import FiwareNovaOperations
 from commons.neutron_operations import FiwareNeutronOperations
 from commons.keystone_operations import FiwareKeystoneOperations
 from commons.swift_operations import FiwareSwiftOperations
+from commons.circuit_breaker import CircuitBreaker
+from commons.token_cache import TokenCache
+from commons.token_refresher import TokenRefresher
+from commons.keypair_pool import KeypairPool
+from commons.resource_reaper import ResourceReaper
+from commons.watchdog import Watchdog, TestTimeout
 from commons.constants import *
 from ConfigParser import ConfigParser
 from os.path import isfile, join
 from os import environ
 from os import listdir
 from StringIO import StringIO
+import threading
 import unittest
 import urlparse
 import logging
@@ -48,6 +46,7 @@ import logging.config
 import time
 import os
 import re
+import sys
 import functools
 
 
@@ -66,6 +65,20 @@ class FiwareTestCase(unittest.TestCase):
     auth_token = None
     auth_cred = {}
 
+    # Auth sessions shared by all the regions tested in this process (keyed by credentials, see `init_auth`)
+    auth_sessions = {}
+
+    # Pool of SSH keys shared by all the regions tested in this process (to create keypairs importing their public key),
+    # only started once a keypair is to be created (see `get_keypair_pool`)
+    keypair_pool = None
+    keypair_pool_lock = threading.Lock()
+
+    # Auth token the API clients were initialized with (clients are kept as long as the token is still valid)
+    clients_auth_token = None
+
+    # Circuit breaker shared by the API clients of the region (to fail at once while its endpoints are unreachable)
+    circuit_breaker = None
+
     # Test neutron networks (could be overridden)
     with_networks = False
 
@@ -75,12 +88,51 @@ class FiwareTestCase(unittest.TestCase):
     # Test data for the suite
     suite_world = {}
 
-    # Test logger
+    # Test logger (and handler writing to the log file of the region)
     logger = None
+    log_handler = None
 
     # Skip message
     skip_message = None
 
+    # Resources required by tests (dict of resource units keyed by test name pattern; could be extended by subclasses)
+    test_resources = {}
+
+    # Prerequisites of tests (lists of test names keyed by test name pattern; could be extended by subclasses)
+    test_prerequisites = {}
+
+    # Failed prerequisite of the test, if any (test will be skipped)
+    blocked_by = None
+
+    # Elapsed time of the phases of the test (seconds by phase name: 'setup', 'test' and 'teardown')
+    phase_timings = {}
+
+    # Metrics of the test (i.e. seconds until changes of status of the instances, by transition like 'BUILD->ACTIVE')
+    metrics = {}
+
+    # Time budget (seconds) of each test and of all the tests of the region, if any (could be overridden)
+    test_timeout = None
+    region_timeout = None
+
+    # Deadline of the region, according to its time budget (set on setup)
+    region_deadline = None
+
+    # Background teardown: resources of tests are released by a reaper of the region (could be overridden), in this
+    # order of world entries (by dependency: floating IPs once their servers are gone, ports -including the interfaces
+    # of routers- before routers and networks)
+    background_teardown = False
+    reaper = None
+    reaper_steps = ['servers', 'allocated_ips', 'ports', 'routers', 'networks', 'sec_groups', 'keypair_names',
+                    'containers', 'local_objects']
+
+    # World entries whose pending deletions must be finished before a test requiring each resource may start
+    reaper_resource_entries = {
+        RESOURCE_INSTANCES: ['servers'],
+        RESOURCE_FLOATING_IPS: ['allocated_ips'],
+        RESOURCE_NETWORKS: ['networks'],
+        RESOURCE_ROUTERS: ['routers']
+    }
+
     @classmethod
     def configure(cls):
         """
@@ -147,9 +199,14 @@ class FiwareTestCase(unittest.TestCase):
     @classmethod
     def init_auth(cls):
         """
-        Init an auth session, needed to execute tests
+        Init an auth session, needed to execute tests. The session (along with its connection pool and the service
+        catalog, from which clients take the endpoints of their region) is shared by all regions using the same
+        credentials, so authentication only takes place once per run, and its token is refreshed in background
+        before it expires.
         :return: The auth token retrieved
         """
+        from keystoneclient.exceptions import ClientException as KeystoneClientException, \
+            ConnectionRefused as KeystoneConnectionRefused
 
         cred_kwargs = {
             'auth_url': cls.auth_url,
@@ -158,12 +215,14 @@ class FiwareTestCase(unittest.TestCase):
         }
 
         # Currently, both v2 and v3 Identity API versions are supported
+        domain_name = None
         if cls.auth_api == 'v2.0':
             cred_kwargs['tenant_name'] = cls.auth_cred[PROPERTIES_CONFIG_CRED_TENANT_NAME]
         elif cls.auth_api == 'v3':
             cred_kwargs['project_name'] = cls.auth_cred[PROPERTIES_CONFIG_CRED_TENANT_NAME]
             cred_kwargs['user_domain_name'] = cls.auth_cred[PROPERTIES_CONFIG_CRED_USER_DOMAIN_NAME]
             cred_kwargs['project_domain_name'] = cls.auth_cred[PROPERTIES_CONFIG_CRED_PROJECT_DOMAIN_NAME]
+            domain_name = '{user_domain_name}/{project_domain_name}'.format(**cred_kwargs)
         else:
             assert False, "Identity API {} ({}) not supported".format(cls.auth_api, cls.auth_url)
 
@@ -177,33 +236,66 @@ class FiwareTestCase(unittest.TestCase):
         except (ImportError, AttributeError) as e:
             assert False, "Could not find Identity API {} Password class: {}".format(cls.auth_api, e)
 
-        # Get auth token
+        # Token cache shared by all regions and processes (unless disabled by an empty $FIHEALTH_TOKEN_CACHE)
+        token_cache_file = environ.get('FIHEALTH_TOKEN_CACHE', TOKEN_CACHE_DEFAULT_FILE)
+        token_cache = TokenCache(cls.logger, token_cache_file) if token_cache_file else None
+        token_cache_key = TokenCache.get_key(cls.auth_url, cred_kwargs['username'],
+                                             cls.auth_cred[PROPERTIES_CONFIG_CRED_TENANT_NAME], domain_name)
+
+        # Get auth token (reusing the session of other regions or previous executions, if any, which takes care of
+        # token expiration, or else the token cached by another process)
         cls.logger.debug("Getting auth token for tenant %s...", cls.tenant_id)
-        cls.auth_sess = session.Session(auth=credentials, timeout=DEFAULT_REQUEST_TIMEOUT)
+        cls.auth_sess = FiwareTestCase.auth_sessions.get(token_cache_key)
+        if cls.auth_sess is None:
+            from keystoneclient import session
+            cls.auth_sess = session.Session(auth=credentials, timeout=DEFAULT_REQUEST_TIMEOUT)
+            if token_cache:
+                token_cache.load(token_cache_key, cls.auth_sess.auth)
+            FiwareTestCase.auth_sessions[token_cache_key] = cls.auth_sess
+            on_refresh = functools.partial(token_cache.store, token_cache_key) if token_cache else None
+            TokenRefresher(cls.logger, cls.auth_sess, on_refresh=on_refresh).start()
+        cls.auth_token = None
         try:
             cls.auth_token = cls.auth_sess.get_token()
+            if token_cache:
+                token_cache.store(token_cache_key, cls.auth_sess.auth)
         except (KeystoneClientException, KeystoneConnectionRefused) as e:
             cls.logger.error("No auth token (%s): all tests will be skipped", e.message)
 
         return cls.auth_token
 
+    @classmethod
+    def get_keypair_pool(cls):
+        """
+        Get the pool of SSH keys, starting it on first use (so that runs creating no keypairs do not generate keys).
+        :return: KeypairPool object
+        """
+        with FiwareTestCase.keypair_pool_lock:
+            if FiwareTestCase.keypair_pool is None:
+                FiwareTestCase.keypair_pool = KeypairPool(cls.logger)
+        return FiwareTestCase.keypair_pool
+
     @classmethod
     def init_clients(cls, tenant_id, test_flavor, test_image):
         """
         Init the OpenStack API clients
         """
         user_id = cls.auth_cred[PROPERTIES_CONFIG_CRED_USER_ID]
+        if cls.circuit_breaker is None:
+            cls.circuit_breaker = CircuitBreaker(cls.logger, cls.region_name)
         cls.nova_operations = FiwareNovaOperations(cls.logger, cls.region_name, test_flavor, test_image,
-                                                   auth_session=cls.auth_sess)
+                                                   auth_session=cls.auth_sess,
+                                                   circuit_breaker=cls.circuit_breaker)
         cls.neutron_operations = FiwareNeutronOperations(cls.logger, cls.region_name, tenant_id,
-                                                         auth_session=cls.auth_sess)
+                                                         auth_session=cls.auth_sess,
+                                                         circuit_breaker=cls.circuit_breaker)
         cls.keystone_operations = FiwareKeystoneOperations(cls.logger, cls.region_name, tenant_id,
                                                            user_id=user_id,
                                                            auth_session=cls.auth_sess,
                                                            auth_url=cls.auth_url, auth_token=cls.auth_token)
         if cls.with_storage:
-            cls.swift_operations = FiwareSwiftOperations(cls.logger, cls.region_name, cls.auth_api,
-                                                         auth_cred=cls.auth_cred)
+            cls.swift_operations = FiwareSwiftOperations(cls.logger, cls.region_name, cls.auth_sess,
+                                                         circuit_breaker=cls.circuit_breaker)
 
     @classmethod
     def init_users(cls):
@@ -276,6 +368,10 @@ class FiwareTestCase(unittest.TestCase):
         """
         Init the world['servers'] entry (after deleting existing resources)
         """
+        from keystoneclient.exceptions import ConnectionRefused as KeystoneConnectionRefused, \
+            RequestTimeout as KeystoneRequestTimeout
+        from novaclient.exceptions import NotFound, ClientException as NovaClientException, \
+            ConnectionRefused as NovaConnectionRefused
         result = True
         if suite:
             # get pre-existing server list (ideally, empty when starting the tests)
@@ -288,21 +384,30 @@ class FiwareTestCase(unittest.TestCase):
                 cls.logger.error("init_world(), failure in Nova: failed to get server list: %s", e)
                 return False
 
-        # release resources to ensure a clean world
+        # release resources to ensure a clean world (deleting all servers first, then waiting for all of them)
+        deleted_servers = []
         for server_id in list(world['servers']):
             try:
                 # Deleting server
                 cls.nova_operations.delete_server(server_id)
-                cls.nova_operations.wait_for_task_status(server_id, 'DELETED')
+                deleted_servers.append(server_id)
             except NotFound:
                 world['servers'].remove(server_id)
                 cls.logger.debug("Deleted instance %s", server_id)
             except (NovaClientException, NovaConnectionRefused, KeystoneConnectionRefused, KeystoneRequestTimeout) as e:
                 cls.logger.error("Failed to delete server %s: %s", server_id, e)
                 result = False
+        if deleted_servers:
+            try:
+                statuses = cls.nova_operations.wait_for_servers_status(deleted_servers, 'DELETED')
+                for server_id, (status, detail) in statuses.items():
+                    if status == 'DELETED':
+                        world['servers'].remove(server_id)
+                        cls.logger.debug("Deleted instance %s", server_id)
+            except (NovaClientException, NovaConnectionRefused, KeystoneConnectionRefused, KeystoneRequestTimeout) as e:
+                cls.logger.error("Failed to wait for deletion of servers %s: %s", ', '.join(deleted_servers), e)
+                result = False
 
-        # wait after server deletion process
-        time.sleep(5)
         return result
 
     @classmethod
@@ -310,6 +415,10 @@ class FiwareTestCase(unittest.TestCase):
         """
         Init the world['sec_groups'] entry (after deleting existing resources)
         """
+        from keystoneclient.exceptions import ConnectionRefused as KeystoneConnectionRefused, \
+            RequestTimeout as KeystoneRequestTimeout
+        from novaclient.exceptions import ClientException as NovaClientException, \
+            ConnectionRefused as NovaConnectionRefused
         result = True
         if suite:
             # get pre-existing test security group list (ideally, empty when starting the tests)
@@ -338,6 +447,10 @@ class FiwareTestCase(unittest.TestCase):
         """
         Init the world['keypair_names'] entry (after deleting existing resources)
         """
+        from keystoneclient.exceptions import ConnectionRefused as KeystoneConnectionRefused, \
+            RequestTimeout as KeystoneRequestTimeout
+        from novaclient.exceptions import ClientException as NovaClientException, \
+            ConnectionRefused as NovaConnectionRefused
 
         result = True
         if suite:
@@ -366,6 +479,9 @@ class FiwareTestCase(unittest.TestCase):
         """
         Init the world['networks'] entry (after deleting existing resources)
         """
+        from keystoneclient.exceptions import ConnectionRefused as KeystoneConnectionRefused, \
+            RequestTimeout as KeystoneRequestTimeout
+        from neutronclient.common.exceptions import NeutronClientException
         result = True
 
         if suite and cls.with_networks:
@@ -395,6 +511,9 @@ class FiwareTestCase(unittest.TestCase):
         """
         Init the world['routers'] entry (after deleting existing resources)
         """
+        from keystoneclient.exceptions import ConnectionRefused as KeystoneConnectionRefused, \
+            RequestTimeout as KeystoneRequestTimeout
+        from neutronclient.common.exceptions import NeutronClientException
         result = True
         if suite and cls.with_networks:
             # get pre-existing test router list (ideally, empty when starting the tests)
@@ -422,6 +541,10 @@ class FiwareTestCase(unittest.TestCase):
         """
         Init the world['allocated_ips'] entry (after deallocating existing resources)
         """
+        from keystoneclient.exceptions import ConnectionRefused as KeystoneConnectionRefused, \
+            RequestTimeout as KeystoneRequestTimeout
+        from novaclient.exceptions import ClientException as NovaClientException, \
+            ConnectionRefused as NovaConnectionRefused
         result = True
         if suite:
             # get pre-existing allocated IP list (ideally, empty when starting the tests)
@@ -450,6 +573,9 @@ class FiwareTestCase(unittest.TestCase):
         """
         Init the world['ports'] entry (after deleting existing resources)
         """
+        from keystoneclient.exceptions import ConnectionRefused as KeystoneConnectionRefused, \
+            RequestTimeout as KeystoneRequestTimeout
+        from neutronclient.common.exceptions import NeutronClientException
         result = True
         if suite and cls.with_networks:
             # get pre-existing port list (ideally, empty when starting the tests)
@@ -490,8 +616,15 @@ class FiwareTestCase(unittest.TestCase):
         """
         Init the world['containers'] entry (after deleting existing resources)
         """
+        from keystoneclient.exceptions import ConnectionRefused as KeystoneConnectionRefused, \
+            RequestTimeout as KeystoneRequestTimeout
+        from requests.exceptions import ConnectionError
+        if not cls.with_storage:
+            return True
+
+        from swiftclient.exceptions import ClientException as SwiftClientException
         result = True
-        if suite and cls.with_storage:
+        if suite:
             # get pre-existing test containers list (ideally, empty when starting the tests)
             try:
                 container_list = cls.swift_operations.list_containers(TEST_CONTAINER_PREFIX)
@@ -545,12 +678,97 @@ class FiwareTestCase(unittest.TestCase):
 
         return result
 
+    @classmethod
+    def _get_declarations(cls, attribute, test_name):
+        """
+        Get the values declared for the given test in a class attribute (a dict keyed by test name pattern) of this
+        class and its ancestors.
+        :param attribute: Name of the class attribute
+        :param test_name: Name of the test method
+        :return: List of the values of all patterns matching the name of the test
+        """
+        declarations = []
+        for klass in reversed(cls.__mro__):
+            for pattern, value in vars(klass).get(attribute, {}).items():
+                if re.match(pattern, test_name):
+                    declarations.append(value)
+        return declarations
+
+    @classmethod
+    def get_required_resources(cls, test_name):
+        """
+        Get the resources required by the given test, adding up the units of all patterns matching its name (as
+        declared in `test_resources` attribute).
+        :param test_name: Name of the test method
+        :return: Python dict with the units of each resource required
+        """
+        demand = {}
+        for resources in cls._get_declarations('test_resources', test_name):
+            for resource, units in resources.items():
+                demand[resource] = demand.get(resource, 0) + units
+        return demand
+
+    @classmethod
+    def get_prerequisites(cls, test_name):
+        """
+        Get the tests that must not fail for the given test to be run, from all patterns matching its name (as
+        declared in `test_prerequisites` attribute).
+        :param test_name: Name of the test method
+        :return: List of test names
+        """
+        prerequisites = []
+        for names in cls._get_declarations('test_prerequisites', test_name):
+            prerequisites.extend(name for name in names if name not in prerequisites and name != test_name)
+        return prerequisites
+
+    @classmethod
+    def get_resource_capacity(cls):
+        """
+        Get the capacity of the region for the resources required by tests, that is, the units still available
+        according to the quotas of the tenant (resources with no quota are considered unlimited). Phonehome service
+        is a single resource, as concurrent requests are not supported.
+        :return: Python dict with the available units of each resource
+        """
+        from keystoneclient.exceptions import ConnectionRefused as KeystoneConnectionRefused, \
+            RequestTimeout as KeystoneRequestTimeout
+        from novaclient.exceptions import ClientException as NovaClientException, \
+            ConnectionRefused as NovaConnectionRefused
+        from neutronclient.common.exceptions import NeutronClientException
+        capacity = {RESOURCE_PHONEHOME: 1}
+        if cls.skip_message or not cls.auth_token:
+            return capacity
+
+        try:
+            limits = cls.nova_operations.get_absolute_limits()
+            for resource, max_name, used_name in [(RESOURCE_INSTANCES, 'maxTotalInstances', 'totalInstancesUsed'),
+                                                  (RESOURCE_FLOATING_IPS, 'maxTotalFloatingIps',
+                                                   'totalFloatingIpsUsed')]:
+                if limits.get(max_name, -1) >= 0:
+                    capacity[resource] = max(0, limits[max_name] - limits.get(used_name, 0))
+
+            if cls.with_networks:
+                quota = cls.neutron_operations.get_quota()
+                for resource, name, used in [(RESOURCE_NETWORKS, 'network', cls.neutron_operations.list_networks()),
+                                             (RESOURCE_ROUTERS, 'router', cls.neutron_operations.list_routers())]:
+                    if quota.get(name, -1) >= 0:
+                        capacity[resource] = max(0, quota[name] - len(used))
+        except (NovaClientException, NovaConnectionRefused, NeutronClientException, KeystoneConnectionRefused,
+                KeystoneRequestTimeout) as e:
+            cls.logger.warn("Could not get quotas of region %s (assuming unlimited resources): %s", cls.region_name, e)
+
+        cls.logger.debug("Resource capacity of region %s: %s", cls.region_name, capacity)
+        return capacity
+
     @classmethod
     def setUpClass(cls):
         """
         Setup testcase (executed before ALL tests): release resources, initialize logger and REST clients.
         """
 
+        # Clear skip message from previous executions, if any
+        cls.skip_message = None
+        cls.region_deadline = time.time() + cls.region_timeout if cls.region_timeout else None
+
         try:
 
             # Initialize logger with a new custom file handler for SanityChecks using UTC time format
@@ -564,6 +782,7 @@ class FiwareTestCase(unittest.TestCase):
             file_handler.setLevel(cls.logger_level)
 
             logging.root.addHandler(file_handler)
+            cls.log_handler = file_handler
             logging.Formatter.converter = time.gmtime
             cls.logger = logging.getLogger(LOGGING_TEST_LOGGER)
 
@@ -574,11 +793,17 @@ class FiwareTestCase(unittest.TestCase):
             test_image = cls.region_conf.get(PROPERTIES_CONFIG_REGION_TEST_IMAGE, TEST_IMAGE_DEFAULT)
             test_flavor = cls.region_conf.get(PROPERTIES_CONFIG_REGION_TEST_FLAVOR, TEST_FLAVOR_DEFAULT)
             if cls.init_auth():
-                cls.init_clients(cls.tenant_id, test_flavor, test_image)
+                if cls.auth_token != cls.clients_auth_token:
+                    cls.init_clients(cls.tenant_id, test_flavor, test_image)
+                    cls.clients_auth_token = cls.auth_token
+                else:
+                    cls.nova_operations.invalidate_catalog()
                 cls.init_users()
                 if not cls.init_world(cls.suite_world, suite=True):
                     raise Exception("Error in initialization phase: resources from previous executions not released")
                 cls.logger.debug("suite_world = %s", cls.suite_world)
+                if cls.background_teardown:
+                    cls.init_reaper()
         except Exception as ex:
             cls.logger.error("Error in initialization phase: %s", ex.message)
             cls._add_skip_message("Error in initialization phase: {0}".format(ex.message))
@@ -594,14 +819,109 @@ class FiwareTestCase(unittest.TestCase):
         else:
             cls.skip_message = message
 
+    @classmethod
+    def init_reaper(cls):
+        """
+        Init the reaper releasing the resources of tests in background (see `ResourceReaper`)
+        """
+        steps = [(entry, getattr(cls, 'reset_world_' + entry)) for entry in cls.reaper_steps]
+        cls.reaper = ResourceReaper(cls.logger, steps)
+        cls.reaper.start()
+
     @classmethod
     def tearDownClass(cls):
-        None
+        """
+        Teardown testcase (executed after ALL tests): wait for the resources of tests to be released and close the log
+        file of the region. Resources not released, if any, fail the teardown of the region (as they would fail the
+        teardown of their tests, if not released in background), so that they are reported along with test results.
+        """
+        leaks = None
+        reaper, cls.reaper = cls.reaper, None
+        if reaper:
+            leaks = reaper.stop()
+            if leaks:
+                cls.logger.error("Resources not released by tests of region %s: %s", cls.region_name, leaks)
+
+        if cls.log_handler:
+            logging.root.removeHandler(cls.log_handler)
+            cls.log_handler.close()
+            cls.log_handler = None
+
+        if leaks:
+            details = ["{0} {1}".format(name, entries) for name, entries in sorted(leaks.items())]
+            raise cls.failureException("Fails in releasing resources of tests in background: " + "; ".join(details))
+
+    def run(self, result=None):
+        """
+        Run the test, measuring the elapsed time of each of its phases (setup, test and teardown) in `phase_timings`,
+        and interrupting it (but teardown) as a failure if it exceeds either its time budget or that of the region
+        """
+        self.phase_timings = {}
+        self.metrics = {}
+        watchdog = self.__start_watchdog__()
+        phases = {'setup': 'setUp', 'test': self._testMethodName, 'teardown': 'tearDown'}
+        for phase, method_name in phases.items():
+            setattr(self, method_name, self.__timed_phase__(phase, getattr(self, method_name), watchdog))
+        try:
+            return super(FiwareTestCase, self).run(result)
+        finally:
+            if watchdog:
+                watchdog.cancel()
+            for method_name in phases.values():
+                delattr(self, method_name)
+
+    def __start_watchdog__(self):
+        """
+        Start a watchdog for the earliest deadline of the test (given its time budget and that of the region)
+        :return: The watchdog, or None if there is no deadline
+        """
+        deadlines = []
+        if self.test_timeout:
+            deadlines.append((time.time() + self.test_timeout,
+                              "Timeout: test time budget of {0} seconds exhausted".format(self.test_timeout)))
+        if self.region_deadline:
+            deadlines.append((self.region_deadline,
+                              "Timeout: region time budget of {0} seconds exhausted".format(self.region_timeout)))
+        if not deadlines:
+            return None
+
+        watchdog = Watchdog(*min(deadlines))
+        watchdog.start()
+        return watchdog
+
+    def __timed_phase__(self, phase, method, watchdog):
+        """
+        Wrap a method (a phase of the test), so that its elapsed time is kept in `phase_timings` and, unless it is the
+        teardown, it is interrupted by the watchdog (if any) as a failure
+        """
+        interruptible = watchdog and phase != 'teardown'
+
+        @functools.wraps(method)
+        def timed_method():
+            start_time = time.time()
+            try:
+                if interruptible:
+                    watchdog.arm()
+                try:
+                    return method()
+                finally:
+                    if interruptible:
+                        watchdog.disarm()
+            except TestTimeout:
+                self.logger.error("Test %s interrupted: %s", self._testMethodName, watchdog.message)
+                raise self.failureException, watchdog.message, sys.exc_info()[2]
+            finally:
+                self.phase_timings[phase] = time.time() - start_time
+
+        return timed_method
 
     def setUp(self):
         """
         Setup each single test
         """
+        if self.blocked_by:
+            self.skipTest("Blocked by {0}".format(self.blocked_by))
+
         if self.skip_message:
             self.skipTest(self.skip_message)
 
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FIWARE project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+
+
+from commons.constants import KEYPAIR_POOL_SIZE, KEYPAIR_POOL_KEY_BITS
+import threading
+import Queue
+
+
+class KeypairPool(object):
+    """
+    Pool of SSH keys generated locally by a background thread (off the critical path of tests), to be imported into
+    Nova as keypairs (only their public key), instead of having Nova generate them and then parsing their private key.
+    Keys are handed out as Paramiko PKey objects, ready to be used by `SSHClient`, and never reused.
+    """
+
+    def __init__(self, logger, size=KEYPAIR_POOL_SIZE, bits=KEYPAIR_POOL_KEY_BITS):
+        """
+        Init the pool and start generating keys.
+        :param logger: Logger object
+        :param size: Number of keys to keep ready
+        :param bits: Size of the RSA keys
+        """
+        self.logger = logger
+        self.bits = bits
+        self.keys = Queue.Queue(size)
+        self.generator = threading.Thread(target=self.__generate_keys__, name="KeypairPool")
+        self.generator.daemon = True
+        self.generator.start()
+
+    def generate_key(self):
+        """
+        Generate a new key.
+        :return: Paramiko PKey object
+        """
+        import paramiko
+        return paramiko.RSAKey.generate(self.bits)
+
+    def get(self):
+        """
+        Take a key from the pool (or generate one at once, if the pool is empty).
+        :return: Paramiko PKey object
+        """
+        try:
+            return self.keys.get_nowait()
+        except Queue.Empty:
+            self.logger.debug("Keypair pool is empty: generating a new key")
+            return self.generate_key()
+
+    @staticmethod
+    def get_public_key(pkey):
+        """
+        Get the public key of a key, as expected by Nova to import it (OpenSSH format).
+        :param pkey: Paramiko PKey object
+        :return: Public key (String)
+        """
+        return '{0} {1}'.format(pkey.get_name(), pkey.get_base64())
+
+    def __generate_keys__(self):
+        """
+        Keep the pool full (waiting while it is).
+        """
+        try:
+            while True:
+                self.keys.put(self.generate_key())
+        except Exception as e:
+            self.logger.error("Keypair pool stopped: %s", e)
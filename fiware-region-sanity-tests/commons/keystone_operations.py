@@ -21,7 +21,6 @@
 # For those usages not covered by the Apache version 2.0 License please
 # contact with opensource@tid.es
 
-from keystoneclient import client
 from commons.constants import DEFAULT_REQUEST_TIMEOUT
 
 
@@ -35,6 +34,7 @@ class FiwareKeystoneOperations:
         :param tenant_id: Tenant ID
         :param user_id: User ID
         """
+        from keystoneclient import client
 
         auth_session = kwargs.get('auth_session')
         auth_token = kwargs.get('auth_token')
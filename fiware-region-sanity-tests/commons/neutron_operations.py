@@ -22,8 +22,6 @@
 # contact with opensource@tid.es
 
 
-from neutronclient.v2_0 import client
-from neutronclient.common.exceptions import NeutronClientException
 from commons.constants import *
 import random
 
@@ -39,7 +37,10 @@ class FiwareNeutronOperations:
         :param auth_session: Keystone auth session object
         :param auth_url: Keystone auth URL (needed if no session is given)
         :param auth_token: Keystone auth token (needed if no session is given)
+        :param circuit_breaker: (Optional) Circuit breaker of the region, for requests through the auth session
         """
+        from neutronclient.v2_0 import client
+        from keystoneclient.exceptions import ConnectionError, RequestTimeout
 
         self.logger = logger
         self.tenant_id = tenant_id
@@ -47,6 +48,8 @@ class FiwareNeutronOperations:
                                     auth_url=kwargs.get('auth_url'), token=kwargs.get('auth_token'),
                                     endpoint_type='publicURL', service_type="network",
                                     region_name=region_name, timeout=DEFAULT_REQUEST_TIMEOUT)
+        if kwargs.get('circuit_breaker'):
+            kwargs['circuit_breaker'].protect(self.client.httpclient, 'request', (ConnectionError, RequestTimeout))
 
     def __build_body_create_network__(self, network_name, admin_state_up=True):
         """
@@ -120,6 +123,13 @@ class FiwareNeutronOperations:
         }
         return body
 
+    def get_quota(self):
+        """
+        Gets the quotas of the tenant.
+        :return: Python dict with quota values by resource name (i.e. 'network', 'router', 'floatingip'...)
+        """
+        return self.client.show_quota(self.tenant_id).get('quota')
+
     def create_router(self, router_name, external_network_id=None):
         """
         Creates a new Router
@@ -218,6 +228,7 @@ class FiwareNeutronOperations:
         :param cidr: Optional CIDR to use for the subnet (otherwise, one is chosen from default range)
         :return: Python dict updated with created subnet data
         """
+        from neutronclient.common.exceptions import NeutronClientException
         subnetwork_name = "sub-{network_name}".format(network_name=network_dict['name'])
         body_subnetwork = self.__build_body_create_subnetwork__(subnetwork_name=subnetwork_name,
                                                                 network_id=network_dict['id'])
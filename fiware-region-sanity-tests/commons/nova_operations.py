@@ -22,9 +22,10 @@
 # contact with opensource@tid.es
 
 
-from novaclient.v2 import client
-from commons.constants import DEFAULT_REQUEST_TIMEOUT, SLEEP_TIME, MAX_WAIT_ITERATIONS, \
-    TEST_FLAVOR_DEFAULT, TEST_IMAGE_DEFAULT, SSH_CONNECTION_PORT
+from commons.constants import DEFAULT_REQUEST_TIMEOUT, TEST_FLAVOR_DEFAULT, TEST_IMAGE_DEFAULT, SSH_CONNECTION_PORT, \
+    CATALOG_CACHE_TTL
+from commons.server_status_watcher import ServerStatusWatcher, PollingPolicy
+import threading
 import time
 import re
 
@@ -41,23 +42,69 @@ class FiwareNovaOperations:
         :param auth_session: Keystone auth session object
         :param auth_url: Keystone auth URL (needed if no session is given)
         :param auth_token: Keystone auth token (needed if no session is given)
+        :param circuit_breaker: (Optional) Circuit breaker of the region, for requests through the auth session
+        :param polling_policy: (Optional) Policy of the intervals between requests when waiting for server status
+        :param catalog_ttl: (Optional) Seconds to keep the lists of flavors and images (see `__get_catalog__`)
         """
 
+        from novaclient.v2 import client
+        from keystoneclient.exceptions import ConnectionError, RequestTimeout
+
         self.logger = logger
         self.test_image = test_image or TEST_IMAGE_DEFAULT
         self.test_flavor_regex = re.compile("(.+\.)?%s$" % (test_flavor or TEST_FLAVOR_DEFAULT))
+        self.polling_policy = kwargs.get('polling_policy') or PollingPolicy()
+        self.catalog_ttl = kwargs.get('catalog_ttl', CATALOG_CACHE_TTL)
+        self.catalog = {}
+        self.catalog_lock = threading.Lock()
         self.client = client.Client(session=kwargs.get('auth_session'),
                                     auth_url=kwargs.get('auth_url'), auth_token=kwargs.get('auth_token'),
                                     endpoint_type='publicURL', service_type="compute",
                                     region_name=region_name,
                                     timeout=DEFAULT_REQUEST_TIMEOUT)
+        if kwargs.get('circuit_breaker'):
+            kwargs['circuit_breaker'].protect(self.client.client, 'request', (ConnectionError, RequestTimeout))
+        self.status_watcher = ServerStatusWatcher(self.logger, self.client, self.polling_policy)
+
+    def get_absolute_limits(self):
+        """
+        Gets the absolute limits of the tenant (both quotas and current usage).
+        :return: Python dict with limit values by name (i.e. 'maxTotalInstances', 'totalInstancesUsed'...)
+        """
+        return dict((limit.name, limit.value) for limit in self.client.limits.get().absolute)
+
+    def invalidate_catalog(self):
+        """
+        Invalidates the cached lists of flavors and images, so that they are listed again when next required.
+        :return: None
+        """
+        with self.catalog_lock:
+            self.catalog.clear()
+
+    def __get_catalog__(self, kind, list_method):
+        """
+        Gets a list of the catalog of the region (flavors or images), shared by all the tests of the region: it is
+        only listed again when not cached or older than the TTL (concurrent callers wait for a single request).
+        :param kind: Name of the list
+        :param list_method: Function to list the items
+        :return: Tuple with a copy of the list and a Python dict with the id of the first item of each name
+        """
+        with self.catalog_lock:
+            entry = self.catalog.get(kind)
+            if entry is None or entry[0] + self.catalog_ttl <= time.time():
+                items = list_method()
+                index = {}
+                for item in items:
+                    index.setdefault(item.name, item.id)
+                entry = self.catalog[kind] = (time.time(), items, index)
+        return list(entry[1]), entry[2]
 
     def get_flavor_list(self):
         """
         Gets the list of flavors.
         :return: A list of :class:`Flavor`
         """
-        flavor_list = self.client.flavors.list()
+        flavor_list = self.__get_catalog__('flavors', self.client.flavors.list)[0]
         return flavor_list
 
     def get_any_flavor_id(self):
@@ -78,7 +125,7 @@ class FiwareNovaOperations:
         Gets the list of images.
         :return: A list of :class:`Image`
         """
-        image_list = self.client.images.list()
+        image_list = self.__get_catalog__('images', self.client.images.list)[0]
         return image_list
 
     def get_any_image_id(self):
@@ -100,11 +147,7 @@ class FiwareNovaOperations:
         :param image_name: Name of the image
         :return: Id of first image that matches the given name
         """
-        nova_img_list = self.client.images.findall(name=image_name)
-        if len(nova_img_list) != 0:
-            return nova_img_list[0].id
-        else:
-            return None
+        return self.__get_catalog__('images', self.client.images.list)[1].get(image_name)
 
     def create_security_group_and_rules(self, name):
         """
@@ -148,15 +191,16 @@ class FiwareNovaOperations:
 
         return sec_group_list
 
-    def create_keypair(self, name):
+    def create_keypair(self, name, public_key=None):
         """
-        Creates new Keypair.
+        Creates new Keypair, either generated by Nova or importing the given public key (see `KeypairPool`).
         :param name: Name of the Keypair
-        :return: Private Key generated.
+        :param public_key: Public key to import (OpenSSH format)
+        :return: Private Key generated (or the public key, if imported).
         """
-        nova_keypair = self.client.keypairs.create(name)
-        self.logger.debug("Created keypair %s", nova_keypair.name)
-        return nova_keypair.private_key
+        nova_keypair = self.client.keypairs.create(name, public_key=public_key)
+        self.logger.debug("%s keypair %s", "Imported" if public_key else "Created", nova_keypair.name)
+        return nova_keypair.public_key if public_key else nova_keypair.private_key
 
     def delete_keypair(self, name):
         """
@@ -219,6 +263,41 @@ class FiwareNovaOperations:
         self.logger.debug("Created server '%s': %s", instance_name, nova_server_response.id)
         return nova_server_response.to_dict()
 
+    def launch_instances(self, instance_name, image_id, flavor_id, count, keypair_name=None, metadata=None,
+                         userdata=None, security_group_name_list=None, network_id_list=None):
+        """
+        Launches several Service Instances at once, in a single request (either all of them are launched or none).
+        As Nova only returns the first of them, the rest are looked for by name: Nova names them after the given one
+        (adding a suffix, according to its `multi_instance_display_name_template`).
+        :param instance_name: Something to name the servers (unique, as it is the prefix of all of them).
+        :param image_id: The ImageID to boot with.
+        :param flavor_id: The FlavorID to boot onto.
+        :param count: Number of instances to launch.
+        :param keypair_name: (optional extension) name of previously created
+                      keypair to inject into the instances.
+        :param metadata: A dict of arbitrary key/value metadata to store for these servers (see `launch_instance`).
+        :param userdata: userdata file content (String)
+        :param security_group_name_list: Sec. Groups ID list to be used by the instances
+        :param network_id_list: (optional extension) an ordered list of nics to be added to each server (see
+                      `launch_instance`).
+        :return: List of ServerIDs of the launched instances
+        """
+
+        nova_server_response = self.client.servers.create(name=instance_name, image=image_id, flavor=flavor_id,
+                                                          key_name=keypair_name, meta=metadata,
+                                                          userdata=userdata,
+                                                          security_groups=security_group_name_list,
+                                                          nics=network_id_list, min_count=str(count),
+                                                          max_count=str(count))
+
+        server_list = self.client.servers.list(search_opts={'name': '^' + instance_name})
+        server_ids = [server.id for server in server_list
+                      if server.name.startswith(instance_name) and server.id != nova_server_response.id]
+        server_ids.insert(0, nova_server_response.id)
+
+        self.logger.debug("Created %d servers '%s': %s", len(server_ids), instance_name, server_ids)
+        return server_ids
+
     def get_server(self, instance_id):
         """
         Gets instance data from deployed server.
@@ -248,31 +327,35 @@ class FiwareNovaOperations:
 
         return server_list
 
-    def wait_for_task_status(self, server_id, expected_status):
+    def wait_for_task_status(self, server_id, expected_status, metrics=None):
         """
         Wait for a task status. This method will wait until the task has got the given status or 'ERROR' one.
         :param server_id: Deployed ServerID to be monitored
         :param expected_status: Expected status value
+        :param metrics: Optional Python dict to update with the changes of status observed (seconds by transition)
         :return: (Real task status at the end, Detailed reason to end waiting)
         """
-        detail = "Server NOT {} after {} seconds".format(expected_status, MAX_WAIT_ITERATIONS * SLEEP_TIME)
-        for i in range(MAX_WAIT_ITERATIONS):
-            server_data = self.get_server(server_id)
-            if server_data['status'] == expected_status:
-                detail = "Server %s" % expected_status
-                break
-            elif server_data['status'] == 'ERROR':
-                detail = server_data.get('fault', {'message': "Server NOT %s" % expected_status})['message']
-                self.logger.error(detail)
-                break
-
-            self.logger.debug("Waiting (#%d) for status %s of instance %s (current is %s)...",
-                              i + 1, expected_status, server_id, server_data['status'])
+        return self.wait_for_servers_status([server_id], expected_status, metrics)[server_id]
 
-            time.sleep(SLEEP_TIME)
-
-        self.logger.debug("Status of instance %s is %s", server_id, server_data['status'])
-        return server_data['status'], detail
+    def wait_for_servers_status(self, server_ids, expected_status, metrics=None):
+        """
+        Wait for the status of several servers at once, until each of them has got the given status or 'ERROR' one (or
+        'DELETED', also meaning not found). The watcher (see `ServerStatusWatcher`) is shared by all the concurrent
+        waits of the region, so that their servers are tracked with the same polls.
+        :param server_ids: List of deployed ServerIDs to be monitored
+        :param expected_status: Expected status value
+        :param metrics: Optional Python dict to update with the changes of status observed (seconds by transition,
+                        taking the slowest server)
+        :return: Python dict with tuples (real task status at the end, detailed reason to end waiting) by ServerID
+        """
+        for server_id in server_ids:
+            self.status_watcher.watch(server_id, expected_status)
+        results = self.status_watcher.wait(server_ids)
+        if metrics is not None:
+            for transitions in [self.status_watcher.transitions[server_id] for server_id in server_ids]:
+                for transition, elapsed_time in transitions.items():
+                    metrics[transition] = max(elapsed_time, metrics.get(transition, 0))
+        return results
 
     def allocate_ip(self, pool_name):
         """
@@ -308,11 +391,12 @@ class FiwareNovaOperations:
         """
         self.client.servers.add_floating_ip(server_id, ip_address, fixed_address=None)
 
-    def get_nova_console_log(self, server_id):
+    def get_nova_console_log(self, server_id, length=None):
         """
         This method gets the NOVA Console-Log of the given server.
         :param server_id (string): Server ID to get its console-log
+        :param length (int): Optional number of lines to get from the tail of the console-log (all of them if None)
         :return (string): console-log output
         """
 
-        return self.client.servers.get_console_output(server_id)
+        return self.client.servers.get_console_output(server_id, length=length)
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FIWARE project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+
+
+from commons.constants import DEFAULT_REQUEST_TIMEOUT, DAEMON_RECHECK_FACTORS
+from commons.results_analyzer import ResultAnalyzer
+from xml.dom import minidom
+import os.path
+import shutil
+import urllib2
+import json
+import glob
+import time
+import sys
+
+ADAPTER_RESOURCE = "sanity_tests?id={region_name}&type=region"
+CONTEXT_BROKER_RESOURCE = "updateContext"
+
+
+def move_reports_to_history(output_name, history_dir):
+    """
+    Move the reports of a previous execution (summary and xUnit report) to history, with timestamp prepended, and
+    remove the rest of them.
+    :param output_name: Basename of the report files (i.e. '<region>_results')
+    :param history_dir: Path to the history of executions
+    :return: None
+    """
+    summary_report = output_name + '.txt'
+    if history_dir and os.path.isfile(summary_report):
+        timestamp = time.strftime('%Y%m%d%H%M', time.localtime(os.path.getmtime(summary_report)))
+        history_report = os.path.join(history_dir, '{0}_{1}'.format(timestamp, output_name))
+        print "Previous report stored as {}.txt".format(history_report)
+        for ext in ['.txt', '.xml']:
+            if os.path.isfile(output_name + ext):
+                shutil.move(output_name + ext, history_report + ext)
+        for filename in glob.glob(output_name + '.*'):
+            os.remove(filename)
+
+
+def write_summary_report(conf, xunit_file, summary_file, build_number=None):
+    """
+    Write the summary report of an xUnit report (as `commons/results_analyzer.py` does).
+    :param conf: Settings as a Python dict
+    :param xunit_file: Path of the xUnit report
+    :param summary_file: Path of the summary report
+    :param build_number: Optional build number
+    :return: Python dict with the global status of each region (OK, POK or NOK)
+    """
+    stdout = sys.stdout
+    with open(summary_file, 'w') as sys.stdout:
+        try:
+            checker = ResultAnalyzer(conf, xunit_file, build_number)
+            checker.get_results()
+            checker.print_global_status()
+            checker.print_results()
+        finally:
+            sys.stdout = stdout
+    return checker.get_global_status()
+
+
+def read_last_check(conf, region, xunit_file):
+    """
+    Read the last check of a region from its xUnit report (if any), i.e. one written by a previous run of the daemon.
+    :param conf: Settings as a Python dict
+    :param region: Name of the region
+    :param xunit_file: Path of the xUnit report
+    :return: Python dict with the time of the check, the global status of the region and the duration of its tests
+             (in seconds), or None if not found
+    """
+    if not os.path.isfile(xunit_file):
+        return None
+    try:
+        stdout = sys.stdout
+        with open(os.devnull, 'w') as sys.stdout:
+            try:
+                checker = ResultAnalyzer(conf, xunit_file)
+                checker.get_results()
+            finally:
+                sys.stdout = stdout
+        duration = sum(float(testcase.getAttribute("time") or 0)
+                       for testcase in minidom.parse(xunit_file).getElementsByTagName("testcase"))
+        return dict(time=os.path.getmtime(xunit_file), status=checker.get_global_status().get(region),
+                    duration=duration)
+    except Exception as e:
+        print "Could not read last check of region {} from {}: {}".format(region, xunit_file, e)
+        return None
+
+
+def get_next_region(regions, last_checks, interval, now=None):
+    """
+    Choose the next region to check, according to the time since its last check (staleness), its last status and its
+    typical duration: regions are due once their staleness exceeds the given interval, shortened by a factor according
+    to their status (so that NOK and POK regions are checked again sooner than OK ones). Among due regions, that with
+    highest staleness relative to its interval wins, favouring shortest regions (the staleness ratio is divided by the
+    duration of the region relative to the average). Regions never checked go first.
+    :param regions: List of names of the regions
+    :param last_checks: Python dict with the last check of each region (time, status and duration)
+    :param interval: Seconds to wait before checking again an OK region
+    :param now: Current time (defaults to `time.time()`)
+    :return: Tuple with the name of the next region to check (None if no region is due) and the seconds to wait
+             until some region is due (zero if any is due now)
+    """
+    now = now or time.time()
+    durations = [check['duration'] for check in last_checks.values() if check.get('duration')]
+    average_duration = sum(durations) / len(durations) if durations else 1.0
+
+    unchecked = [region for region in regions if region not in last_checks]
+    if unchecked:
+        return min(unchecked), 0
+
+    priorities = []
+    next_due_time = None
+    for region in regions:
+        check = last_checks[region]
+        region_interval = interval * DAEMON_RECHECK_FACTORS.get(check.get('status'), 1.0)
+        due_time = check['time'] + region_interval
+        if due_time <= now:
+            relative_duration = (check.get('duration') or average_duration) / average_duration
+            priority = (now - check['time']) / max(region_interval, 1) / max(relative_duration, 0.1)
+            priorities.append((priority, region))
+        elif next_due_time is None or due_time < next_due_time:
+            next_due_time = due_time
+
+    if priorities:
+        return max(priorities)[1], 0
+    return None, next_due_time - now
+
+
+def change_status(adapter_url, region, summary_file, tx_id):
+    """
+    Change the status of a region according to the test results included in its summary report, by invoking the
+    NGSI Adapter.
+    :param adapter_url: URL of the NGSI Adapter
+    :param region: Name of the region
+    :param summary_file: Path of the summary report
+    :param tx_id: Transaction id
+    :return: True if status was changed
+    """
+    url = '{0}/{1}'.format(adapter_url, ADAPTER_RESOURCE.format(region_name=region))
+    with open(summary_file) as summary:
+        request = urllib2.Request(url, summary.read(), {'Content-Type': 'text/plain', 'txId': str(tx_id)})
+    return __send_request__(request, "Request txId={} to NGSI Adapter to change region status... ".format(tx_id))
+
+
+def update_elapsed_time(context_broker_url, region, elapsed_time):
+    """
+    Update value of `sanity_check_elapsed_time` attribute of the region in Context Broker.
+    :param context_broker_url: URL of the Context Broker
+    :param region: Name of the region
+    :param elapsed_time: Elapsed time of the execution of tests (milliseconds)
+    :return: True if attribute was updated
+    """
+    url = '{0}/{1}'.format(context_broker_url, CONTEXT_BROKER_RESOURCE)
+    payload = {
+        "contextElements": [
+            {
+                "type": "region",
+                "isPattern": "false",
+                "id": region,
+                "attributes": [
+                    {
+                        "name": "sanity_check_elapsed_time",
+                        "type": "string",
+                        "value": str(elapsed_time)
+                    }
+                ]
+            }
+        ],
+        "updateAction": "APPEND"
+    }
+    request = urllib2.Request(url, json.dumps(payload), {'Content-Type': 'application/json',
+                                                         'Accept': 'application/json'})
+    message = "Updating elapsed time in Context Broker for {}. Elapsed time: {}. ".format(region, elapsed_time)
+    return __send_request__(request, message)
+
+
+def __send_request__(request, message):
+    """
+    Send a request, printing the given message followed by its result.
+    :param request: urllib2 Request
+    :param message: Message describing the request
+    :return: True if request succeeded
+    """
+    try:
+        response = urllib2.urlopen(request, timeout=DEFAULT_REQUEST_TIMEOUT)
+        print "{}HTTP {} result from {}".format(message, response.getcode(), request.get_full_url())
+        return True
+    except (urllib2.URLError, IOError) as e:
+        print "{}Failed request to {}: {}".format(message, request.get_full_url(), e)
+        return False
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FIWARE project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+
+
+from commons.constants import SCHEDULER_POLLING_INTERVAL
+import threading
+import Queue
+
+
+class ResourceReaper(threading.Thread):
+    """
+    Background thread releasing the resources of finished tests (their worlds), so that the next tests may start
+    without waiting for deletions. Resources of each world are released in dependency order (i.e. servers before
+    their security groups and ports, router interfaces before networks and routers); tests requiring resources
+    limited by quota must wait until pending deletions of those resources are finished (see `wait_for`). Resources
+    that could not be released are kept as leaks, to be reported once the reaper is stopped.
+    """
+
+    def __init__(self, logger, steps):
+        """
+        Init the reaper (to be started).
+        :param logger: Logger object
+        :param steps: List of tuples with a world entry and the function releasing its resources (called with the
+                      world, it must remove the released ones from the entry and return False on failure), in
+                      dependency order
+        """
+        threading.Thread.__init__(self, name="ResourceReaper")
+        self.daemon = True
+        self.logger = logger
+        self.steps = steps
+        self.queue = Queue.Queue()
+        self.pending = []
+        self.leaks = {}
+        self.condition = threading.Condition()
+
+    def submit(self, world, name):
+        """
+        Submit the world of a finished test, whose resources are to be released.
+        :param world: Python dict with the resources of the test, by entry
+        :param name: Name of the test
+        :return: None
+        """
+        with self.condition:
+            self.pending.append(world)
+        self.queue.put((world, name))
+
+    def wait_for(self, entries):
+        """
+        Wait until there are no pending deletions of the given world entries (with a timeout, so that waiting is
+        interruptible).
+        :param entries: List of world entries (i.e. 'servers')
+        :return: None
+        """
+        with self.condition:
+            while any(world.get(entry) for world in self.pending for entry in entries):
+                self.condition.wait(SCHEDULER_POLLING_INTERVAL)
+
+    def release(self, world, name):
+        """
+        Release the resources of a world, step by step, recording those failed to be released as leaks.
+        :param world: Python dict with the resources of the test, by entry
+        :param name: Name of the test
+        :return: None
+        """
+        for entry, reset_world in self.steps:
+            if world.get(entry):
+                self.logger.debug("Tearing down %s of %s...", entry, name)
+                try:
+                    if not reset_world(world):
+                        self.logger.error("Fails in releasing %s in the %s", entry, name)
+                except Exception as e:
+                    self.logger.error("Fails in releasing %s in the %s: %s", entry, name, e)
+            with self.condition:
+                self.condition.notify_all()
+
+        with self.condition:
+            for entry, reset_world in self.steps:
+                if world.get(entry):
+                    self.leaks.setdefault(name, {})[entry] = list(world[entry])
+            self.pending.remove(world)
+            self.condition.notify_all()
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            self.release(*item)
+
+    def stop(self):
+        """
+        Stop the reaper, once all the worlds submitted are released (waiting with a timeout, so that it is
+        interruptible).
+        :return: Python dict with the resources not released (leaks), by test name and world entry
+        """
+        self.queue.put(None)
+        while self.is_alive():
+            self.join(SCHEDULER_POLLING_INTERVAL)
+        return self.leaks
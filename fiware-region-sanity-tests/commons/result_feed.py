@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FIWARE project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+
+
+from commons.results_analyzer import TEST_STATUS_OK, TEST_STATUS_NOT_OK, TEST_STATUS_SKIP
+from nose.plugins.base import Plugin
+from nose.pyversion import exc_to_unicode
+from unittest.case import SkipTest
+from datetime import datetime
+import socket
+import json
+import time
+import os
+import re
+
+RESULT_FEED_SOCKET_PREFIX = "unix:"
+
+
+class ResultFeed(Plugin):
+    """
+    Nose plugin writing a JSON line with the result of each test as soon as it finishes (region, test, status,
+    duration, elapsed time of the phases of the test and its metrics, if any), either appended to a file or sent to a
+    local (UNIX domain) socket, so that results are available long before the xUnit report is written.
+    """
+
+    name = 'result-feed'
+
+    # Same score as xUnit plugin (it must get errors before Skip plugin, which stops other plugins from getting skips)
+    score = 1500
+
+    def __init__(self):
+        super(ResultFeed, self).__init__()
+        self.target = None
+        self.file_descriptor = None
+        self.socket = None
+        self.start_time = None
+        self.running = False
+        self.outcome = None
+
+    def options(self, parser, env):
+        parser.add_option('--result-feed', action='store', dest='result_feed', metavar='FILE|unix:PATH',
+                          default=env.get('NOSE_RESULT_FEED'),
+                          help="Write a JSON line with the result of each test as soon as it finishes, either "
+                               "appended to FILE or sent to UNIX domain socket at PATH [NOSE_RESULT_FEED]")
+
+    def configure(self, options, conf):
+        self.conf = conf
+        self.target = options.result_feed
+        self.enabled = bool(self.target)
+
+    def begin(self):
+        if self.target.startswith(RESULT_FEED_SOCKET_PREFIX):
+            try:
+                self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.socket.connect(self.target[len(RESULT_FEED_SOCKET_PREFIX):])
+            except socket.error as e:
+                print "Could not connect to result feed socket {}: {}".format(self.target, e)
+                self.socket = None
+        else:
+            # Lines are appended with a single write, as several processes may be writing the same file
+            self.file_descriptor = os.open(self.target, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0644)
+
+    def finalize(self, result):
+        if self.socket:
+            self.socket.close()
+            self.socket = None
+        if self.file_descriptor is not None:
+            os.close(self.file_descriptor)
+            self.file_descriptor = None
+
+    def startTest(self, test):
+        self.start_time = time.time()
+        self.running = True
+        self.outcome = None
+
+    def stopTest(self, test):
+        if self.outcome:
+            self.__write_result__(test, *self.outcome)
+        self.running = False
+        self.outcome = None
+
+    def addSuccess(self, test):
+        self.__add_outcome__(test, TEST_STATUS_OK, "success", None)
+
+    def addFailure(self, test, err):
+        self.__add_outcome__(test, TEST_STATUS_NOT_OK, "failure", err)
+
+    def addError(self, test, err):
+        if issubclass(err[0], SkipTest):
+            self.__add_outcome__(test, TEST_STATUS_SKIP, "skipped", err)
+        else:
+            self.__add_outcome__(test, TEST_STATUS_NOT_OK, "error", err)
+
+    def __add_outcome__(self, test, status, outcome, err):
+        """
+        Keep the outcome of the running test until it is finished (i.e. after teardown), or write it at once if no test
+        is running (errors in the setup of the region).
+        """
+        if self.running:
+            self.outcome = status, outcome, err
+        else:
+            self.__write_result__(test, status, outcome, err)
+
+    def __write_result__(self, test, status, outcome, err):
+        """
+        Write the JSON line with the result of a test.
+        """
+        case = getattr(test, 'test', test)
+        region = getattr(case, 'region_name', None)
+        name = getattr(case, '_testMethodName', None)
+        if region is None:
+            match = re.search(r'context=(\w+)>(?::(\w+))?', test.id())
+            region, name = match.groups() if match else (None, test.id())
+        phase_timings = getattr(case, 'phase_timings', None) or {}
+        if phase_timings:
+            duration = sum(phase_timings.values())
+        else:
+            duration = time.time() - self.start_time if self.start_time else 0.0
+
+        result = {
+            "timestamp": datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+            "region": region,
+            "test": name,
+            "status": status,
+            "outcome": outcome,
+            "duration": round(duration, 3),
+            "phases": dict((phase, round(elapsed, 3)) for phase, elapsed in phase_timings.items())
+        }
+        if getattr(case, 'metrics', None):
+            result["metrics"] = case.metrics
+        if err:
+            # Error value may be already formatted by other plugins (i.e. with captured logging appended)
+            message = err[1] if isinstance(err[1], basestring) else exc_to_unicode(err[1])
+            result["message"] = message.strip().split('\n')[0]
+        line = json.dumps(result) + '\n'
+
+        if self.file_descriptor is not None:
+            os.write(self.file_descriptor, line)
+        elif self.socket:
+            try:
+                self.socket.sendall(line)
+            except socket.error as e:
+                print "Could not send result to feed socket {}: {}".format(self.target, e)
+                self.socket.close()
+                self.socket = None
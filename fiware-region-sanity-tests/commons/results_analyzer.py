@@ -121,6 +121,34 @@ class ResultAnalyzer(object):
             for result_value in self.dict[item]:
                 print "  {status}\t {name}".format(name=result_value['test_name'], status=result_value['status'])
 
+    def get_global_status(self):
+        """
+        Get the global status of each Region, according to its key and optional test cases (see
+        `print_global_status`).
+        :return: Python dict with the status of each Region (OK, POK or NOK)
+        """
+        key_test_cases_patterns = [re.compile(item) for item in self.conf[PROPERTIES_CONFIG_KEY_TEST_CASES]]
+        opt_test_cases_patterns = [re.compile(item) for item in self.conf[PROPERTIES_CONFIG_OPT_TEST_CASES]]
+        region_status = {}
+        for region, results in self.dict.iteritems():
+            key_test_cases = [
+                item for item in results
+                if any(pattern.match(item['test_name']) for pattern in key_test_cases_patterns)
+            ]
+            non_opt_test_cases = [
+                item for item in key_test_cases
+                if all(not pattern.match(item['test_name']) for pattern in opt_test_cases_patterns)
+            ]
+
+            if all(item['status'] == TEST_STATUS_OK for item in key_test_cases):
+                region_status[region] = GLOBAL_STATUS_OK
+            elif all(item['status'] == TEST_STATUS_OK for item in non_opt_test_cases):
+                region_status[region] = GLOBAL_STATUS_PARTIAL_OK
+            else:
+                region_status[region] = GLOBAL_STATUS_NOT_OK
+
+        return region_status
+
     def print_global_status(self):
         """
         This method will parse test results for each Region and will take into account whether all key and/or optional
@@ -190,22 +218,9 @@ class ResultAnalyzer(object):
         }
 
         # check status
-        key_test_cases_patterns = [re.compile(item) for item in key_test_cases]
-        opt_test_cases_patterns = [re.compile(item) for item in opt_test_cases]
-        for region, results in self.dict.iteritems():
-            key_test_cases = [
-                item for item in results
-                if any(pattern.match(item['test_name']) for pattern in key_test_cases_patterns)
-            ]
-            non_opt_test_cases = [
-                item for item in key_test_cases
-                if all(not pattern.match(item['test_name']) for pattern in opt_test_cases_patterns)
-            ]
-
-            if all(item['status'] == TEST_STATUS_OK for item in key_test_cases):
-                global_status[GLOBAL_STATUS_OK]['region_list'].append(region)
-            elif all(item['status'] == TEST_STATUS_OK for item in non_opt_test_cases):
-                global_status[GLOBAL_STATUS_PARTIAL_OK]['region_list'].append(region)
+        for region, status in self.get_global_status().iteritems():
+            if status in global_status:
+                global_status[status]['region_list'].append(region)
 
         # print status
         print "\nREGION GLOBAL STATUS"
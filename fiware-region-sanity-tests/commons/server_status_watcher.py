@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FIWARE project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+
+
+from commons.constants import POLLING_INITIAL_INTERVAL, POLLING_BACKOFF_FACTOR, POLLING_MAX_INTERVAL, POLLING_JITTER,\
+    POLLING_DEADLINE
+import threading
+import random
+import time
+
+
+class PollingPolicy(object):
+    """
+    Intervals between polls: short at first (so that fast changes are seen at once), growing exponentially up to a
+    maximum, with random jitter (so that concurrent waits do not poll in lockstep), until an overall deadline.
+    """
+
+    def __init__(self, initial_interval=POLLING_INITIAL_INTERVAL, backoff_factor=POLLING_BACKOFF_FACTOR,
+                 max_interval=POLLING_MAX_INTERVAL, jitter=POLLING_JITTER, deadline=POLLING_DEADLINE):
+        """
+        Init the policy.
+        :param initial_interval: Seconds before the second poll
+        :param backoff_factor: Factor applied to the interval after every poll
+        :param max_interval: Maximum seconds between polls
+        :param jitter: Maximum random variation of every interval, as a ratio of it
+        :param deadline: Seconds since the first poll to give up
+        """
+        self.initial_interval = initial_interval
+        self.backoff_factor = backoff_factor
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.deadline = deadline
+
+    def intervals(self):
+        """
+        Generate the seconds to wait before every poll, the last one shortened to meet the deadline (which counts
+        since the generator is first used).
+        :return: Generator of intervals
+        """
+        deadline_time = time.time() + self.deadline
+        interval = self.initial_interval
+        while True:
+            remaining = deadline_time - time.time()
+            if remaining <= 0:
+                return
+            yield min(interval * random.uniform(1 - self.jitter, 1 + self.jitter), remaining)
+            interval = min(interval * self.backoff_factor, self.max_interval)
+
+
+class ServerStatusWatcher(object):
+    """
+    Tracks the status of several servers at once, with a single request per poll (see `PollingPolicy`) listing those
+    changed since the previous one (`changes-since` filter, taking the latest `updated` time reported by Nova itself,
+    so that clock skew does not matter), until each of them gets its expected status, or the 'ERROR' or 'DELETED' ones.
+    The watcher is meant to be shared by all the tests of a region, waiting concurrently: every waiter sleeps its own
+    intervals, but polls only if no other did meanwhile. The first request lists all the servers of the tenant, and
+    the status of every server listed is kept: those watched and not found in a poll after they were watched are
+    considered 'DELETED', as are those listed later with such status. The changes of status observed are kept as
+    metrics (seconds since the server was watched, by transition, i.e. 'BUILD->ACTIVE').
+    """
+
+    def __init__(self, logger, nova_client, polling_policy=None):
+        """
+        Init the watcher.
+        :param logger: Logger object
+        :param nova_client: Nova client
+        :param polling_policy: Policy of the intervals between requests (default one, if not given)
+        """
+        self.logger = logger
+        self.nova_client = nova_client
+        self.polling_policy = polling_policy or PollingPolicy()
+        self.lock = threading.Lock()
+        self.watched = {}
+        self.watch_times = {}
+        self.watch_polls = {}
+        self.statuses = {}
+        self.faults = {}
+        self.results = {}
+        self.transitions = {}
+        self.changes_since = None
+        self.polls = 0
+
+    def watch(self, server_id, expected_status, callback=None):
+        """
+        Start tracking the status of a server.
+        :param server_id: Server ID
+        :param expected_status: Expected status value
+        :param callback: Optional function called once the server gets its expected status (or 'ERROR', 'DELETED', or
+                         the maximum wait is exceeded), with the server ID, its status and the detailed reason
+        :return: None
+        """
+        with self.lock:
+            self.watched[server_id] = (expected_status, callback)
+            self.watch_times[server_id] = time.time()
+            self.watch_polls[server_id] = self.polls
+            self.results.pop(server_id, None)
+            self.transitions[server_id] = {}
+
+    def poll(self):
+        """
+        List the servers changed since the previous request (all of them, in the first one) and resolve those watched
+        that got their expected status, or 'ERROR' or 'DELETED'.
+        :return: Python dict with tuples (status, detail) of the servers resolved by this poll, by server ID
+        """
+        with self.lock:
+            return self.__poll__()
+
+    def wait(self, server_ids=None):
+        """
+        Poll until the given watched servers are resolved, or the deadline of the polling policy is exceeded (then, the
+        remaining ones are resolved with their last known status). Polls by other waiters meanwhile are taken instead
+        of making new requests.
+        :param server_ids: IDs of the watched servers to wait for (all of them, if not given)
+        :return: Python dict with tuples (status, detail) of the given servers, by server ID
+        """
+        with self.lock:
+            server_ids = set(self.watched if server_ids is None else server_ids)
+            last_poll = min([self.polls] + [self.watch_polls[server_id] for server_id in server_ids])
+        try:
+            for i, interval in enumerate(self.polling_policy.intervals()):
+                with self.lock:
+                    if self.polls == last_poll:
+                        self.__poll__()
+                    last_poll = self.polls
+                    pending = sorted(server_id for server_id in server_ids if server_id not in self.results)
+                    if not pending:
+                        break
+                    self.logger.debug("Waiting (#%d) for status of instances %s (current is %s)...", i + 1,
+                                      ', '.join(pending),
+                                      ', '.join(str(self.statuses.get(server_id)) for server_id in pending))
+                time.sleep(interval)
+        except BaseException:
+            # stop tracking the servers of this waiter, so that later polls by others do not keep them
+            with self.lock:
+                for server_id in server_ids:
+                    self.watched.pop(server_id, None)
+                    self.results.pop(server_id, None)
+            raise
+
+        with self.lock:
+            for server_id in server_ids:
+                if server_id not in self.results and server_id in self.watched:
+                    expected_status, callback = self.watched[server_id]
+                    detail = "Server NOT {} after {} seconds".format(expected_status, self.polling_policy.deadline)
+                    self.__resolve__(server_id, self.statuses.get(server_id), detail)
+            return dict((server_id, self.results.pop(server_id)) for server_id in server_ids)
+
+    def __poll__(self):
+        """
+        Make a poll (see `poll`), with the lock already held.
+        """
+        search_opts = {'changes-since': self.changes_since} if self.changes_since else {}
+        servers = dict((server.id, server.to_dict())
+                       for server in self.nova_client.servers.list(detailed=True, search_opts=search_opts))
+        self.polls += 1
+        if servers:
+            self.changes_since = max([self.changes_since] + [data.get('updated') for data in servers.values()])
+
+        changed = {}
+        for server_id, data in servers.items():
+            changed[server_id] = (self.statuses.get(server_id), data['status'])
+            self.statuses[server_id] = data['status']
+            if data['status'] == 'ERROR':
+                self.faults[server_id] = data.get('fault', {}).get('message')
+
+        resolved = {}
+        for server_id, (expected_status, callback) in self.watched.items():
+            if server_id not in self.statuses and self.polls > self.watch_polls[server_id]:
+                changed[server_id] = (None, 'DELETED')
+                self.statuses[server_id] = 'DELETED'
+            previous_status, status = changed.get(server_id, (None, self.statuses.get(server_id)))
+            if previous_status and status != previous_status:
+                self.__add_transition__(server_id, previous_status, status)
+            if status == expected_status:
+                resolved[server_id] = (status, "Server %s" % expected_status)
+            elif status == 'ERROR':
+                detail = self.faults.get(server_id) or "Server NOT %s" % expected_status
+                self.logger.error(detail)
+                resolved[server_id] = (status, detail)
+            elif status == 'DELETED':
+                detail = "Server NOT %s (deleted or not found)" % expected_status
+                self.logger.error(detail)
+                resolved[server_id] = (status, detail)
+
+        for server_id, (status, detail) in resolved.items():
+            self.__resolve__(server_id, status, detail)
+        return resolved
+
+    def __add_transition__(self, server_id, previous_status, status):
+        """
+        Keep the time a change of status of a server was observed (seconds since it was watched).
+        """
+        elapsed_time = time.time() - self.watch_times[server_id]
+        self.transitions[server_id]['{}->{}'.format(previous_status, status)] = round(elapsed_time, 3)
+        self.logger.debug("Instance %s changed from %s to %s after %.1f seconds", server_id, previous_status, status,
+                          elapsed_time)
+
+    def __resolve__(self, server_id, status, detail):
+        """
+        Stop tracking a server, keeping its result for the waiter and calling its callback (if any).
+        """
+        expected_status, callback = self.watched.pop(server_id)
+        self.results[server_id] = (status, detail)
+        self.logger.debug("Status of instance %s is %s", server_id, status)
+        if callback:
+            callback(server_id, status, detail)
@@ -22,8 +22,6 @@
 # contact with opensource@tid.es
 
 from commons.constants import *
-import paramiko
-from paramiko import AuthenticationException
 import StringIO
 import socket
 import time
@@ -40,7 +38,7 @@ class SSHClient:
         :param logger: Logger object
         :param host: Server host name or IP (String)
         :param username: Username (String)
-        :param private_key: RSA private key (String)
+        :param private_key: RSA private key (either String or an already parsed Paramiko PKey object)
         :return: None
         """
 
@@ -50,7 +48,10 @@ class SSHClient:
         self.private_key = private_key
 
         self.logger.debug("Initiating SSH Client. Host: %s, Username: %s", self.host, self.username)
-        self.pkey = self.__generate_pkey_from_string__(self.private_key)
+        if isinstance(private_key, basestring):
+            self.pkey = self.__generate_pkey_from_string__(self.private_key)
+        else:
+            self.pkey = private_key
 
     @staticmethod
     def __generate_pkey_from_string__(private_key):
@@ -59,6 +60,7 @@ class SSHClient:
         :param private_key: Private key (String)
         :return: Paramiko PKey object
         """
+        import paramiko
 
         private_key_stream = StringIO.StringIO(private_key)
         pkey = paramiko.RSAKey.from_private_key(private_key_stream)
@@ -71,6 +73,7 @@ class SSHClient:
         Tries to connect (SSH) to the given HOST, username and private key, to port 22
         :return: None
         """
+        import paramiko
 
         self.logger.debug("Trying SSH connection to '%s'. Time out set to: %d", self.host, SSH_CONNECTION_TIMEOUT)
         self.ssh_client = paramiko.SSHClient()
@@ -83,6 +86,7 @@ class SSHClient:
         Tries to connect and retry MAX_WAIT_SSH_CONNECT_ITERATIONS times if a socket error is raised
         :return: None
         """
+        from paramiko import AuthenticationException
 
         self.logger.debug("Trying to establish a SSH connection to VM %s. Max. retries: %d", self.host,
                           MAX_WAIT_SSH_CONNECT_ITERATIONS)
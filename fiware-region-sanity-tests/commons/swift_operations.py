@@ -22,58 +22,82 @@
 # contact with opensource@tid.es
 
 
-from swiftclient import client
 from commons.constants import DEFAULT_REQUEST_TIMEOUT, OBJECT_STORE_MAX_RETRIES, SERVICE_SWIFT_NAME,\
-    ENDPOINT_TYPE_PUBLIC_URL, PROPERTIES_CONFIG_CRED_KEYSTONE_URL,\
-    PROPERTIES_CONFIG_CRED_USERNAME, PROPERTIES_CONFIG_CRED_PASSWORD, PROPERTIES_CONFIG_CRED_TENANT_ID,\
-    PROPERTIES_CONFIG_CRED_USER_DOMAIN_NAME, PROPERTIES_CONFIG_CRED_PROJECT_DOMAIN_NAME
-
-import keystoneclient.v2_0.client as keystoneClient
-import keystoneclient.v3.client as keystoneclientv3
+    ENDPOINT_TYPE_PUBLIC_URL
+import functools
 
 
 class FiwareSwiftOperations:
 
-    # TODO import keystoneclient dynamically from api version.
-    # TODO Session is not taken from kwargs because swiftclient does not support it yet. It is needed auth credentials
-
-    def __init__(self, logger, region_name, auth_api, **kwargs):
+    def __init__(self, logger, region_name, auth_session, **kwargs):
         """
-        Initializes Swift-Client.
+        Initializes Swift-Client. As swiftclient does not support Keystone sessions yet, the endpoint and the token
+        of the connection are taken from the given auth session (instead of authenticating again), and taken again
+        once the session renews its token or Swift rejects it.
         :param logger: Logger object
         :param region_name: FIWARE Region name
-        :param auth_api: Authentication API version
-        :param kwargs: Keystone credentials
+        :param auth_session: Keystone auth session object
+        :param kwargs: (Optional) circuit breaker of the region
         """
+        from swiftclient import client
+        from requests.exceptions import ConnectionError, Timeout
+        from socket import error as SocketError
+
         self.region_name = region_name
+        self.auth_session = auth_session
 
         self.logger = logger
-        if auth_api == 'v2.0':
-            self.keystone_client = keystoneClient.Client(
-                auth_url=kwargs.get('auth_cred')[PROPERTIES_CONFIG_CRED_KEYSTONE_URL],
-                username=kwargs.get('auth_cred')[PROPERTIES_CONFIG_CRED_USERNAME],
-                password=kwargs.get('auth_cred')[PROPERTIES_CONFIG_CRED_PASSWORD],
-                tenant_id=kwargs.get('auth_cred')[PROPERTIES_CONFIG_CRED_TENANT_ID])
-        elif auth_api == 'v3':
-            self.keystone_client = keystoneclientv3.Client(
-                auth_url=kwargs.get('auth_cred')[PROPERTIES_CONFIG_CRED_KEYSTONE_URL],
-                username=kwargs.get('auth_cred')[PROPERTIES_CONFIG_CRED_USERNAME],
-                password=kwargs.get('auth_cred')[PROPERTIES_CONFIG_CRED_PASSWORD],
-                user_domain_name=kwargs.get('auth_cred')[PROPERTIES_CONFIG_CRED_USER_DOMAIN_NAME],
-                project_domain_name=kwargs.get('auth_cred')[PROPERTIES_CONFIG_CRED_PROJECT_DOMAIN_NAME])
-
-        object_store_url = self.keystone_client.service_catalog.url_for(service_type=SERVICE_SWIFT_NAME,
-                                                                        endpoint_type=ENDPOINT_TYPE_PUBLIC_URL,
-                                                                        region_name=self.region_name)
-
-        self.logger.info("Getting object_store_url from Keystone: %s", object_store_url)
-
         self.client = client.Connection(
-            preauthurl=object_store_url,
-            preauthtoken=self.keystone_client.auth_token,
             retries=OBJECT_STORE_MAX_RETRIES,
             max_backoff=DEFAULT_REQUEST_TIMEOUT,
             insecure=True)
+        self.client.url, self.client.token = self.__get_auth__()
+        self.client.get_auth = self.__get_auth__
+        self.client._retry = self.__with_session_token__(self.client._retry, client.ClientException)
+
+        # All requests go through `_retry()` (connection failures are raised once retries are exhausted)
+        if kwargs.get('circuit_breaker'):
+            kwargs['circuit_breaker'].protect(self.client, '_retry', (SocketError, ConnectionError, Timeout))
+
+    def __get_auth__(self):
+        """
+        Get the object store URL of the region and the token of the auth session (replaces `get_auth()` of the
+        swiftclient connection).
+        :return: Tuple with the URL and the token
+        """
+        from keystoneclient.exceptions import EndpointNotFound
+        object_store_url = self.auth_session.get_endpoint(service_type=SERVICE_SWIFT_NAME,
+                                                          interface=ENDPOINT_TYPE_PUBLIC_URL,
+                                                          region_name=self.region_name)
+        if not object_store_url:
+            raise EndpointNotFound("No {} endpoint found for region {}".format(SERVICE_SWIFT_NAME, self.region_name))
+        self.logger.info("Getting object_store_url from Keystone: %s", object_store_url)
+        return object_store_url, self.auth_session.get_token()
+
+    def __with_session_token__(self, retry_method, client_exception_type):
+        """
+        Wrap `_retry()` of the swiftclient connection, so that requests use the current token of the auth session,
+        and they are retried once with a new token if Swift rejects the current one (HTTP 401).
+        :param retry_method: Original method
+        :param client_exception_type: Type of swiftclient errors
+        :return: Wrapped method
+        """
+        @functools.wraps(retry_method)
+        def retry_with_session_token(*args, **kwargs):
+            if self.client.token and self.client.token != self.auth_session.get_token():
+                self.logger.debug("Token of the auth session renewed: using it for object storage requests")
+                self.client.url = self.client.token = None
+            try:
+                return retry_method(*args, **kwargs)
+            except client_exception_type as e:
+                if e.http_status != 401:
+                    raise
+                self.logger.debug("Token rejected by object storage: getting a new one")
+                self.auth_session.invalidate()
+                self.client.url = self.client.token = None
+                return retry_method(*args, **kwargs)
+
+        return retry_with_session_token
 
     def list_containers(self, name_prefix=None):
         """
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FIWARE project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+
+
+from commons.constants import SCHEDULER_POLLING_INTERVAL
+import threading
+import logging
+import Queue
+import time
+
+
+class ScheduledTask(object):
+    """
+    A test to be run by the scheduler, along with the resources it requires.
+    """
+
+    def __init__(self, name, demand, test, prerequisites=None):
+        """
+        Init the task.
+        :param name: Name of the task (i.e. test method name)
+        :param demand: Python dict with the units of each resource required by the task
+        :param test: The test object itself
+        :param prerequisites: List of names of the tasks that must succeed before running this one
+        """
+        self.name = name
+        self.demand = demand
+        self.test = test
+        self.prerequisites = prerequisites or []
+        self.blocked_by = None
+        self.passed = None
+
+
+class TestEventRecorder(object):
+    """
+    Test result recording the events of a test run in a worker thread, to be later replayed on the actual result
+    (neither results nor nose plugins are thread-safe).
+    """
+
+    class ThreadLogHandler(logging.Handler):
+        """
+        Handler keeping the log records emitted from a given thread (and from those helping it, see `adopt`).
+        """
+
+        def __init__(self, records):
+            logging.Handler.__init__(self)
+            self.records = records
+            self.thread_ids = set([threading.current_thread().ident])
+
+        def emit(self, record):
+            if record.thread in self.thread_ids:
+                self.records.append(record)
+
+        @classmethod
+        def adopt(cls, parent_thread_id):
+            """
+            Keep the log records of the current thread (i.e. a helper of a test) along with those of the given one, in
+            every handler of the latter.
+            :param parent_thread_id: Identifier of the thread (i.e. the one running the test)
+            :return: None
+            """
+            for handler in logging.root.handlers:
+                if isinstance(handler, cls) and parent_thread_id in handler.thread_ids:
+                    handler.thread_ids.add(threading.current_thread().ident)
+
+    def __init__(self):
+        self.events = []
+        self.log_records = []
+        self.log_handler = None
+        self.start_time = None
+        self.stop_time = None
+
+    def startTest(self, test):
+        self.start_time = time.time()
+        self.events.append(('startTest', (test,)))
+        self.log_handler = self.ThreadLogHandler(self.log_records)
+        logging.root.addHandler(self.log_handler)
+
+    def stopTest(self, test):
+        logging.root.removeHandler(self.log_handler)
+        self.stop_time = time.time()
+        self.events.append(('stopTest', (test,)))
+
+    def addSuccess(self, test):
+        self.events.append(('addSuccess', (test,)))
+
+    def addFailure(self, test, err):
+        self.events.append(('addFailure', (test, err)))
+
+    def addError(self, test, err):
+        self.events.append(('addError', (test, err)))
+
+    def addSkip(self, test, reason):
+        self.events.append(('addSkip', (test, reason)))
+
+    def addExpectedFailure(self, test, err):
+        self.events.append(('addExpectedFailure', (test, err)))
+
+    def addUnexpectedSuccess(self, test):
+        self.events.append(('addUnexpectedSuccess', (test,)))
+
+    @property
+    def passed(self):
+        """
+        Whether the recorded test did not fail (that is, it either succeeded or was skipped).
+        :return: Boolean
+        """
+        return not any(method in ['addFailure', 'addError', 'addUnexpectedSuccess'] for method, args in self.events)
+
+    @property
+    def duration(self):
+        """
+        Elapsed time of the recorded test run.
+        :return: Seconds (float)
+        """
+        return (self.stop_time or time.time()) - (self.start_time or time.time())
+
+    def replay(self, result):
+        """
+        Reports the recorded outcomes to the given result.
+        :param result: Test result
+        :return: None
+        """
+        for method, args in self.events:
+            getattr(result, method)(*args)
+
+
+class RegionTestScheduler(object):
+    """
+    Runs the tests of a region, up to a given number of them at the same time, while making sure the resources required
+    by the tests being run (instances, floating IPs, networks...) do not exceed the capacity of the region.
+    """
+
+    def __init__(self, logger, concurrency, capacity):
+        """
+        Init the scheduler.
+        :param logger: Logger
+        :param concurrency: Maximum number of tests running at the same time
+        :param capacity: Python dict with the available units of each resource (missing resources are unlimited)
+        """
+        self.logger = logger
+        self.concurrency = max(1, concurrency)
+        self.available = dict(capacity)
+
+    def fits(self, demand):
+        """
+        Checks whether the given resource demand fits in current capacity.
+        :param demand: Python dict with the units of each resource required
+        :return: True if all resources are available
+        """
+        return all(units <= self.available.get(resource, units) for resource, units in demand.items())
+
+    def acquire(self, demand):
+        for resource, units in demand.items():
+            if resource in self.available:
+                self.available[resource] -= units
+
+    def release(self, demand):
+        for resource, units in demand.items():
+            if resource in self.available:
+                self.available[resource] += units
+
+    def find_blocker(self, task, finished_tasks):
+        """
+        Finds a prerequisite of the task that failed (or was blocked itself).
+        :param task: ScheduledTask
+        :param finished_tasks: Python dict of finished tasks by name
+        :return: Name of the blocking prerequisite, or None
+        """
+        for name in task.prerequisites:
+            prerequisite = finished_tasks.get(name)
+            if prerequisite and (prerequisite.blocked_by or not prerequisite.passed):
+                return name
+        return None
+
+    def run(self, tasks, execute, completed):
+        """
+        Runs the given tasks, in order as long as their prerequisites are finished and their required resources are
+        available (thus a task may be started before others waiting). Tasks whose prerequisites failed are marked as
+        blocked (`blocked_by` attribute) and run at once, as they are expected to be skipped. In case no task could
+        be started while none is running (i.e. not enough resources at all, or prerequisites in a cycle), the first
+        one is started anyway, so that none waits forever.
+        :param tasks: List of ScheduledTask, in preferred order
+        :param execute: Function to run a task, called from a worker thread (unless concurrency is 1)
+        :param completed: Function called from this thread once a task is finished, with the task and the value
+                          returned by `execute`; it must return whether the task passed (i.e. its dependents may run)
+        :return: None
+        """
+        pending = list(tasks)
+        names = set(task.name for task in pending)
+        finished_tasks = {}
+        finished = Queue.Queue()
+        running = []
+        while pending or running:
+            ready = [task for task in pending if all(name not in names or name in finished_tasks
+                                                     for name in task.prerequisites)]
+            for task in ready:
+                if len(running) >= self.concurrency:
+                    break
+                task.blocked_by = self.find_blocker(task, finished_tasks)
+                if task.blocked_by:
+                    task.demand = {}
+                elif not self.fits(task.demand):
+                    self.logger.debug("Test %s waits for resources %s (available: %s)", task.name, task.demand,
+                                      self.available)
+                    continue
+                self.__start__(task, execute, finished, pending, running)
+
+            if not running:
+                task = (ready or pending)[0]
+                task.blocked_by = self.find_blocker(task, finished_tasks)
+                self.logger.warn("Test %s started without all its resources or prerequisites", task.name)
+                self.__start__(task, execute, finished, pending, running)
+
+            task, value = self.__wait_for_any__(finished)
+            running.remove(task)
+            self.release(task.demand)
+            task.passed = completed(task, value)
+            finished_tasks[task.name] = task
+
+    def __start__(self, task, execute, finished, pending, running):
+        """
+        Starts a task, either in a new worker thread or in this very thread (if concurrency is 1).
+        """
+        pending.remove(task)
+        running.append(task)
+        self.acquire(task.demand)
+        self.logger.debug("Starting test %s (%d running)", task.name, len(running))
+        if self.concurrency == 1:
+            self.__execute__(task, execute, finished)
+        else:
+            worker = threading.Thread(target=self.__execute__, args=(task, execute, finished), name=task.name)
+            worker.daemon = True
+            worker.start()
+
+    def __execute__(self, task, execute, finished):
+        """
+        Runs a task in the current (worker) thread and notifies once finished.
+        """
+        value = None
+        try:
+            value = execute(task)
+        except Exception as e:
+            self.logger.error("Unexpected error running test %s: %s", task.name, e)
+        finally:
+            finished.put((task, value))
+
+    @staticmethod
+    def __wait_for_any__(finished):
+        """
+        Waits until any of the running tasks is finished (using a timeout, so that waiting is interruptible).
+        :return: Tuple with the finished task and the value returned by its execution
+        """
+        while True:
+            try:
+                return finished.get(True, SCHEDULER_POLLING_INTERVAL)
+            except Queue.Empty:
+                pass
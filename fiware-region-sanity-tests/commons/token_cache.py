@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FIWARE project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+
+
+from commons.constants import TOKEN_CACHE_EXPIRY_MARGIN
+import calendar
+import hashlib
+import fcntl
+import json
+import time
+import os
+
+
+class TokenCache(object):
+    """
+    Keystone tokens (along with their service catalog) kept in a file shared by all the test classes and processes
+    using the same credentials, so that a new token is only requested once the cached one is about to expire.
+    Concurrent access from several processes is serialized by an exclusive lock on an auxiliary file, and the cache
+    file is always replaced atomically.
+    """
+
+    def __init__(self, logger, cache_file, expiry_margin=TOKEN_CACHE_EXPIRY_MARGIN):
+        """
+        Init the cache.
+        :param logger: Logger object
+        :param cache_file: Path of the cache file (created with owner-only permissions, as it holds tokens)
+        :param expiry_margin: Seconds before the expiration of a token to consider it no longer valid
+        """
+        self.logger = logger
+        self.cache_file = os.path.expanduser(cache_file)
+        self.expiry_margin = expiry_margin
+
+    @staticmethod
+    def get_key(auth_url, username, project, domain=None):
+        """
+        Get the key of the cache entry for the given credentials.
+        :param auth_url: Keystone URL
+        :param username: User name
+        :param project: Project (tenant) name
+        :param domain: Domain of the user and project (only in Identity v3)
+        :return: Key as a string
+        """
+        return hashlib.sha1('|'.join([auth_url, username, project, domain or ''])).hexdigest()
+
+    def load(self, key, auth_plugin):
+        """
+        Set the auth state of the plugin (token and service catalog) from the cache, if a valid entry is found.
+        :param key: Key of the cache entry
+        :param auth_plugin: Keystone identity plugin (i.e. a Password object)
+        :return: True if the auth state was loaded
+        """
+        try:
+            with self.__lock__():
+                entry = self.__read__().get(key)
+        except (IOError, OSError) as e:
+            self.logger.warn("Could not read token cache %s: %s", self.cache_file, e)
+            return False
+        if not entry or entry['expires_at'] - self.expiry_margin <= time.time():
+            return False
+        try:
+            auth_plugin.auth_ref = self.__deserialize__(entry['state'])
+        except (ValueError, KeyError, TypeError, NotImplementedError) as e:
+            self.logger.warn("Invalid auth state in token cache %s: %s", self.cache_file, e)
+            return False
+        self.logger.debug("Auth token taken from cache %s", self.cache_file)
+        return True
+
+    def store(self, key, auth_plugin):
+        """
+        Store the auth state of the plugin (token and service catalog) in the cache, removing expired entries.
+        :param key: Key of the cache entry
+        :param auth_plugin: Keystone identity plugin already authenticated
+        :return: True if the auth state was stored
+        """
+        auth_ref = getattr(auth_plugin, 'auth_ref', None)
+        if not auth_ref or not auth_ref.expires:
+            return False
+        expires_at = calendar.timegm(auth_ref.expires.utctimetuple())
+        try:
+            with self.__lock__():
+                entries = self.__read__()
+                entry = entries.get(key)
+                if entry and entry['state'].get('auth_token') == auth_ref.auth_token:
+                    return False
+                entries = dict((name, value) for name, value in entries.items() if value['expires_at'] > time.time())
+                entries[key] = dict(expires_at=expires_at, state=self.__serialize__(auth_ref))
+                self.__write__(entries)
+        except (IOError, OSError) as e:
+            self.logger.warn("Could not write token cache %s: %s", self.cache_file, e)
+            return False
+        self.logger.debug("Auth token stored in cache %s", self.cache_file)
+        return True
+
+    @staticmethod
+    def __serialize__(auth_ref):
+        """
+        Get the auth state (token and body of the auth response, including the service catalog) of an AccessInfo.
+        :param auth_ref: Keystone AccessInfo object (either Identity v2 or v3)
+        :return: Python dict
+        """
+        body_key = 'token' if auth_ref.version == 'v3' else 'access'
+        return {'auth_token': auth_ref.auth_token, 'body': {body_key: dict(auth_ref)}}
+
+    @staticmethod
+    def __deserialize__(state):
+        """
+        Get the AccessInfo corresponding to an auth state, as returned by `__serialize__`.
+        :param state: Python dict
+        :return: Keystone AccessInfo object
+        """
+        from keystoneclient import access
+        return access.AccessInfo.factory(body=state['body'], auth_token=state['auth_token'])
+
+    def __lock__(self):
+        """
+        Get an exclusive lock on the auxiliary lock file (released when the file returned is closed).
+        :return: File object, to be used as a context manager
+        """
+        directory = os.path.dirname(self.cache_file)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, 0700)
+        lock_file = os.fdopen(os.open(self.cache_file + '.lock', os.O_WRONLY | os.O_CREAT, 0600), 'w')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def __read__(self):
+        """
+        Read the entries of the cache (to be called while holding the lock).
+        :return: Python dict with the entries keyed by credentials (empty if the file is missing or invalid)
+        """
+        try:
+            with open(self.cache_file) as cache:
+                return json.load(cache)
+        except (IOError, ValueError):
+            return {}
+
+    def __write__(self, entries):
+        """
+        Write the entries of the cache (to be called while holding the lock), replacing the file atomically.
+        :param entries: Python dict with the entries keyed by credentials
+        :return: None
+        """
+        temp_file = '{}.{}'.format(self.cache_file, os.getpid())
+        with os.fdopen(os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600), 'w') as cache:
+            json.dump(entries, cache)
+        os.rename(temp_file, self.cache_file)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FIWARE project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+
+
+from commons.constants import TOKEN_REFRESH_MARGIN, TOKEN_REFRESH_POLLING_INTERVAL, TOKEN_REFRESH_RETRY_INTERVAL
+import threading
+import calendar
+import time
+
+
+class TokenRefresher(threading.Thread):
+    """
+    Background thread renewing the token of an auth session some time before it expires (according to the expiration
+    given by Keystone), so that long runs never use an expired token nor wait for authentication in the middle of a
+    test. Requests still in progress keep the previous token, as the new one replaces it only once retrieved. Should
+    the refresh fail, the session itself re-authenticates once the token is about to expire, and it retries once any
+    request rejected with HTTP 401 on a new token.
+    """
+
+    def __init__(self, logger, auth_session, margin=TOKEN_REFRESH_MARGIN, on_refresh=None):
+        """
+        Init the refresher (to be started).
+        :param logger: Logger object
+        :param auth_session: Keystone auth session object
+        :param margin: Seconds before the expiration of the token to refresh it
+        :param on_refresh: Optional function called with the auth plugin of the session after every refresh
+        """
+        threading.Thread.__init__(self, name="TokenRefresher")
+        self.daemon = True
+        self.logger = logger
+        self.auth_session = auth_session
+        self.margin = margin
+        self.on_refresh = on_refresh
+
+        # Fallback: session re-authenticates (before sending any request) when the token is about to expire
+        auth_session.auth.MIN_TOKEN_LIFE_SECONDS = margin / 2
+
+    def get_delay(self):
+        """
+        Get the seconds to wait until the token is to be refreshed.
+        :return: Seconds (zero or negative if the token is to be refreshed now)
+        """
+        auth_ref = self.auth_session.auth.auth_ref
+        if not auth_ref or not auth_ref.expires:
+            return TOKEN_REFRESH_POLLING_INTERVAL
+        return calendar.timegm(auth_ref.expires.utctimetuple()) - self.margin - time.time()
+
+    def refresh(self):
+        """
+        Get a new token (and service catalog) and replace the current one in the auth session.
+        :return: None
+        """
+        auth_plugin = self.auth_session.auth
+        auth_ref = auth_plugin.get_auth_ref(self.auth_session)
+        auth_plugin.auth_ref = auth_ref
+        self.logger.info("Auth token refreshed (expires at %s)", auth_ref.expires)
+        if self.on_refresh:
+            self.on_refresh(auth_plugin)
+
+    def run(self):
+        while True:
+            delay = self.get_delay()
+            if delay > 0:
+                time.sleep(min(delay, TOKEN_REFRESH_POLLING_INTERVAL))
+                continue
+            try:
+                self.refresh()
+            except Exception as e:
+                self.logger.warn("Could not refresh auth token: %s", e)
+                time.sleep(TOKEN_REFRESH_RETRY_INTERVAL)
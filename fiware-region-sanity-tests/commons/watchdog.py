@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FIWARE project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+
+
+import threading
+import ctypes
+import time
+
+
+class TestTimeout(BaseException):
+    """
+    Interruption of a test that exceeded its time budget (derived from BaseException, so that it is not caught by the
+    generic exception handlers found in tests and helpers, i.e. those retrying connections).
+    """
+
+
+class Watchdog(object):
+    """
+    Timer interrupting the thread running a test (by raising TestTimeout asynchronously in it) once a deadline is
+    reached, but only while it is armed (i.e. during setup and test method, not during teardown). As the exception is
+    raised at the next Python instruction, blocking calls (sockets, sleeps...) are not interrupted until they return.
+    """
+
+    def __init__(self, deadline, message):
+        """
+        Init the watchdog (to be started from the thread running the test).
+        :param deadline: Time (as returned by `time.time()`) to interrupt the test
+        :param message: Message describing the timeout
+        """
+        self.deadline = deadline
+        self.message = message
+        self.thread_id = threading.current_thread().ident
+        self.lock = threading.Lock()
+        self.armed = False
+        self.expired = False
+        self.timer = threading.Timer(max(0, deadline - time.time()), self.__expire__)
+        self.timer.daemon = True
+
+    def start(self):
+        self.timer.start()
+
+    def cancel(self):
+        self.disarm()
+        self.timer.cancel()
+
+    def arm(self):
+        """
+        Allow interrupting the test from now on (if deadline was already reached, interrupt it at once).
+        """
+        with self.lock:
+            if self.expired or time.time() >= self.deadline:
+                raise TestTimeout(self.message)
+            self.armed = True
+
+    def disarm(self):
+        """
+        Stop interrupting the test (discarding the interruption, if still pending).
+        """
+        with self.lock:
+            if self.armed and self.expired:
+                self.__set_async_exception__(None)
+            self.armed = False
+
+    def __expire__(self):
+        with self.lock:
+            self.expired = True
+            if self.armed:
+                self.__set_async_exception__(TestTimeout)
+
+    def __set_async_exception__(self, exception_type):
+        """
+        Raise an exception in the thread running the test (or clear the pending one, if None).
+        """
+        interrupt_thread(self.thread_id, exception_type)
+
+
+def interrupt_thread(thread_id, exception_type):
+    """
+    Raise an exception asynchronously in a thread, at its next Python instruction (or clear the pending one, if None).
+    :param thread_id: Identifier of the thread
+    :param exception_type: Exception class
+    :return: None
+    """
+    ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_long(thread_id),
+                                               ctypes.py_object(exception_type) if exception_type else None)
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FIWARE project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+
+
+from commons.constants import WORK_QUEUE_CONNECT_RETRIES, WORK_QUEUE_CONNECT_INTERVAL, WORK_QUEUE_HEARTBEAT_INTERVAL
+from multiprocessing.managers import BaseManager
+import threading
+import socket
+import Queue
+import time
+
+
+class WorkQueueManager(BaseManager):
+    """
+    Manager sharing (over TCP, authenticated by a key) the queue of work items published by a coordinator and the
+    queue of results reported back by workers.
+    """
+
+
+WorkQueueManager.register('get_work_queue')
+WorkQueueManager.register('get_result_queue')
+
+
+class WorkItemHeartbeat(threading.Thread):
+    """
+    Background thread reporting periodically to the coordinator (through the queue of results) that a work item is
+    still being processed by this worker, from start until stopped. Used as a context manager.
+    """
+
+    def __init__(self, result_queue, region, worker):
+        """
+        Init the heartbeat (to be started).
+        :param result_queue: Queue of results (proxy)
+        :param region: Name of the region being tested (work item)
+        :param worker: Identifier of this worker (as 'host:pid')
+        """
+        threading.Thread.__init__(self, name="WorkItemHeartbeat")
+        self.daemon = True
+        self.result_queue = result_queue
+        self.message = dict(event='alive', region=region, worker=worker)
+        self.stopped = threading.Event()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def run(self):
+        while True:
+            try:
+                self.result_queue.put(self.message)
+            except Exception as e:
+                print "Could not report heartbeat of region {0}: {1}".format(self.message['region'], e)
+            if self.stopped.wait(WORK_QUEUE_HEARTBEAT_INTERVAL):
+                break
+
+    def stop(self):
+        """
+        Stop reporting heartbeats.
+        """
+        self.stopped.set()
+        self.join()
+
+
+def parse_address(address):
+    """
+    Parse the address of a work queue.
+    :param address: Address given as 'host:port' (or just 'port', meaning all interfaces of the local host)
+    :return: Tuple with host and port
+    """
+    host, _, port = address.rpartition(':')
+    return host, int(port)
+
+
+def serve_work_queue(address, authkey):
+    """
+    Serve the work queue in a background thread of this (coordinator) process.
+    :param address: Tuple with host and port to listen to
+    :param authkey: Key authenticating the workers
+    :return: Tuple with the queue of work items and the queue of results (both local)
+    """
+    work_queue, result_queue = Queue.Queue(), Queue.Queue()
+
+    class WorkQueueServer(WorkQueueManager):
+        pass
+
+    WorkQueueServer.register('get_work_queue', callable=lambda: work_queue)
+    WorkQueueServer.register('get_result_queue', callable=lambda: result_queue)
+    server = WorkQueueServer(address=address, authkey=authkey).get_server()
+    thread = threading.Thread(target=server.serve_forever, name='WorkQueueServer')
+    thread.daemon = True
+    thread.start()
+    return work_queue, result_queue
+
+
+def connect_work_queue(address, authkey):
+    """
+    Connect to the work queue served by a coordinator (retrying, as the coordinator may not be started yet).
+    :param address: Tuple with host and port of the coordinator
+    :param authkey: Key authenticating the worker
+    :return: Tuple with the queue of work items and the queue of results (both proxies)
+    """
+    manager = WorkQueueManager(address=address, authkey=authkey)
+    for attempt in range(WORK_QUEUE_CONNECT_RETRIES):
+        try:
+            manager.connect()
+            break
+        except socket.error as e:
+            if attempt + 1 == WORK_QUEUE_CONNECT_RETRIES:
+                raise
+            print "Could not connect to work queue at {0}:{1} ({2}), retrying...".format(address[0], address[1], e)
+            time.sleep(WORK_QUEUE_CONNECT_INTERVAL)
+    return manager.get_work_queue(), manager.get_result_queue()
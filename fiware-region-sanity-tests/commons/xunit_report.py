@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FIWARE project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+
+
+from xml.dom import minidom
+import codecs
+
+XUNIT_TESTSUITE_NAME = "nosetests"
+XUNIT_COUNTERS = ["tests", "errors", "failures", "skip"]
+XUNIT_OUTCOMES = {"error": "errors", "failure": "failures", "skipped": "skip"}
+
+
+def merge_reports(report_files, output_file):
+    """
+    Merges several xUnit reports (as written by nose `xunit` plugin) into a single one, adding up the counters of
+    their test suites.
+    :param report_files: List of paths of the xUnit reports to merge
+    :param output_file: Path of the resulting xUnit report
+    :return: None
+    """
+    doc = minidom.getDOMImplementation().createDocument(None, "testsuite", None)
+    merged_testsuite = doc.documentElement
+    merged_testsuite.setAttribute("name", XUNIT_TESTSUITE_NAME)
+    counters = dict((name, 0) for name in XUNIT_COUNTERS)
+
+    for report_file in report_files:
+        testsuite = minidom.parse(report_file).getElementsByTagName("testsuite")[0]
+        for name in XUNIT_COUNTERS:
+            counters[name] += int(testsuite.getAttribute(name) or 0)
+        for testcase in testsuite.getElementsByTagName("testcase"):
+            merged_testsuite.appendChild(doc.importNode(testcase, True))
+
+    for name in XUNIT_COUNTERS:
+        merged_testsuite.setAttribute(name, str(counters[name]))
+
+    with codecs.open(output_file, "w", encoding="utf-8") as output:
+        doc.writexml(output, encoding="UTF-8")
+
+
+def get_test_durations(report_files, class_name):
+    """
+    Gets the average duration of the tests of a class from several xUnit reports (skipped tests are not taken into
+    account, as they do not run at all).
+    :param report_files: List of paths of the xUnit reports
+    :param class_name: Name of the test class (i.e. region name), without module
+    :return: Python dict with average duration (in seconds) by test name
+    """
+    durations = {}
+    for report_file in report_files:
+        for testcase in minidom.parse(report_file).getElementsByTagName("testcase"):
+            if testcase.getAttribute("classname").split(".")[-1] == class_name \
+                    and not testcase.getElementsByTagName("skipped"):
+                durations.setdefault(testcase.getAttribute("name"), []).append(float(testcase.getAttribute("time")))
+
+    return dict((name, sum(values) / len(values)) for name, values in durations.items())
+
+
+def get_failed_tests(report_file):
+    """
+    Gets the tests either failed or with errors in a xUnit report.
+    :param report_file: Path (or file object) of the xUnit report
+    :return: List of tuples with the class name and the name of the failed tests (as in the report)
+    """
+    return [(testcase.getAttribute("classname"), testcase.getAttribute("name"))
+            for testcase in minidom.parse(report_file).getElementsByTagName("testcase")
+            if testcase.getElementsByTagName("failure") or testcase.getElementsByTagName("error")]
+
+
+def update_report(previous_report_file, report_file, replaced_tests):
+    """
+    Updates a xUnit report with the outcomes of a previous one, so that it includes all the tests: those of the
+    previous report are kept, unless they were run again (i.e. they are included in the new report, taking their
+    place) or they are explicitly replaced; the counters of the test suite are calculated again.
+    :param previous_report_file: Path (or file object) of the previous xUnit report
+    :param report_file: Path of the xUnit report to update
+    :param replaced_tests: List of tuples with class name and name of previous tests to remove (i.e. those re-run)
+    :return: None
+    """
+    def key(testcase):
+        return testcase.getAttribute("classname"), testcase.getAttribute("name")
+
+    doc = minidom.parse(previous_report_file)
+    merged_testsuite = doc.getElementsByTagName("testsuite")[0]
+    new_testcases = minidom.parse(report_file).getElementsByTagName("testcase")
+    new_testcases_by_key = dict((key(testcase), testcase) for testcase in new_testcases)
+
+    for testcase in merged_testsuite.getElementsByTagName("testcase"):
+        new_testcase = new_testcases_by_key.pop(key(testcase), None)
+        if new_testcase is not None:
+            merged_testsuite.replaceChild(doc.importNode(new_testcase, True), testcase)
+        elif key(testcase) in replaced_tests:
+            merged_testsuite.removeChild(testcase)
+    for testcase in new_testcases:
+        if key(testcase) in new_testcases_by_key:
+            merged_testsuite.appendChild(doc.importNode(testcase, True))
+
+    counters = dict((name, 0) for name in XUNIT_COUNTERS)
+    for testcase in merged_testsuite.getElementsByTagName("testcase"):
+        counters["tests"] += 1
+        for outcome, name in XUNIT_OUTCOMES.items():
+            if testcase.getElementsByTagName(outcome):
+                counters[name] += 1
+    for name in XUNIT_COUNTERS:
+        merged_testsuite.setAttribute(name, str(counters[name]))
+
+    with codecs.open(report_file, "w", encoding="utf-8") as output:
+        doc.writexml(output, encoding="UTF-8")
@@ -151,6 +151,7 @@ function move_reports_to_history() {
 	if [ -n "$region" -a -n "$timestamp" -a -n "$FIHEALTH_HISTORY" ]; then
 		printf "$region previous report stored as $histreport\n"
 		mv ${region}_results.txt $histreport
+		[ -s ${region}_results.xml ] && mv ${region}_results.xml ${histreport%.txt}.xml
 		rm ${region}_results.*
 	fi
 }
@@ -343,6 +344,7 @@ exec)
 	# Execute tests
 	export OS_AUTH_URL OS_USERNAME OS_PASSWORD OS_USER_ID
 	export OS_TENANT_ID OS_TENANT_NAME OS_USER_DOMAIN_NAME OS_PROJECT_DOMAIN_NAME
+	export FIHEALTH_HISTORY
 
 	# Get 'start_time' before executing Sanity Checks (milliseconds)
 	start_time=$(date +%s%3N)
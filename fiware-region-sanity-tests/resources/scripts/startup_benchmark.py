@@ -0,0 +1,95 @@
+#!/usr/bin/env python2.7
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FIWARE project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+
+
+"""Measure the cold-start time of the tests runner (until tests are about to run), and the client libraries loaded.
+
+Usage:
+  {prog} [--runs=N] [region|test_spec ...]
+
+Options:
+  --runs=N                          Number of cold starts to measure for each case (default: 5)
+
+Environment:
+  SANITY_CHECKS_SETTINGS            (Optional) Path to settings file
+
+"""
+
+import argparse
+import subprocess
+import time
+import sys
+import os
+import re
+
+# Client libraries whose loading is measured (top-level packages, as any of their submodules imports them)
+CLIENT_LIBRARIES = ['keystoneclient', 'keystoneauth1', 'novaclient', 'neutronclient', 'swiftclient', 'requests',
+                    'paramiko', 'dbus', 'gobject']
+
+parentdir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
+runner = os.path.join(parentdir, 'tests', 'run.py')
+
+
+def measure(command, runs):
+    """
+    Run a command several times, measuring its elapsed time and the client libraries it loaded.
+    :param command: Command line arguments
+    :param runs: Number of times to run the command
+    :return: Tuple with the list of elapsed times (seconds) and the list of client libraries loaded
+    """
+    times = []
+    modules = set()
+    for i in range(runs):
+        start_time = time.time()
+        process = subprocess.Popen([sys.executable] + command, cwd=parentdir,
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        output = process.communicate()[0]
+        times.append(time.time() - start_time)
+
+    # Additional run in verbose mode, to trace imported modules
+    process = subprocess.Popen([sys.executable, '-v'] + command, cwd=parentdir,
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    for line in process.communicate()[0].splitlines():
+        match = re.match(r'^import ([\w.]+) ', line)
+        if match:
+            modules.add(match.group(1))
+
+    return sorted(times), [name for name in CLIENT_LIBRARIES if name in modules]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('tests', metavar='test_spec', type=str, nargs='*')
+    parser.add_argument('--runs', metavar='N', type=int, default=5)
+    args = parser.parse_args()
+
+    cases = [('help', [runner, '--help'])]
+    for test in args.tests:
+        cases.append((test, [runner, '--config=etc/nose.cfg', '--exe', '--collect-only', test]))
+
+    print "{:<40} {:>8} {:>8}  {}".format('Case', 'Min (s)', 'Med (s)', 'Client libraries loaded')
+    for name, command in cases:
+        times, libraries = measure(command, args.runs)
+        median = times[len(times) / 2]
+        print "{:<40} {:>8.3f} {:>8.3f}  {}".format(name, times[0], median, ', '.join(libraries) or '-')
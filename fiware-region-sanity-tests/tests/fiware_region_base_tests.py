@@ -24,14 +24,114 @@
 
 from commons.fiware_cloud_test_case import FiwareTestCase
 from commons.constants import *
-from novaclient.exceptions import Forbidden, OverLimit
 from datetime import datetime
-from commons.ssh_client import SSHClient, AuthenticationException
+from commons.ssh_client import SSHClient
+from commons.keypair_pool import KeypairPool
+from commons.console_log_capture import ConsoleLogCapture
+from commons.template_utils import replace_template_properties
+from commons.test_scheduler import TestEventRecorder
+from commons.watchdog import interrupt_thread
+import threading
+import itertools
 import socket
+import json
+import sys
+import re
 
 
 class FiwareRegionsBaseTests(FiwareTestCase):
 
+    # Resources required by tests (by test name pattern)
+    test_resources = {
+        r'test_allocate_ip$': {RESOURCE_FLOATING_IPS: 1},
+        r'test_deploy_instance_': {RESOURCE_INSTANCES: 1},
+        r'test_deploy_instance_.*public_ip$': {RESOURCE_FLOATING_IPS: 1},
+        r'test_deploy_instance_.*(snat_connection|metadata_service)$': {RESOURCE_PHONEHOME: 1}
+    }
+
+    # Prerequisites of tests (by test name pattern)
+    test_prerequisites = {
+        r'test_deploy_instance_': ['test_flavors_not_empty', 'test_base_image_for_testing_exists'],
+        r'test_deploy_instance_.*(keypair|all_params|e2e_connection)': ['test_create_keypair'],
+        r'test_deploy_instance_.*(sec_group|all_params|e2e_connection)': ['test_create_security_group_and_rules'],
+        r'test_deploy_instance_.*public_ip$': ['test_allocate_ip']
+    }
+
+    # Sequence number of names given to test resources
+    name_sequence = itertools.count()
+
+    # Shared test instance mode: connectivity tests (SSH, SNAT and metadata service) check a single instance of the
+    # region, deployed by the first of them and released once all tests are finished, instead of deploying their own
+    shared_test_vm = False
+
+    # Pattern of the names of the tests checking the shared test instance (given by each suite)
+    shared_test_vm_tests = None
+
+    # Resources required by the shared test instance (could be extended by suites)
+    shared_test_vm_resources = {RESOURCE_INSTANCES: 1, RESOURCE_FLOATING_IPS: 1}
+
+    # Shared test instance of the region (its resources, data and the error found when deploying it, if any), and
+    # condition to wait for its deployment (both set on setup of each region class)
+    shared_test_vm_fixture = None
+    shared_test_vm_condition = None
+
+    # Test declaring the resources of the shared test instance (the first one checking it, in order of scheduling)
+    shared_test_vm_deployer = None
+
+    @classmethod
+    def uses_shared_test_vm(cls, test_name):
+        """
+        Whether the given test checks the shared test instance, instead of deploying its own one.
+        :param test_name: Name of the test method
+        :return: True if shared test instance mode is enabled and the test is one of its connectivity tests
+        """
+        return bool(cls.shared_test_vm and cls.shared_test_vm_tests and re.match(cls.shared_test_vm_tests, test_name))
+
+    @classmethod
+    def get_required_resources(cls, test_name):
+        """
+        Get the resources required by the given test (as declared in `test_resources` attribute). Tests checking the
+        shared test instance do not deploy their own one: they just require PhoneHome service, as any of them may deploy
+        it and wait for its requests, and only the first of them (as tests are scheduled in order, the one expected to
+        deploy it) also requires the resources of the shared instance (`shared_test_vm_resources` attribute).
+        :param test_name: Name of the test method
+        :return: Python dict with the units of each resource required
+        """
+        if not cls.uses_shared_test_vm(test_name):
+            return super(FiwareRegionsBaseTests, cls).get_required_resources(test_name)
+
+        if cls.shared_test_vm_deployer is None:
+            cls.shared_test_vm_deployer = test_name
+        demand = dict(cls.shared_test_vm_resources) if test_name == cls.shared_test_vm_deployer else {}
+        demand[RESOURCE_PHONEHOME] = 1
+        return demand
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Setup testcase (executed before ALL tests): init the shared test instance of the region (not deployed yet).
+        """
+        cls.shared_test_vm_fixture = None
+        cls.shared_test_vm_condition = threading.Condition()
+        cls.shared_test_vm_deployer = None
+        super(FiwareRegionsBaseTests, cls).setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Teardown testcase (executed after ALL tests): release the shared test instance (if any) and its resources.
+        """
+        fixture, cls.shared_test_vm_fixture = cls.shared_test_vm_fixture, None
+        if fixture:
+            cls.logger.debug("Tearing down shared test instance...")
+            world = fixture['world']
+            for reset_world in [cls.reset_world_servers, cls.reset_world_sec_groups, cls.reset_world_keypair_names,
+                                cls.reset_world_ports, cls.reset_world_networks, cls.reset_world_routers,
+                                cls.reset_world_allocated_ips]:
+                if not reset_world(world):
+                    cls.logger.error("Fails in releasing resources of the shared test instance: %s", world)
+        super(FiwareRegionsBaseTests, cls).tearDownClass()
+
     def setUp(self):
         try:
             super(FiwareRegionsBaseTests, self).setUp()
@@ -39,30 +139,284 @@ class FiwareRegionsBaseTests(FiwareTestCase):
             if not self.init_world(self.test_world):
                 self.logger.error("Error in initialization phase")
                 self.skipTest("Error in initialization phase")
+
+            # wait for the resources required by this test, should previous tests be still releasing them
+            if self.reaper:
+                demand = self.get_required_resources(self._testMethodName)
+                self.reaper.wait_for([entry for resource in demand
+                                      for entry in self.reaper_resource_entries.get(resource, [])])
         except Exception as ex:
             self.logger.error(ex)
             self.skipTest(ex)
 
+    def __get_name_suffix_test_helper__(self):
+        """
+        HELPER. Builds a suffix for the names of test resources, unique even for tests running concurrently
+        :return: Suffix (String)
+        """
+        return '{0}{1:03d}'.format(datetime.utcnow().strftime('%Y%m%d%H%M%S'), next(self.name_sequence) % 1000)
+
+    def __run_concurrently_test_helper__(self, *functions):
+        """
+        HELPER. Runs the given functions (i.e. creation of independent resources) concurrently, each in its own thread,
+        and waits for all of them (with a timeout, so that waiting is interruptible). Should waiting be interrupted
+        (i.e. test timeout), the same interruption is raised in the threads still running, which are waited for before
+        raising it again, so that no resources are created once the test is being torn down. Log records of the threads
+        are kept along with those of the test.
+        :param functions: Functions without arguments
+        :return: List of values returned by the functions. If any of them failed, the first error is raised again once
+                 all of them are finished
+        """
+        results = [None] * len(functions)
+        errors = []
+        parent_thread_id = threading.current_thread().ident
+
+        def run(index, function):
+            TestEventRecorder.ThreadLogHandler.adopt(parent_thread_id)
+            try:
+                results[index] = function()
+            except BaseException:
+                errors.append((index, sys.exc_info()))
+
+        threads = [threading.Thread(target=run, args=(index, function)) for index, function in enumerate(functions)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(SCHEDULER_POLLING_INTERVAL)
+        except BaseException:
+            exc_type, exc_value, exc_traceback = sys.exc_info()
+            self.logger.warning("Interrupted while running concurrently: waiting for %d threads to stop",
+                                len([thread for thread in threads if thread.is_alive()]))
+            for thread in threads:
+                if thread.is_alive():
+                    interrupt_thread(thread.ident, exc_type)
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(SCHEDULER_POLLING_INTERVAL)
+            raise exc_type, exc_value, exc_traceback
+
+        if errors:
+            exc_type, exc_value, exc_traceback = min(errors)[1]
+            raise exc_type, exc_value, exc_traceback
+        return results
+
     def __create_keypair_test_helper__(self, keypair_name):
         """
-        HELPER. Creates new Keypair
-        :return: Private key value (String)
+        HELPER. Creates new Keypair, importing a key from the pool
+        :return: Private key (Paramiko PKey object)
         """
+        from novaclient.exceptions import Forbidden
+        pkey = self.get_keypair_pool().get()
         try:
-            keypair_value = self.nova_operations.create_keypair(keypair_name)
+            keypair_value = self.nova_operations.create_keypair(keypair_name, KeypairPool.get_public_key(pkey))
             self.assertIsNotNone(keypair_value, "Problems creating keypair '%s" % keypair_name)
             self.test_world['keypair_names'].append(keypair_name)
         except Forbidden as e:
             self.logger.debug("Quota exceeded when creating a keypair")
             self.fail(e)
 
-        return keypair_value
+        return pkey
+
+    def __get_shared_test_vm_test_helper__(self):
+        """
+        HELPER. Gets the instance shared by connectivity tests, deploying it first if not done yet by a previous test.
+        Its resources are kept in a world of its own (thus not released by the teardown of the test), and a failure to
+        deploy it is raised again in every test using it. Other tests wait for the deployment (with a timeout, so that
+        waiting is interruptible)
+        :return: Python dict with server id, public IP, private key, expected hostname and metadata, and data received
+                 in PhoneHome signals (see `__deploy_shared_test_vm_helper__`)
+        """
+        condition = self.shared_test_vm_condition
+        with condition:
+            fixture = type(self).shared_test_vm_fixture
+            is_deployer = fixture is None
+            if is_deployer:
+                fixture = type(self).shared_test_vm_fixture = {'world': {}, 'error': None, 'ready': False}
+            while not is_deployer and not fixture['ready']:
+                condition.wait(SCHEDULER_POLLING_INTERVAL)
+
+        if is_deployer:
+            test_world, self.test_world = self.test_world, fixture['world']
+            try:
+                self.init_world(self.test_world)
+                self.__deploy_shared_test_vm_helper__(fixture)
+            except Exception:
+                fixture['error'] = sys.exc_info()
+                raise
+            except BaseException:
+                fixture['error'] = (self.failureException,
+                                    self.failureException("Deployment of shared test instance was interrupted"),
+                                    sys.exc_info()[2])
+                raise
+            finally:
+                self.test_world = test_world
+                with condition:
+                    fixture['ready'] = True
+                    condition.notify_all()
+
+        if fixture['error']:
+            exc_type, exc_value, exc_traceback = fixture['error']
+            raise exc_type, exc_value, exc_traceback
+        return fixture
+
+    def __deploy_shared_test_vm_helper__(self, fixture):
+        """
+        HELPER. Deploys the shared test instance, with new keypair, security group, public IP, metadata and userdata
+        (to call home both with its hostname and with its metadata, if a PhoneHome service endpoint was given), then
+        waits for both requests at once, recording their data in the given fixture
+        :param fixture: Python dict to fill with server id ('server_id'), public IP ('ip'), private key
+                        ('private_key'), expected hostname and metadata ('expected_hostname', 'expected_metadata') and
+                        data received by PhoneHome signal ('phonehome'; None if no PhoneHome endpoint was given, and
+                        False if PhoneHome bus or objects were not found)
+        :return: None
+        """
+        suffix = self.__get_name_suffix_test_helper__()
+        instance_name = TEST_SERVER_PREFIX + "_shared_" + suffix
+        keypair_name = TEST_KEYPAIR_PREFIX + "_" + suffix
+        sec_group_name = TEST_SEC_GROUP_PREFIX + "_" + suffix
+        metadata = {"region": self.region_name, "foo": "bar-" + suffix}
+
+        # Load userdata from file and compile the template (replacing variable values)
+        userdata_content = None
+        phonehome_endpoint = self.conf[PROPERTIES_CONFIG_TEST][PROPERTIES_CONFIG_TEST_PHONEHOME_ENDPOINT]
+        if phonehome_endpoint:
+            metadata_service_url = self.conf[PROPERTIES_CONFIG_TEST][PROPERTIES_CONFIG_METADATA_SERVICE_URL]
+            self.logger.debug("Loading userdata from file '%s'", PHONEHOME_USERDATA_SHARED_PATH)
+            with open(PHONEHOME_USERDATA_SHARED_PATH, "r") as userdata_file:
+                userdata_content = userdata_file.read()
+                userdata_content = replace_template_properties(
+                    userdata_content, phonehome_endpoint=phonehome_endpoint, path_resource=PHONEHOME_DBUS_OBJECT_PATH,
+                    metadata_path_resource=PHONEHOME_DBUS_OBJECT_METADATA_PATH,
+                    openstack_metadata_service_url=metadata_service_url)
+                self.logger.debug("Userdata content: %s", userdata_content)
+
+        # Allocate an IP and create Keypair
+        fixture['ip'] = self.__allocate_ip_test_helper__()
+        fixture['private_key'] = self.__create_keypair_test_helper__(keypair_name)
+
+        # Deploy VM (as each suite does) and associate the public IP to it
+        fixture['server_id'] = self.__deploy_shared_test_vm_instance_helper__(instance_name, suffix,
+                                                                              keypair_name=keypair_name,
+                                                                              is_keypair_new=False,
+                                                                              sec_group_name=sec_group_name,
+                                                                              metadata=metadata,
+                                                                              userdata=userdata_content)
+        self.nova_operations.add_floating_ip_to_instance(server_id=fixture['server_id'], ip_address=fixture['ip'])
+
+        # VM will have as hostname, the instance_name with "-" instead of "_"
+        fixture['expected_hostname'] = instance_name.replace("_", "-")
+        fixture['expected_metadata'] = metadata
+
+        # Create new DBus connection and wait for both signals emitted from HTTP PhoneHome service
+        fixture['phonehome'] = None
+        if phonehome_endpoint:
+            from commons.dbus_phonehome_service import DbusPhoneHomeClient
+            client = DbusPhoneHomeClient(self.logger)
+            phonehome_signals = {PHONEHOME_DBUS_OBJECT_PATH: PHONEHOME_SIGNAL,
+                                 PHONEHOME_DBUS_OBJECT_METADATA_PATH: PHONEHOME_METADATA_SIGNAL}
+            capture = self.__console_log_capture_test_helper__(fixture['server_id'])
+            capture.start()
+            try:
+                fixture['phonehome'] = client.connect_and_wait_for_phonehome_signals(
+                    PHONEHOME_DBUS_NAME, phonehome_signals, fixture['expected_hostname'])
+            finally:
+                capture.stop(keep=len(fixture['phonehome'] or {}) < len(phonehome_signals))
+
+    def __deploy_shared_test_vm_instance_helper__(self, instance_name, suffix, **kwargs):
+        """
+        HELPER. Deploys the shared test instance itself, as any other instance of the suite (suites may override it,
+        i.e. to deploy it with a new network)
+        :param instance_name: Name of the new instance
+        :param suffix: Suffix for the names of other resources required by the instance
+        :param kwargs: Parameters of the instance (keypair, security group, metadata and userdata)
+        :return: Server ID (String)
+        """
+        return self.__deploy_instance_helper__(instance_name=instance_name, **kwargs)
+
+    def __get_shared_test_vm_phonehome_data_test_helper__(self, fixture, phonehome_signal):
+        """
+        HELPER. Gets the data the shared test instance sent when calling home (as recorded once it was deployed)
+        :param fixture: Shared test instance
+        :param phonehome_signal: Signal emitted from HTTP PhoneHome service
+        :return: Data received in the signal (String)
+        """
+        self.assertNotEqual(fixture['phonehome'], False,
+                            "PhoneHome bus or object not found. Please check the PhoneHome services.")
+
+        result = (fixture['phonehome'] or {}).get(phonehome_signal)
+        self.assertIsNotNone(result, "PhoneHome request not received from VM '%s'" % fixture['server_id'])
+        self.logger.debug("Request received from VM when 'calling home': %s", result)
+        return result
+
+    def __e2e_connection_using_shared_test_vm_test_helper__(self):
+        """
+        HELPER. Test whether it is possible to establish a SSH connection to the shared test instance (using the
+        public IP associated to it)
+        """
+        fixture = self.__get_shared_test_vm_test_helper__()
+        login_name = self.region_conf.get(PROPERTIES_CONFIG_REGION_TEST_LOGIN_NAME, TEST_LOGIN_NAME_DEFAULT)
+        self.__ssh_connection_test_helper__(host=fixture['ip'], private_key=fixture['private_key'],
+                                            login_name=login_name, server_id=fixture['server_id'])
+
+    def __e2e_snat_connection_using_shared_test_vm_test_helper__(self):
+        """
+        HELPER. Test whether the shared test instance connected to the internet (PhoneHome service) with its hostname
+        """
+        fixture = self.__get_shared_test_vm_test_helper__()
+        result = self.__get_shared_test_vm_phonehome_data_test_helper__(fixture, PHONEHOME_SIGNAL)
+
+        # Get hostname from data received
+        self.assertIn("hostname", result, "PhoneHome request has been received but 'hostname' param is not in")
+        received_hostname = re.match(".*hostname=([\w-]*)", result).group(1)
+
+        # Check hostname
+        expected_instance_name = fixture['expected_hostname']
+        self.assertEqual(expected_instance_name, received_hostname,
+                         "Received hostname '%s' in PhoneHome request does not match with the expected instance name" %
+                         received_hostname)
+
+    def __metadata_service_using_shared_test_vm_test_helper__(self):
+        """
+        HELPER. Test whether the shared test instance got its metadata from metadata service (PhoneHome service)
+        """
+        fixture = self.__get_shared_test_vm_test_helper__()
+        result = self.__get_shared_test_vm_phonehome_data_test_helper__(fixture, PHONEHOME_METADATA_SIGNAL)
+
+        # Get metadata from data received
+        self.assertIn("meta", result, "PhoneHome request has been received but 'meta' param is not in")
+        received_metadata = json.loads(str(result))["meta"]
+
+        # Check metadata
+        expected_metadata = fixture['expected_metadata']
+        self.assertEqual(expected_metadata, received_metadata,
+                         "Received metadata '%s' in PhoneHome request does not match with the expected metadata" %
+                         received_metadata)
+
+    def __get_batch_network_id_list_test_helper__(self):
+        """
+        HELPER. Gets the nics of the instances deployed in batch (each suite may give its own ones)
+        :return: List of nics (as in `launch_instance`), or None to let Nova choose them
+        """
+        return None
+
+    def __console_log_capture_test_helper__(self, server_id):
+        """
+        HELPER. Creates a capture of the Nova console log of the given server, to be used as context manager wrapping
+        a connectivity check: the log file is only kept if the check fails
+        :param server_id: Server ID
+        :return: ConsoleLogCapture object
+        """
+        return ConsoleLogCapture(self.logger, self.nova_operations, self.region_name, server_id)
 
     def __allocate_ip_test_helper__(self):
         """
         HELPER. Allocates a IP from the Public Pool of the region
         :return IP address (String)
         """
+        from novaclient.exceptions import OverLimit
         net = self.region_conf[PROPERTIES_CONFIG_REGION_EXTERNAL_NET]
         try:
             allocated_ip_data = self.nova_operations.allocate_ip(net)
@@ -74,27 +428,31 @@ class FiwareRegionsBaseTests(FiwareTestCase):
 
         return allocated_ip_data['ip']
 
-    def __ssh_connection_test_helper__(self, host, private_key, login_name):
+    def __ssh_connection_test_helper__(self, host, private_key, login_name, server_id):
         """
         HELPER. Tries to connect (SSH) to the given host and retries if some failed (socket error)
         :param host: IP or Hostname (String)
-        :param private_key: Private key value (String)
+        :param private_key: Private key (either String or Paramiko PKey object)
         :param login_name: Login used to connection
+        :param server_id: Server ID (whose console log is captured, should the connection fail)
         :return:
         """
+        from paramiko import AuthenticationException
+
         ssh_client = SSHClient(self.logger, host=host, username=login_name, private_key=private_key)
-        try:
-            ssh_client.connect_and_retry()
-        except AuthenticationException as e:
-            self.logger.debug("Authentication failed when connecting (SSH) to VM %s, when trying to connect "
-                              "for more than %d seconds", host, MAX_WAIT_SSH_CONNECT_ITERATIONS * SLEEP_TIME)
-            self.fail(e)
-        except socket.error as e:
-            self.logger.debug("SSH connection error to VM %s, when trying to connect "
-                              "for more than %d seconds", host, MAX_WAIT_SSH_CONNECT_ITERATIONS * SLEEP_TIME)
-            self.fail(e)
-        finally:
-            ssh_client.close()
+        with self.__console_log_capture_test_helper__(server_id):
+            try:
+                ssh_client.connect_and_retry()
+            except AuthenticationException as e:
+                self.logger.debug("Authentication failed when connecting (SSH) to VM %s, when trying to connect "
+                                  "for more than %d seconds", host, MAX_WAIT_SSH_CONNECT_ITERATIONS * SLEEP_TIME)
+                self.fail(e)
+            except socket.error as e:
+                self.logger.debug("SSH connection error to VM %s, when trying to connect "
+                                  "for more than %d seconds", host, MAX_WAIT_SSH_CONNECT_ITERATIONS * SLEEP_TIME)
+                self.fail(e)
+            finally:
+                ssh_client.close()
 
     def test_flavors_not_empty(self):
         """
@@ -149,8 +507,9 @@ class FiwareRegionsBaseTests(FiwareTestCase):
         """
         Test creation of a new security group with rules
         """
+        from novaclient.exceptions import Forbidden
 
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        suffix = self.__get_name_suffix_test_helper__()
         sec_group_name = TEST_SEC_GROUP_PREFIX + "_" + suffix
         try:
             sec_group_id = self.nova_operations.create_security_group_and_rules(sec_group_name)
@@ -164,7 +523,7 @@ class FiwareRegionsBaseTests(FiwareTestCase):
         """
         Test creation of a new keypair
         """
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        suffix = self.__get_name_suffix_test_helper__()
         keypair_name = TEST_KEYPAIR_PREFIX + "_" + suffix
         self.__create_keypair_test_helper__(keypair_name)
 
@@ -176,8 +535,11 @@ class FiwareRegionsBaseTests(FiwareTestCase):
 
     def tearDown(self):
         """
-        Clean all test data from the environment after each test execution.
+        Clean all test data from the environment after each test execution (in background, if there is a reaper).
         """
+        if self.reaper:
+            self.reaper.submit(self.test_world, self._testMethodName)
+            return
 
         if self.test_world.get('servers'):
             self.logger.debug("Tearing down servers...")
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Telefónica Investigación y Desarrollo, S.A.U
+#
+# This file is part of FIWARE project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+#
+# You may obtain a copy of the License at:
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For those usages not covered by the Apache version 2.0 License please
+# contact with opensource@tid.es
+
+
+from tests.fiware_region_base_tests import FiwareRegionsBaseTests
+from commons.constants import RESOURCE_INSTANCES, TEST_SERVER_PREFIX, PROPERTIES_CONFIG_REGION_TEST_BATCH_SIZE
+import time
+
+
+class FiwareRegionBatchTests(FiwareRegionsBaseTests):
+
+    # Prerequisites of tests (by test name pattern)
+    test_prerequisites = {
+        r'test_deploy_batch_of_instances$': ['test_flavors_not_empty', 'test_base_image_for_testing_exists']
+    }
+
+    @classmethod
+    def get_required_resources(cls, test_name):
+        """
+        Get the resources required by the given test (see `FiwareRegionsBaseTests`). Batch deployment requires as many
+        instances as configured for the region.
+        :param test_name: Name of the test method
+        :return: Python dict with the units of each resource required
+        """
+        demand = super(FiwareRegionBatchTests, cls).get_required_resources(test_name)
+        if test_name == 'test_deploy_batch_of_instances':
+            demand[RESOURCE_INSTANCES] = cls.region_conf.get(PROPERTIES_CONFIG_REGION_TEST_BATCH_SIZE, 1)
+        return demand
+
+    def test_deploy_batch_of_instances(self):
+        """
+        Test whether it is possible to deploy a batch of instances at once (in a single request), measuring the
+        throughput of the region (instances active per minute)
+        """
+        from novaclient.exceptions import Forbidden, OverLimit
+        batch_size = self.region_conf[PROPERTIES_CONFIG_REGION_TEST_BATCH_SIZE]
+
+        flavor_id = self.nova_operations.get_any_flavor_id()
+        self.assertIsNotNone(flavor_id, "Problems retrieving a flavor")
+
+        base_image_name = self.nova_operations.test_image
+        image_id = self.nova_operations.find_image_id_by_name(image_name=base_image_name)
+        self.assertIsNotNone(image_id, "Problems retrieving the image '{}'".format(base_image_name))
+
+        network_id_list = self.__get_batch_network_id_list_test_helper__()
+
+        # Deploy all VMs in a single request
+        suffix = self.__get_name_suffix_test_helper__()
+        instance_name = TEST_SERVER_PREFIX + "_batch_" + suffix
+        start_time = time.time()
+        try:
+            server_ids = self.nova_operations.launch_instances(instance_name=instance_name, image_id=image_id,
+                                                               flavor_id=flavor_id, count=batch_size,
+                                                               network_id_list=network_id_list)
+        except Forbidden as e:
+            self.logger.debug("Quota exceeded when launching a batch of %d instances", batch_size)
+            self.fail(e)
+        except OverLimit as e:
+            self.logger.debug("Not enough resources to launch a batch of %d instances: %s", batch_size, e)
+            self.fail(e)
+        self.test_world['servers'].extend(server_ids)
+        self.assertEqual(len(server_ids), batch_size,
+                         "Only {} out of {} instances launched were found".format(len(server_ids), batch_size))
+
+        # Wait for status=ACTIVE of all of them at once
+        results = self.nova_operations.wait_for_servers_status(server_ids, 'ACTIVE', self.metrics)
+        failed = [detail for status, detail in results.values() if status != 'ACTIVE']
+        self.assertEqual(len(failed), 0, "{} out of {} instances are not active: {}".format(
+            len(failed), batch_size, "; ".join(failed)))
+
+        elapsed_time = time.time() - start_time
+        self.metrics['batch_boot_time'] = elapsed_time
+        self.metrics['batch_boot_rate'] = batch_size * 60.0 / elapsed_time
+        self.logger.debug("Batch of %d instances active after %.1f seconds (%.1f instances per minute)",
+                          batch_size, elapsed_time, self.metrics['batch_boot_rate'])
@@ -28,8 +28,6 @@ from commons.constants import TEST_CONTAINER_PREFIX, TEST_TEXT_OBJECT_BASENAME,
     PROPERTIES_CONFIG_SWIFT,\
     PROPERTIES_CONFIG_SWIFT_BIG_FILE_1, PROPERTIES_CONFIG_SWIFT_BIG_FILE_2, PROPERTIES_CONFIG_TEST,\
     TEST_BIG_OBJECT_REMOTE
-from swiftclient.exceptions import ClientException as SwiftClientException
-from datetime import datetime
 import hashlib
 import urllib2
 import os
@@ -44,7 +42,7 @@ class FiwareRegionsObjectStorageTests(FiwareRegionsBaseTests):
         Test whether it is possible to create a new container into the object storage.
         """
 
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        suffix = self.__get_name_suffix_test_helper__()
         container_name = TEST_CONTAINER_PREFIX + suffix
 
         response = self.swift_operations.create_container(container_name)
@@ -62,7 +60,9 @@ class FiwareRegionsObjectStorageTests(FiwareRegionsBaseTests):
         """
         Test whether it is possible to delete a container.
         """
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        from swiftclient.exceptions import ClientException as SwiftClientException
+
+        suffix = self.__get_name_suffix_test_helper__()
         container_name = TEST_CONTAINER_PREFIX + suffix
 
         response = self.swift_operations.create_container(container_name)
@@ -84,7 +84,7 @@ class FiwareRegionsObjectStorageTests(FiwareRegionsBaseTests):
         Test whether it is possible to upload a text file and download it.
         """
 
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S%m')
+        suffix = self.__get_name_suffix_test_helper__()
         container_name = TEST_CONTAINER_PREFIX + suffix
         text_object_name = self.region_name + TEST_TEXT_OBJECT_BASENAME + suffix + TEST_TEXT_FILE_EXTENSION
 
@@ -122,8 +122,9 @@ class FiwareRegionsObjectStorageTests(FiwareRegionsBaseTests):
         """
         Test whether it is possible to delete an object from a container.
         """
+        from swiftclient.exceptions import ClientException as SwiftClientException
 
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S%m')
+        suffix = self.__get_name_suffix_test_helper__()
         container_name = TEST_CONTAINER_PREFIX + suffix
         text_object_name = self.region_name + TEST_TEXT_OBJECT_BASENAME + suffix + TEST_TEXT_FILE_EXTENSION
 
@@ -156,7 +157,7 @@ class FiwareRegionsObjectStorageTests(FiwareRegionsBaseTests):
         Test whether it is possible to upload a big file and download it (More than 5Mb).
         """
 
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S%m')
+        suffix = self.__get_name_suffix_test_helper__()
         container_name = TEST_CONTAINER_PREFIX + suffix
         big_object_name = self.region_name + TEST_BIG_OBJECT_BASENAME + TEST_BIG_FILE_EXTENSION
         remote_big_object_name = self.region_name + TEST_BIG_OBJECT_REMOTE + TEST_BIG_OBJECT_BASENAME + \
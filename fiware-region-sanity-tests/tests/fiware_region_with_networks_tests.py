@@ -24,11 +24,8 @@
 
 from tests.fiware_region_base_tests import FiwareRegionsBaseTests
 from commons.constants import *
-from novaclient.exceptions import Forbidden, OverLimit, ClientException as NovaClientException
-from neutronclient.common.exceptions import NeutronClientException, IpAddressGenerationFailureClient
-from datetime import datetime
-from commons.dbus_phonehome_service import DbusPhoneHomeClient
 from commons.template_utils import replace_template_properties
+from commons.keypair_pool import KeypairPool
 import re
 import json
 import uuid
@@ -38,6 +35,30 @@ class FiwareRegionWithNetworkTest(FiwareRegionsBaseTests):
 
     with_networks = True
 
+    # Resources required by tests (by test name pattern)
+    test_resources = {
+        r'test_(create_network_and_subnet|create_router_no_external_network_and_add|deploy_instance_with_new_network)':
+            {RESOURCE_NETWORKS: 1},
+        r'test_(create_router_|deploy_instance_with_new_network_and_(associate_public_ip|e2e|check_metadata))':
+            {RESOURCE_ROUTERS: 1}
+    }
+
+    # Prerequisites of tests (by test name pattern)
+    test_prerequisites = {
+        r'test_create_router_external_network$': ['test_external_networks'],
+        r'test_create_router_no_external_network_and_add': ['test_create_router_no_external_network',
+                                                            'test_create_network_and_subnet'],
+        r'test_deploy_instance_with_new_network': ['test_create_network_and_subnet'],
+        r'test_deploy_instance_with_new_network_and_(associate_public_ip|e2e|check_metadata)':
+            ['test_create_router_external_network']
+    }
+
+    # Tests checking the shared test instance (in shared test instance mode), deployed with a new network and router
+    shared_test_vm_tests = r'test_deploy_instance_with_new_network_and_(e2e_connection_using_public_ip|' \
+                           r'e2e_snat_connection|check_metadata_service)$'
+    shared_test_vm_resources = dict(FiwareRegionsBaseTests.shared_test_vm_resources,
+                                    **{RESOURCE_NETWORKS: 1, RESOURCE_ROUTERS: 1})
+
     def __deploy_instance_helper__(self, instance_name,
                                    network_name=None, is_network_new=True, cidr=None,
                                    keypair_name=None, is_keypair_new=True,
@@ -60,6 +81,8 @@ class FiwareRegionWithNetworkTest(FiwareRegionsBaseTests):
         :param userdata: userdata file content (String)
         :return: Server ID (String)
         """
+        from novaclient.exceptions import Forbidden, OverLimit, ClientException as NovaClientException
+        from neutronclient.common.exceptions import NeutronClientException
 
         flavor_id = self.nova_operations.get_any_flavor_id()
         self.assertIsNotNone(flavor_id, "Problems retrieving a flavor")
@@ -68,48 +91,57 @@ class FiwareRegionWithNetworkTest(FiwareRegionsBaseTests):
         image_id = self.nova_operations.find_image_id_by_name(image_name=base_image_name)
         self.assertIsNotNone(image_id, "Problems retrieving the image '{}'".format(base_image_name))
 
-        # instance prerequisites
-        try:
-            network_id_list = None
-            if network_name:
-                if is_network_new:
-                    # Create the given network
-                    network = self.neutron_operations.create_network(network_name)
-                    self.test_world['networks'].append(network['id'])
-                    network_id_list = [{'net-id': network['id']}]
-                    # Create a subnet
-                    self.neutron_operations.create_subnet(network, cidr)
-                else:
-                    # Look for the network id
-                    net_list = self.neutron_operations.find_networks(name=network_name)
-                    self.assertTrue(len(net_list) != 0, "Required network '%s' could not be found" % network_name)
-                    network_id_list = [{'net-id': net_list[0]['id']}]
-
-        except NeutronClientException as e:
-            self.logger.debug("Required network could not be created: %s", e)
-            self.fail(e)
-
-        try:
-            if keypair_name:
-                if is_keypair_new:
-                    self.nova_operations.create_keypair(keypair_name)
-                    self.test_world['keypair_names'].append(keypair_name)
-                else:
-                    keypair_found = self.nova_operations.find_keypair(name=keypair_name)
-                    self.assertIsNotNone(keypair_found, "Required Keypair '%s' could not be found" % keypair_name)
-        except NovaClientException as e:
-            self.logger.debug("Required keypair could not be created: %s", e)
-            self.fail(e)
-
-        try:
-            security_group_name_list = None
-            if sec_group_name:
-                sec_group_id = self.nova_operations.create_security_group_and_rules(sec_group_name)
-                self.test_world['sec_groups'].append(sec_group_id)
-                security_group_name_list = [sec_group_name]
-        except NovaClientException as e:
-            self.logger.debug("Required security group could not be created: %s", e)
-            self.fail(e)
+        # instance prerequisites (independent of each other, thus created concurrently)
+        def create_network():
+            try:
+                network_id_list = None
+                if network_name:
+                    if is_network_new:
+                        # Create the given network
+                        network = self.neutron_operations.create_network(network_name)
+                        self.test_world['networks'].append(network['id'])
+                        network_id_list = [{'net-id': network['id']}]
+                        # Create a subnet
+                        self.neutron_operations.create_subnet(network, cidr)
+                    else:
+                        # Look for the network id
+                        net_list = self.neutron_operations.find_networks(name=network_name)
+                        self.assertTrue(len(net_list) != 0, "Required network '%s' could not be found" % network_name)
+                        network_id_list = [{'net-id': net_list[0]['id']}]
+                return network_id_list
+
+            except NeutronClientException as e:
+                self.logger.debug("Required network could not be created: %s", e)
+                self.fail(e)
+
+        def create_keypair():
+            try:
+                if keypair_name:
+                    if is_keypair_new:
+                        public_key = KeypairPool.get_public_key(self.get_keypair_pool().get())
+                        self.nova_operations.create_keypair(keypair_name, public_key)
+                        self.test_world['keypair_names'].append(keypair_name)
+                    else:
+                        keypair_found = self.nova_operations.find_keypair(name=keypair_name)
+                        self.assertIsNotNone(keypair_found, "Required Keypair '%s' could not be found" % keypair_name)
+            except NovaClientException as e:
+                self.logger.debug("Required keypair could not be created: %s", e)
+                self.fail(e)
+
+        def create_sec_group():
+            try:
+                security_group_name_list = None
+                if sec_group_name:
+                    sec_group_id = self.nova_operations.create_security_group_and_rules(sec_group_name)
+                    self.test_world['sec_groups'].append(sec_group_id)
+                    security_group_name_list = [sec_group_name]
+                return security_group_name_list
+            except NovaClientException as e:
+                self.logger.debug("Required security group could not be created: %s", e)
+                self.fail(e)
+
+        network_id_list, _, security_group_name_list = \
+            self.__run_concurrently_test_helper__(create_network, create_keypair, create_sec_group)
 
         # create new instance
         try:
@@ -131,7 +163,7 @@ class FiwareRegionWithNetworkTest(FiwareRegionsBaseTests):
             self.test_world['servers'].append(server_data['id'])
 
         # Wait for status=ACTIVE
-        status, detail = self.nova_operations.wait_for_task_status(server_data['id'], 'ACTIVE')
+        status, detail = self.nova_operations.wait_for_task_status(server_data['id'], 'ACTIVE', self.metrics)
         self.assertEqual(status, 'ACTIVE', "{detail}. Current status is {status}".format(detail=detail, status=status))
 
         return server_data['id']
@@ -172,6 +204,37 @@ class FiwareRegionWithNetworkTest(FiwareRegionsBaseTests):
 
         return shared_network_name
 
+    def __deploy_shared_test_vm_instance_helper__(self, instance_name, suffix, **kwargs):
+        """
+        HELPER. Deploys the shared test instance itself (see `FiwareRegionsBaseTests`), with a new network connected
+        to a new router with an external network gateway
+        """
+        # Create Router with an external network gateway
+        router_name = TEST_ROUTER_PREFIX + "_shared_" + suffix
+        external_network_id = self.__get_external_network_test_helper__()
+        router_id = self.__create_router_test_helper__(router_name, external_network_id)
+
+        # Create Network
+        network_name = TEST_NETWORK_PREFIX + "_" + suffix
+        network_id, subnet_id = self.__create_network_and_subnet_test_helper__(network_name)
+
+        # Add interface to router
+        port_id = self.neutron_operations.add_interface_router(router_id, subnet_id)
+        self.test_world['ports'].append(port_id)
+
+        return self.__deploy_instance_helper__(instance_name=instance_name,
+                                               network_name=network_name, is_network_new=False, **kwargs)
+
+    def __get_batch_network_id_list_test_helper__(self):
+        """
+        HELPER. Gets the nics of the instances deployed in batch: the shared network of the region
+        :return: List of nics (as in `launch_instance`)
+        """
+        network_name = self.__get_shared_network_test_helper__()
+        net_list = self.neutron_operations.find_networks(name=network_name)
+        self.assertTrue(len(net_list) != 0, "Required network '%s' could not be found" % network_name)
+        return [{'net-id': net_list[0]['id']}]
+
     @staticmethod
     def __add_transaction_id(path_resource):
         """
@@ -191,11 +254,14 @@ class FiwareRegionWithNetworkTest(FiwareRegionsBaseTests):
         if self.suite_world['allocated_ips']:
             self.skipTest("There were pre-existing, not deallocated IPs")
 
+        if self.uses_shared_test_vm(self._testMethodName):
+            return self.__e2e_connection_using_shared_test_vm_test_helper__()
+
         # Allocate an IP
         allocated_ip = self.__allocate_ip_test_helper__()
 
         # Create Keypair
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        suffix = self.__get_name_suffix_test_helper__()
         keypair_name = TEST_KEYPAIR_PREFIX + "_" + suffix
         private_keypair_value = self.__create_keypair_test_helper__(keypair_name)
 
@@ -230,7 +296,8 @@ class FiwareRegionWithNetworkTest(FiwareRegionsBaseTests):
 
         # SSH Connection
         login_name = self.region_conf.get(PROPERTIES_CONFIG_REGION_TEST_LOGIN_NAME, TEST_LOGIN_NAME_DEFAULT)
-        self.__ssh_connection_test_helper__(host=allocated_ip, private_key=private_keypair_value, login_name=login_name)
+        self.__ssh_connection_test_helper__(host=allocated_ip, private_key=private_keypair_value, login_name=login_name,
+                                            server_id=server_id)
 
     def __e2e_snat_connection_test_helper__(self, use_shared_network=True):
         """
@@ -249,6 +316,9 @@ class FiwareRegionWithNetworkTest(FiwareRegionsBaseTests):
             self.skipTest("No value found for '{}.{}' setting".format(
                 PROPERTIES_CONFIG_TEST, PROPERTIES_CONFIG_TEST_PHONEHOME_ENDPOINT))
 
+        if self.uses_shared_test_vm(self._testMethodName):
+            return self.__e2e_snat_connection_using_shared_test_vm_test_helper__()
+
         path_resource = self.__add_transaction_id(PHONEHOME_DBUS_OBJECT_PATH)
 
         # Load userdata from file and compile the template (replacing variable values)
@@ -260,7 +330,7 @@ class FiwareRegionWithNetworkTest(FiwareRegionsBaseTests):
                                                            path_resource=path_resource)
             self.logger.debug("Userdata content: %s", userdata_content)
 
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        suffix = self.__get_name_suffix_test_helper__()
 
         # Network
         if use_shared_network:
@@ -289,10 +359,12 @@ class FiwareRegionWithNetworkTest(FiwareRegionsBaseTests):
         expected_instance_name = instance_name.replace("_", "-")
 
         # Create new new DBus connection and wait for emitted signal from HTTP PhoneHome service
+        from commons.dbus_phonehome_service import DbusPhoneHomeClient
         client = DbusPhoneHomeClient(self.logger)
-        result = client.connect_and_wait_for_phonehome_signal(PHONEHOME_DBUS_NAME, PHONEHOME_DBUS_OBJECT_PATH,
-                                                              PHONEHOME_SIGNAL, expected_instance_name)
-        self.assertIsNotNone(result, "PhoneHome request not received from VM '%s'" % server_id)
+        with self.__console_log_capture_test_helper__(server_id):
+            result = client.connect_and_wait_for_phonehome_signal(PHONEHOME_DBUS_NAME, PHONEHOME_DBUS_OBJECT_PATH,
+                                                                  PHONEHOME_SIGNAL, expected_instance_name)
+            self.assertIsNotNone(result, "PhoneHome request not received from VM '%s'" % server_id)
         self.logger.debug("Request received from VM when 'calling home': %s", result)
 
         # Get hostname from data received
@@ -310,6 +382,7 @@ class FiwareRegionWithNetworkTest(FiwareRegionsBaseTests):
         :param external_network_id: External network id
         :return: Router id (String)
         """
+        from neutronclient.common.exceptions import IpAddressGenerationFailureClient
 
         try:
             router = self.neutron_operations.create_router(router_name, external_network_id)
@@ -343,7 +416,7 @@ class FiwareRegionWithNetworkTest(FiwareRegionsBaseTests):
         """
         Test whether it is possible to create a new network with subnets
         """
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        suffix = self.__get_name_suffix_test_helper__()
         network_name = TEST_NETWORK_PREFIX + "_" + suffix
         self.__create_network_and_subnet_test_helper__(network_name)
 
@@ -358,7 +431,7 @@ class FiwareRegionWithNetworkTest(FiwareRegionsBaseTests):
         """
         Test whether it is possible to create a new router without setting the gateway
         """
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        suffix = self.__get_name_suffix_test_helper__()
         router_name = TEST_ROUTER_PREFIX + "_" + suffix
         self.__create_router_test_helper__(router_name)
 
@@ -367,7 +440,7 @@ class FiwareRegionWithNetworkTest(FiwareRegionsBaseTests):
         Test whether it is possible to create a new router without external gateway and link new network port
         """
         # Create Router
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        suffix = self.__get_name_suffix_test_helper__()
         router_name = TEST_ROUTER_PREFIX + "_ports_" + suffix
         router_id = self.__create_router_test_helper__(router_name)
 
@@ -391,7 +464,7 @@ class FiwareRegionWithNetworkTest(FiwareRegionsBaseTests):
         external_network_id = self.__get_external_network_test_helper__()
 
         # Then, create router
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        suffix = self.__get_name_suffix_test_helper__()
         router_name = TEST_ROUTER_PREFIX + "_ext_" + suffix
         self.__create_router_test_helper__(router_name, external_network_id)
 
@@ -399,7 +472,7 @@ class FiwareRegionWithNetworkTest(FiwareRegionsBaseTests):
         """
         Test whether it is possible to deploy an instance with a new network
         """
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        suffix = self.__get_name_suffix_test_helper__()
         instance_name = TEST_SERVER_PREFIX + "_network_" + suffix
         network_name = TEST_NETWORK_PREFIX + "_" + suffix
         self.__deploy_instance_helper__(instance_name=instance_name,
@@ -409,7 +482,7 @@ class FiwareRegionWithNetworkTest(FiwareRegionsBaseTests):
         """
         Test whether it is possible to deploy an instance with a new network and custom metadata
         """
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        suffix = self.__get_name_suffix_test_helper__()
         instance_name = TEST_SERVER_PREFIX + "_network_metadata_" + suffix
         instance_meta = {"test_item": "test_value"}
         network_name = TEST_NETWORK_PREFIX + "_" + suffix
@@ -421,7 +494,7 @@ class FiwareRegionWithNetworkTest(FiwareRegionsBaseTests):
         """
         Test whether it is possible to deploy an instance with a new network and new keypair
         """
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        suffix = self.__get_name_suffix_test_helper__()
         instance_name = TEST_SERVER_PREFIX + "_network_keypair_" + suffix
         keypair_name = TEST_KEYPAIR_PREFIX + "_" + suffix
         network_name = TEST_NETWORK_PREFIX + "_" + suffix
@@ -433,7 +506,7 @@ class FiwareRegionWithNetworkTest(FiwareRegionsBaseTests):
         """
         Test whether it is possible to deploy an instance with a new network and new security group
         """
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        suffix = self.__get_name_suffix_test_helper__()
         instance_name = TEST_SERVER_PREFIX + "_network_sec_group_" + suffix
         sec_group_name = TEST_SEC_GROUP_PREFIX + "_" + suffix
         network_name = TEST_NETWORK_PREFIX + "_" + suffix
@@ -445,7 +518,7 @@ class FiwareRegionWithNetworkTest(FiwareRegionsBaseTests):
         """
         Test whether it is possible to deploy an instance with a new network and all params
         """
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        suffix = self.__get_name_suffix_test_helper__()
         instance_name = TEST_SERVER_PREFIX + "_network_all_params_" + suffix
         instance_meta = {"test_item": "test_value"}
         keypair_name = TEST_KEYPAIR_PREFIX + "_" + suffix
@@ -470,7 +543,7 @@ class FiwareRegionWithNetworkTest(FiwareRegionsBaseTests):
         allocated_ip = self.__allocate_ip_test_helper__()
 
         # Create Router with an external network gateway
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        suffix = self.__get_name_suffix_test_helper__()
         router_name = TEST_ROUTER_PREFIX + "_public_ip_" + suffix
         external_network_id = self.__get_external_network_test_helper__()
         router_id = self.__create_router_test_helper__(router_name, external_network_id)
@@ -536,6 +609,9 @@ class FiwareRegionWithNetworkTest(FiwareRegionsBaseTests):
             self.skipTest("No value found for '{}.{}' setting".format(
                 PROPERTIES_CONFIG_TEST, PROPERTIES_CONFIG_TEST_PHONEHOME_ENDPOINT))
 
+        if self.uses_shared_test_vm(self._testMethodName):
+            return self.__metadata_service_using_shared_test_vm_test_helper__()
+
         path_resource = PHONEHOME_DBUS_OBJECT_METADATA_PATH
         metadata_service_url = self.conf[PROPERTIES_CONFIG_TEST][PROPERTIES_CONFIG_METADATA_SERVICE_URL]
 
@@ -551,7 +627,7 @@ class FiwareRegionWithNetworkTest(FiwareRegionsBaseTests):
             self.logger.debug("Userdata content: %s", userdata_content)
 
         # Create Router with an external network gateway
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        suffix = self.__get_name_suffix_test_helper__()
         router_name = TEST_ROUTER_PREFIX + "_meta_" + suffix
         external_network_id = self.__get_external_network_test_helper__()
         router_id = self.__create_router_test_helper__(router_name, external_network_id)
@@ -579,15 +655,19 @@ class FiwareRegionWithNetworkTest(FiwareRegionsBaseTests):
         expected_instance_name = instance_name.replace("_", "-")
 
         # Create new DBus connection and wait for emitted signal from HTTP PhoneHome service
+        from commons.dbus_phonehome_service import DbusPhoneHomeClient
         client = DbusPhoneHomeClient(self.logger)
 
-        result = client.connect_and_wait_for_phonehome_signal(PHONEHOME_DBUS_NAME, PHONEHOME_DBUS_OBJECT_METADATA_PATH,
-                                                              PHONEHOME_METADATA_SIGNAL, expected_instance_name)
+        with self.__console_log_capture_test_helper__(server_id):
+            result = client.connect_and_wait_for_phonehome_signal(PHONEHOME_DBUS_NAME,
+                                                                  PHONEHOME_DBUS_OBJECT_METADATA_PATH,
+                                                                  PHONEHOME_METADATA_SIGNAL, expected_instance_name)
 
-        # First, check that the DBus is registered on the system
-        self.assertNotEqual(result, False, "PhoneHome bus or object not found. Please check the PhoneHome services.")
+            # First, check that the DBus is registered on the system
+            self.assertNotEqual(result, False,
+                                "PhoneHome bus or object not found. Please check the PhoneHome services.")
 
-        self.assertIsNotNone(result, "PhoneHome request not received from VM '%s'" % server_id)
+            self.assertIsNotNone(result, "PhoneHome request not received from VM '%s'" % server_id)
         self.logger.debug("Request received from VM when 'calling home': %s", result)
 
         # Get metadata from data received
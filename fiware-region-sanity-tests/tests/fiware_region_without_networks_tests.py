@@ -22,18 +22,20 @@
 # contact with opensource@tid.es
 
 
-from novaclient.exceptions import OverLimit, Forbidden, ClientException
 from tests.fiware_region_base_tests import FiwareRegionsBaseTests
 from commons.constants import *
-from datetime import datetime
-from commons.dbus_phonehome_service import DbusPhoneHomeClient
 from commons.template_utils import replace_template_properties
+from commons.keypair_pool import KeypairPool
 import re
 import json
 
 
 class FiwareRegionWithoutNetworkTest(FiwareRegionsBaseTests):
 
+    # Tests checking the shared test instance (in shared test instance mode)
+    shared_test_vm_tests = r'test_deploy_instance_and_(e2e_connection_using_public_ip|e2e_snat_connection|' \
+                           r'check_metadata_service)$'
+
     def __deploy_instance_helper__(self, instance_name, keypair_name=None, is_keypair_new=True,
                                    sec_group_name=None, metadata=None, userdata=None):
         """
@@ -51,6 +53,7 @@ class FiwareRegionWithoutNetworkTest(FiwareRegionsBaseTests):
         :param userdata: userdata file content (String)
         :return: Created Server ID (String)
         """
+        from novaclient.exceptions import OverLimit, Forbidden, ClientException
 
         flavor_id = self.nova_operations.get_any_flavor_id()
         self.assertIsNotNone(flavor_id, "Problems retrieving a flavor")
@@ -59,28 +62,34 @@ class FiwareRegionWithoutNetworkTest(FiwareRegionsBaseTests):
         image_id = self.nova_operations.find_image_id_by_name(image_name=base_image_name)
         self.assertIsNotNone(image_id, "Problems retrieving the image '{}'".format(base_image_name))
 
-        # instance prerequisites
-        try:
-            if keypair_name:
-                if is_keypair_new:
-                    self.nova_operations.create_keypair(keypair_name)
-                    self.test_world['keypair_names'].append(keypair_name)
-                else:
-                    keypair_found = self.nova_operations.find_keypair(name=keypair_name)
-                    self.assertIsNotNone(keypair_found, "Required Keypair '%s' could not be found" % keypair_name)
-        except ClientException as e:
-            self.logger.debug("Required keypair could not be created: %s", e)
-            self.fail(e)
-
-        try:
-            security_group_name_list = None
-            if sec_group_name:
-                sec_group_id = self.nova_operations.create_security_group_and_rules(sec_group_name)
-                self.test_world['sec_groups'].append(sec_group_id)
-                security_group_name_list = [sec_group_name]
-        except ClientException as e:
-            self.logger.debug("Required security group could not be created: %s", e)
-            self.fail(e)
+        # instance prerequisites (independent of each other, thus created concurrently)
+        def create_keypair():
+            try:
+                if keypair_name:
+                    if is_keypair_new:
+                        public_key = KeypairPool.get_public_key(self.get_keypair_pool().get())
+                        self.nova_operations.create_keypair(keypair_name, public_key)
+                        self.test_world['keypair_names'].append(keypair_name)
+                    else:
+                        keypair_found = self.nova_operations.find_keypair(name=keypair_name)
+                        self.assertIsNotNone(keypair_found, "Required Keypair '%s' could not be found" % keypair_name)
+            except ClientException as e:
+                self.logger.debug("Required keypair could not be created: %s", e)
+                self.fail(e)
+
+        def create_sec_group():
+            try:
+                security_group_name_list = None
+                if sec_group_name:
+                    sec_group_id = self.nova_operations.create_security_group_and_rules(sec_group_name)
+                    self.test_world['sec_groups'].append(sec_group_id)
+                    security_group_name_list = [sec_group_name]
+                return security_group_name_list
+            except ClientException as e:
+                self.logger.debug("Required security group could not be created: %s", e)
+                self.fail(e)
+
+        _, security_group_name_list = self.__run_concurrently_test_helper__(create_keypair, create_sec_group)
 
         # create new instance
         try:
@@ -101,7 +110,7 @@ class FiwareRegionWithoutNetworkTest(FiwareRegionsBaseTests):
             self.test_world['servers'].append(server_data['id'])
 
         # Wait for status=ACTIVE
-        status, detail = self.nova_operations.wait_for_task_status(server_data['id'], 'ACTIVE')
+        status, detail = self.nova_operations.wait_for_task_status(server_data['id'], 'ACTIVE', self.metrics)
         self.assertEqual(status, 'ACTIVE', "{detail}. Current status is {status}".format(detail=detail, status=status))
 
         return server_data['id']
@@ -110,7 +119,7 @@ class FiwareRegionWithoutNetworkTest(FiwareRegionsBaseTests):
         """
         Test whether it is possible to deploy an instance with custom metadata
         """
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        suffix = self.__get_name_suffix_test_helper__()
         instance_name = TEST_SERVER_PREFIX + "_metadata_" + suffix
         instance_meta = {"test_item": "test_value"}
         self.__deploy_instance_helper__(instance_name=instance_name, metadata=instance_meta)
@@ -119,7 +128,7 @@ class FiwareRegionWithoutNetworkTest(FiwareRegionsBaseTests):
         """
         Test whether it is possible to deploy an instance with new keypair
         """
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        suffix = self.__get_name_suffix_test_helper__()
         instance_name = TEST_SERVER_PREFIX + "_keypair_" + suffix
         keypair_name = TEST_KEYPAIR_PREFIX + "_" + suffix
         self.__deploy_instance_helper__(instance_name=instance_name, keypair_name=keypair_name)
@@ -128,7 +137,7 @@ class FiwareRegionWithoutNetworkTest(FiwareRegionsBaseTests):
         """
         Test whether it is possible to deploy an instance with new security group
         """
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        suffix = self.__get_name_suffix_test_helper__()
         instance_name = TEST_SERVER_PREFIX + "_sec_group_" + suffix
         sec_group_name = TEST_SEC_GROUP_PREFIX + "_" + suffix
         self.__deploy_instance_helper__(instance_name=instance_name, sec_group_name=sec_group_name)
@@ -137,7 +146,7 @@ class FiwareRegionWithoutNetworkTest(FiwareRegionsBaseTests):
         """
         Test whether it is possible to deploy an instance with all params
         """
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        suffix = self.__get_name_suffix_test_helper__()
         instance_meta = {"test_item": "test_value"}
         instance_name = TEST_SERVER_PREFIX + "_all_params_" + suffix
         keypair_name = TEST_KEYPAIR_PREFIX + "_" + suffix
@@ -151,7 +160,7 @@ class FiwareRegionWithoutNetworkTest(FiwareRegionsBaseTests):
         """
 
         # Deploy VM
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        suffix = self.__get_name_suffix_test_helper__()
         instance_name = TEST_SERVER_PREFIX + "_public_ip" + suffix
 
         # Deploy
@@ -167,7 +176,10 @@ class FiwareRegionWithoutNetworkTest(FiwareRegionsBaseTests):
         """
         Test whether it is possible to deploy and instance, assign an allocated public IP and establish a SSH connection
         """
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        if self.uses_shared_test_vm(self._testMethodName):
+            return self.__e2e_connection_using_shared_test_vm_test_helper__()
+
+        suffix = self.__get_name_suffix_test_helper__()
 
         # Create Keypair
         keypair_name = TEST_KEYPAIR_PREFIX + "_" + suffix
@@ -189,7 +201,7 @@ class FiwareRegionWithoutNetworkTest(FiwareRegionsBaseTests):
         # SSH Connection
         login_name = self.region_conf.get(PROPERTIES_CONFIG_REGION_TEST_LOGIN_NAME, TEST_LOGIN_NAME_DEFAULT)
         self.__ssh_connection_test_helper__(host=allocated_ip, private_key=private_keypair_value,
-                                            login_name=login_name)
+                                            login_name=login_name, server_id=server_id)
 
     def test_deploy_instance_and_e2e_snat_connection(self):
         """
@@ -202,6 +214,9 @@ class FiwareRegionWithoutNetworkTest(FiwareRegionsBaseTests):
             self.skipTest("No value found for '{}.{}' setting".format(
                 PROPERTIES_CONFIG_TEST, PROPERTIES_CONFIG_TEST_PHONEHOME_ENDPOINT))
 
+        if self.uses_shared_test_vm(self._testMethodName):
+            return self.__e2e_snat_connection_using_shared_test_vm_test_helper__()
+
         path_resource = PHONEHOME_DBUS_OBJECT_PATH
 
         # Load userdata from file and compile the template (replacing variable values)
@@ -213,7 +228,7 @@ class FiwareRegionWithoutNetworkTest(FiwareRegionsBaseTests):
             self.logger.debug("Userdata content: %s", userdata_content)
 
         # Deploy VM
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        suffix = self.__get_name_suffix_test_helper__()
         instance_name = TEST_SERVER_PREFIX + "_snat_" + suffix
         server_id = self.__deploy_instance_helper__(instance_name=instance_name,
                                                     userdata=userdata_content)
@@ -222,10 +237,12 @@ class FiwareRegionWithoutNetworkTest(FiwareRegionsBaseTests):
         expected_instance_name = instance_name.replace("_", "-")
 
         # Create new new DBus connection and wait for emitted signal from HTTP PhoneHome service
+        from commons.dbus_phonehome_service import DbusPhoneHomeClient
         client = DbusPhoneHomeClient(self.logger)
-        result = client.connect_and_wait_for_phonehome_signal(PHONEHOME_DBUS_NAME, PHONEHOME_DBUS_OBJECT_PATH,
-                                                              PHONEHOME_SIGNAL, expected_instance_name)
-        self.assertIsNotNone(result, "PhoneHome request not received from VM '%s'" % server_id)
+        with self.__console_log_capture_test_helper__(server_id):
+            result = client.connect_and_wait_for_phonehome_signal(PHONEHOME_DBUS_NAME, PHONEHOME_DBUS_OBJECT_PATH,
+                                                                  PHONEHOME_SIGNAL, expected_instance_name)
+            self.assertIsNotNone(result, "PhoneHome request not received from VM '%s'" % server_id)
         self.logger.debug("Request received from VM when 'calling home': %s", result)
 
         # Get hostname from data received
@@ -248,6 +265,9 @@ class FiwareRegionWithoutNetworkTest(FiwareRegionsBaseTests):
             self.skipTest("No value found for '{}.{}' setting".format(
                 PROPERTIES_CONFIG_TEST, PROPERTIES_CONFIG_TEST_PHONEHOME_ENDPOINT))
 
+        if self.uses_shared_test_vm(self._testMethodName):
+            return self.__metadata_service_using_shared_test_vm_test_helper__()
+
         path_resource = PHONEHOME_DBUS_OBJECT_METADATA_PATH
         metadata_service_url = self.conf[PROPERTIES_CONFIG_TEST][PROPERTIES_CONFIG_METADATA_SERVICE_URL]
 
@@ -260,7 +280,7 @@ class FiwareRegionWithoutNetworkTest(FiwareRegionsBaseTests):
                                                            openstack_metadata_service_url=metadata_service_url)
             self.logger.debug("Userdata content: %s", userdata_content)
 
-        suffix = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        suffix = self.__get_name_suffix_test_helper__()
 
         # Create Metadata
         metadata = {"region": self.region_name, "foo": "bar-" + suffix}
@@ -276,10 +296,13 @@ class FiwareRegionWithoutNetworkTest(FiwareRegionsBaseTests):
         expected_instance_name = instance_name.replace("_", "-")
 
         # Create new DBus connection and wait for emitted signal from HTTP PhoneHome service
+        from commons.dbus_phonehome_service import DbusPhoneHomeClient
         client = DbusPhoneHomeClient(self.logger)
-        result = client.connect_and_wait_for_phonehome_signal(PHONEHOME_DBUS_NAME, PHONEHOME_DBUS_OBJECT_METADATA_PATH,
-                                                              PHONEHOME_METADATA_SIGNAL, expected_instance_name)
-        self.assertIsNotNone(result, "PhoneHome request not received from VM '%s'" % server_id)
+        with self.__console_log_capture_test_helper__(server_id):
+            result = client.connect_and_wait_for_phonehome_signal(PHONEHOME_DBUS_NAME,
+                                                                  PHONEHOME_DBUS_OBJECT_METADATA_PATH,
+                                                                  PHONEHOME_METADATA_SIGNAL, expected_instance_name)
+            self.assertIsNotNone(result, "PhoneHome request not received from VM '%s'" % server_id)
         self.logger.debug("Request received from VM when 'calling home': %s", result)
 
         # Get metadata from data received
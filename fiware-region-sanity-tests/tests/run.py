@@ -26,7 +26,27 @@
 """Run tests (using nose) in selected region/s, according to command line arguments.
 
 Usage:
-  {prog} [nose_options] region|test_spec ...
+  {prog} [options] [nose_options] region|test_spec ...
+
+Options:
+  --parallel-regions=N              Run up to N regions at the same time, each one in its own worker process
+  --region-concurrency=N            Run up to N tests of a region at the same time (as long as quotas allow)
+  --test-timeout=SECONDS            Interrupt (as failed) any test lasting longer than SECONDS, but its teardown
+  --region-timeout=SECONDS          Interrupt (as failed) the tests of a region still running after SECONDS
+  --shared-test-vm                  Check SSH, SNAT and metadata service connectivity on a single instance per region,
+                                    instead of deploying a new one for each of these tests
+  --background-teardown             Release the resources of each test in background, so that the next test may start
+                                    at once (but waits for the resources it requires, if still being released)
+  --daemon-interval=SECONDS         Run as a daemon, starting the tests of all regions every SECONDS
+  --daemon-schedule=SCHEDULE        Schedule of the daemon: 'passes' (default) to test all regions once per interval,
+                                    or 'staleness' to test one region at a time, that most overdue according to the
+                                    interval (shortened for NOK/POK regions), its last check and its duration
+  --coordinator=[HOST:]PORT         Publish the regions to test in a work queue listening at the given address, then
+                                    wait for workers to report their results
+  --worker=HOST:PORT                Run the regions published by the coordinator at the given address, one at a time,
+                                    until none is left
+  --rerun-failed=XUNIT_FILE         Run again only the tests failed in a previous xUnit report, then update its
+                                    outcomes into the new xUnit report (if any)
 
 Environment:
   OS_AUTH_URL                       The URL of OpenStack Identity Service for authentication
@@ -39,6 +59,10 @@ Environment:
   OS_PROJECT_DOMAIN_NAME            (Only in Identity v3) The project domain name for authentication
   SANITY_CHECKS_SETTINGS            (Optional) Path to settings file
   SANITY_CHECKS_LOGGING             (Optional) Path to logging configuration file
+  FIHEALTH_HISTORY                  (Optional) Path to reports of previous executions (to run longest tests first)
+  FIHEALTH_ADAPTER_URL              (Optional, daemon mode) NGSI Adapter endpoint to change the status of regions
+  FIHEALTH_CB_URL                   (Optional, daemon mode) Context Broker endpoint to update elapsed times
+  FIHEALTH_WORK_QUEUE_AUTHKEY       (Required in coordinator/worker mode) Secret key shared by coordinator and workers
   TEST_PHONEHOME_ENDPOINT           (Optional) PhoneHome service endpoint
 
 Files:
@@ -52,18 +76,529 @@ import re
 import sys
 import os.path
 import argparse
+import subprocess
+import tempfile
+import socket
+import time
 import json
+import glob
 import nose
+import Queue
+from StringIO import StringIO
 
 parentdir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
 sys.path.insert(0, parentdir)
 
-from tests.fiware_region_with_networks_tests import FiwareRegionWithNetworkTest  # noqa: ignore=E402
-from tests.fiware_region_without_networks_tests import FiwareRegionWithoutNetworkTest  # noqa: ignore=E402
-from tests.fiware_region_object_storage_tests import FiwareRegionsObjectStorageTests  # noqa: ignore=E402
 from commons.constants import DEFAULT_SETTINGS_FILE, DEFAULT_LOGGING_CONF  # noqa: ignore=E402
 from commons.constants import PROPERTIES_CONFIG_REGION, PROPERTIES_CONFIG_REGION_SHARED_NET  # noqa: ignore=E402
 from commons.constants import PROPERTIES_CONFIG_SWIFT_ENABLED  # noqa: ignore=E402
+from commons.constants import PROPERTIES_CONFIG_REGION_TEST_BATCH_SIZE  # noqa: ignore=E402
+from commons.constants import HISTORY_REPORT_PATTERN, HISTORY_MAX_REPORTS  # noqa: ignore=E402
+from commons.constants import LOGGING_OUTPUT_NOVA_CONSOLE_LOG_TEMPLATE  # noqa: ignore=E402
+from commons.xunit_report import merge_reports, get_test_durations  # noqa: ignore=E402
+from commons.xunit_report import get_failed_tests, update_report  # noqa: ignore=E402
+from commons.region_status import move_reports_to_history, write_summary_report  # noqa: ignore=E402
+from commons.region_status import change_status, update_elapsed_time  # noqa: ignore=E402
+from commons.region_status import read_last_check, get_next_region  # noqa: ignore=E402
+from commons.work_queue import parse_address, serve_work_queue, connect_work_queue  # noqa: ignore=E402
+from commons.work_queue import WorkItemHeartbeat  # noqa: ignore=E402
+from commons.constants import WORK_QUEUE_HEARTBEAT_TIMEOUT, WORK_QUEUE_MAX_ATTEMPTS  # noqa: ignore=E402
+from commons.constants import WORK_QUEUE_DEADLINE  # noqa: ignore=E402
+from commons.result_feed import ResultFeed  # noqa: ignore=E402
+from commons.test_scheduler import RegionTestScheduler, ScheduledTask, TestEventRecorder  # noqa: ignore=E402
+from nose.plugins.xunit import Xunit  # noqa: ignore=E402
+from nose.plugins.logcapture import LogCapture  # noqa: ignore=E402
+from inspect import isclass  # noqa: ignore=E402
+
+# Default filename of xUnit report (as in nose `xunit` plugin) and polling interval for worker processes (seconds)
+DEFAULT_XUNIT_FILE = 'nosetests.xml'
+DAEMON_OUTPUT_NAME = '{region_name}_results'
+DAEMON_SCHEDULE_PASSES = 'passes'
+DAEMON_SCHEDULE_STALENESS = 'staleness'
+WORKER_POLLING_INTERVAL = 1
+
+
+def read_settings(settings_file):
+    """
+    Read the settings file (exiting in case of parse errors)
+    :param settings_file: Path of the settings file
+    :return: Settings as a Python dict
+    """
+    with open(settings_file) as settings:
+        try:
+            return json.load(settings)
+        except Exception as e:
+            print "Error parsing settings file '{}': {}".format(settings_file, e)
+            sys.exit(-1)
+
+
+def get_region_of_test_spec(test):
+    """
+    Get the region of a test specification (either 'Region' or 'Region.test_pattern')
+    :param test: Test specification
+    :return: Region name
+    """
+    return re.sub(r'^(\w+)\.\S+$', '\g<1>', test)
+
+
+def pop_option(options, name):
+    """
+    Remove a nose option given either as `name=value` or `name value` from the list of options
+    :param options: List of nose options (will be modified)
+    :param name: Name of the option (including the leading dashes)
+    :return: The value of the option, or None if not found
+    """
+    value = None
+    for i, option in reversed(list(enumerate(options))):
+        if option.startswith(name + '='):
+            value = options.pop(i).split('=', 1)[1]
+        elif option == name and i + 1 < len(options):
+            value = options.pop(i + 1)
+            options.pop(i)
+    return value
+
+
+def group_tests_by_region(tests):
+    """
+    Group test specifications by region (ignoring those of regions not found in settings)
+    :param tests: List of test specifications (all the regions, if empty)
+    :return: Python dict with the list of test specifications of each region
+    """
+    conf = read_settings(RegionTestsLoader.settings_file)
+    region_list = [str(region) for region in conf[PROPERTIES_CONFIG_REGION].keys()]
+
+    test_specs = {}
+    for test in tests or region_list:
+        region = get_region_of_test_spec(test)
+        if region in region_list:
+            test_specs.setdefault(region, []).append(test)
+    return test_specs
+
+
+def get_failed_test_specs(failed_tests, tests):
+    """
+    Get the specifications of the tests to run again from those failed in a previous execution: a failed test of a
+    region is selected by its exact name, whereas errors of the region itself (i.e. at class setup) select all its
+    tests.
+    :param failed_tests: List of tuples with the class name and name of the failed tests (as in xUnit reports)
+    :param tests: List of test specifications to restrict the failed tests to (all the regions, if empty)
+    :return: List of test specifications
+    """
+    regions = [get_region_of_test_spec(test) for test in tests]
+    test_specs = []
+    for class_name, name in failed_tests:
+        match = re.match(r'^__main__\.(\w+)$', class_name)
+        if match:
+            region, test = match.group(1), '{0}.{1}$'.format(match.group(1), name)
+        else:
+            match = re.search(r'context=(\w+)', '{0}.{1}'.format(class_name, name))
+            if not match:
+                continue
+            region = test = match.group(1)
+        if (not regions or region in regions) and test not in test_specs:
+            test_specs.append(test)
+    return test_specs
+
+
+def run_regions_in_parallel(options, tests, max_workers):
+    """
+    Run the tests of each region in its own worker process (with its own log file and test world), with at most
+    `max_workers` regions at the same time. Then merge the xUnit reports of the workers into the one given in nose
+    options (HTML reports, if any, are kept apart per region).
+    :param options: List of nose options
+    :param tests: List of test specifications (all the regions, if empty)
+    :param max_workers: Maximum number of worker processes
+    :return: Result code (non zero if any worker failed)
+    """
+    test_specs = group_tests_by_region(tests)
+
+    # Reports to be written by every worker
+    options = list(options)
+    xunit_file = pop_option(options, '--xunit-file')
+    if '--with-xunit' in options:
+        xunit_file = xunit_file or DEFAULT_XUNIT_FILE
+    html_file = pop_option(options, '--html-report')
+
+    def region_filename(filename, region):
+        basename, ext = os.path.splitext(filename)
+        return '{0}_{1}{2}'.format(basename, region, ext)
+
+    # Launch workers (one per region)
+    result_code = 0
+    xunit_region_files = []
+    pending = sorted(test_specs.items())
+    running = {}
+    while pending or running:
+        while pending and len(running) < max_workers:
+            region, specs = pending.pop(0)
+            region_options = list(options)
+            if xunit_file:
+                xunit_region_files.append(region_filename(xunit_file, region))
+                region_options.append('--xunit-file=' + xunit_region_files[-1])
+            if html_file:
+                region_options.append('--html-report=' + region_filename(html_file, region))
+            output = tempfile.TemporaryFile()
+            command = [sys.executable, os.path.abspath(__file__)] + region_options + specs
+            print "Starting worker for region {}...".format(region)
+            running[region] = (subprocess.Popen(command, stdout=output, stderr=subprocess.STDOUT), output)
+
+        time.sleep(WORKER_POLLING_INTERVAL)
+        for region, (process, output) in running.items():
+            if process.poll() is not None:
+                del running[region]
+                output.seek(0)
+                print "Worker for region {} finished (result code={}):".format(region, process.returncode)
+                print output.read()
+                output.close()
+                result_code = result_code or process.returncode
+
+    # Merge xUnit reports
+    if xunit_file:
+        existing_files = [filename for filename in xunit_region_files if os.path.isfile(filename)]
+        for filename in set(xunit_region_files) - set(existing_files):
+            print "Missing xUnit report {}".format(filename)
+        merge_reports(existing_files, xunit_file)
+        for filename in existing_files:
+            os.remove(filename)
+
+    return result_code
+
+
+def run_coordinator(options, tests, address, authkey):
+    """
+    Publish the tests of each region as a work item in a work queue, to be pulled by workers (maybe in other hosts),
+    and wait until all of them report their results. Workers acknowledge every region taken from the queue and report
+    heartbeats while testing it: should they stop (i.e. the worker died), the region is published again or, after
+    WORK_QUEUE_MAX_ATTEMPTS, given up as failed. Regions not finished by WORK_QUEUE_DEADLINE are also failed. Then
+    signal the workers that no regions are left (a None work item, put back by every worker that gets it) and merge
+    the xUnit reports of the regions into the one given in nose options.
+    :param options: List of nose options
+    :param tests: List of test specifications (all the regions, if empty)
+    :param address: Address to listen to (as '[host:]port')
+    :param authkey: Secret key authenticating the workers
+    :return: Result code (non zero if any region failed)
+    """
+    options = list(options)
+    xunit_file = pop_option(options, '--xunit-file')
+    if '--with-xunit' in options:
+        xunit_file = xunit_file or DEFAULT_XUNIT_FILE
+
+    work_queue, result_queue = serve_work_queue(parse_address(address), authkey)
+    test_specs = group_tests_by_region(tests)
+    for region, specs in sorted(test_specs.items()):
+        work_queue.put((region, specs))
+    pending = set(test_specs)
+    print "Published {} regions to test at {}: waiting for workers...".format(len(pending), address)
+
+    # Regions taken by workers: worker and time of its last acknowledgement or heartbeat, by region
+    taken = {}
+    attempts = dict((region, 0) for region in pending)
+    deadline = time.time() + WORK_QUEUE_DEADLINE
+    result_code = 0
+    xunit_reports = []
+    while pending:
+        now = time.time()
+        if now > deadline:
+            print "Deadline exceeded, regions not finished: {}".format(', '.join(sorted(pending)))
+            result_code = 1
+            break
+        for region, (worker, last_heartbeat) in taken.items():
+            if now - last_heartbeat > WORK_QUEUE_HEARTBEAT_TIMEOUT:
+                del taken[region]
+                if attempts[region] < WORK_QUEUE_MAX_ATTEMPTS:
+                    print "Worker {} lost while testing region {}: publishing it again".format(worker, region)
+                    work_queue.put((region, test_specs[region]))
+                else:
+                    print "Worker {} lost while testing region {}: giving up".format(worker, region)
+                    pending.discard(region)
+                    result_code = 1
+
+        try:
+            result = result_queue.get(True, WORKER_POLLING_INTERVAL)
+        except Queue.Empty:
+            continue
+        region = result['region']
+        if region not in pending:
+            continue
+        if result['event'] in ['taken', 'alive']:
+            if region not in taken or taken[region][0] == result['worker']:
+                if region not in taken:
+                    attempts[region] += 1
+                    print "Worker {} took region {} (attempt {})".format(result['worker'], region, attempts[region])
+                taken[region] = (result['worker'], time.time())
+            continue
+
+        pending.discard(region)
+        taken.pop(region, None)
+        print "Worker {} finished region {} (result code={}), {} regions left".format(
+            result['worker'], region, result['result_code'], len(pending))
+        result_code = result_code or result['result_code']
+        if result['xunit_report']:
+            xunit_reports.append(StringIO(result['xunit_report']))
+        else:
+            print "Missing xUnit report of region {}".format(region)
+
+    # Signal workers that no regions are left
+    work_queue.put(None)
+
+    # Merge xUnit reports
+    if xunit_file:
+        merge_reports(xunit_reports, xunit_file)
+
+    return result_code
+
+
+def run_worker(options, address, authkey):
+    """
+    Pull work items (the tests of a region) from the work queue of a coordinator and run them in a worker process,
+    one at a time, reporting the results (xUnit report) back to the coordinator. Workers keep polling the queue (as
+    regions of lost workers may be published again) until the coordinator signals that no regions are left, or
+    the connection to it is lost.
+    :param options: List of nose options
+    :param address: Address of the coordinator (as 'host:port')
+    :param authkey: Secret key authenticating this worker
+    :return: Result code (non zero if any region failed)
+    """
+    options = list(options)
+    for name in ['--xunit-file', '--html-report']:
+        pop_option(options, name)
+    options = [option for option in options if option not in ['--with-xunit', '--with-html']]
+
+    work_queue, result_queue = connect_work_queue(parse_address(address), authkey)
+    worker = '{0}:{1}'.format(socket.gethostname(), os.getpid())
+    result_code = 0
+    while True:
+        try:
+            work_item = work_queue.get(True, WORKER_POLLING_INTERVAL)
+            if work_item is None:
+                work_queue.put(None)
+                print "No regions left to test"
+                return result_code
+            region, specs = work_item
+            result_queue.put(dict(event='taken', region=region, worker=worker))
+        except Queue.Empty:
+            continue
+        except (EOFError, IOError) as e:
+            print "Connection to coordinator lost: {}".format(e)
+            return result_code or 1
+
+        handle, xunit_file = tempfile.mkstemp(suffix='.xml')
+        os.close(handle)
+        region_result_code, xunit_report = 1, None
+        try:
+            with WorkItemHeartbeat(result_queue, region, worker):
+                region_options = options + ['--with-xunit', '--xunit-file=' + xunit_file]
+                region_result_code = run_regions_in_parallel(region_options, specs, 1)
+                with open(xunit_file) as report:
+                    xunit_report = report.read()
+        except Exception as e:
+            print "Error running tests of region {}: {}".format(region, e)
+        finally:
+            os.remove(xunit_file)
+
+        result_code = result_code or region_result_code
+        try:
+            result_queue.put(dict(event='finished', region=region, worker=worker, result_code=region_result_code,
+                                  xunit_report=xunit_report))
+        except (EOFError, IOError) as e:
+            print "Could not report results of region {} to coordinator: {}".format(region, e)
+            return result_code or 1
+
+
+def run_daemon(options, tests, interval, schedule=DAEMON_SCHEDULE_PASSES):
+    """
+    Run the tests of the regions forever, either starting them all every `interval` seconds (passes schedule) or one
+    region at a time, choosing the most overdue one (staleness schedule, see `commons.region_status.get_next_region`).
+    Test classes of the regions (along with their auth sessions and API clients) are kept between executions. After
+    testing a region, its reports are written and its status changed as Jenkins jobs do (see
+    `resources/scripts/jenkins.sh`): previous reports are moved to history, `<region>_results.xml/.txt` (and `.html`,
+    if a template is given) are written and then NGSI Adapter and Context Broker are invoked.
+    :param options: List of nose options
+    :param tests: List of test specifications (all the regions, if empty)
+    :param interval: Seconds between the start of consecutive executions (or between checks of OK regions)
+    :param schedule: Either DAEMON_SCHEDULE_PASSES or DAEMON_SCHEDULE_STALENESS
+    :return: None
+    """
+    options = list(options)
+    for name in ['--xunit-file', '--html-report']:
+        pop_option(options, name)
+    options = [option for option in options if option not in ['--with-xunit', '--with-html']]
+    with_html = any(option.startswith('--html-report-template') for option in options)
+    adapter_url = os.environ.get('FIHEALTH_ADAPTER_URL')
+    context_broker_url = os.environ.get('FIHEALTH_CB_URL')
+
+    last_checks = {}
+    execution = 0
+    next_start = time.time()
+    while True:
+        # Errors in a pass (or in a region) are reported and the daemon goes on with the next one
+        try:
+            conf = read_settings(RegionTestsLoader.settings_file)
+            test_specs = group_tests_by_region(tests)
+            regions = sorted(test_specs)
+            if schedule == DAEMON_SCHEDULE_STALENESS:
+                for region in set(regions) - set(last_checks):
+                    last_check = read_last_check(conf, region, DAEMON_OUTPUT_NAME.format(region_name=region) + '.xml')
+                    if last_check:
+                        last_checks[region] = last_check
+                region, wait = get_next_region(regions, last_checks, interval)
+                if region is None:
+                    time.sleep(max(0, min(wait, interval)))
+                    continue
+                regions = [region]
+
+            execution += 1
+            for region in regions:
+                start_time = time.time()
+                status = None
+                try:
+                    status = run_daemon_region(options, test_specs[region], region, conf, execution, with_html,
+                                               adapter_url, context_broker_url)
+                except Exception as e:
+                    print "Error in execution {} of Sanity Checks for region {}: {}".format(execution, region, e)
+                last_checks[region] = dict(time=time.time(), status=status, duration=time.time() - start_time)
+        except Exception as e:
+            print "Error in execution {} of Sanity Checks: {}".format(execution, e)
+            if schedule == DAEMON_SCHEDULE_STALENESS:
+                time.sleep(interval)
+
+        if schedule == DAEMON_SCHEDULE_PASSES:
+            next_start = max(next_start + interval, time.time())
+            time.sleep(max(0, next_start - time.time()))
+
+
+def run_daemon_region(options, specs, region, conf, execution, with_html, adapter_url, context_broker_url):
+    """
+    Run the tests of a region once in daemon mode, then write its reports and change its status (see `run_daemon`).
+    :param options: List of nose options (without reports)
+    :param specs: List of test specifications of the region
+    :param region: Name of the region
+    :param conf: Settings as a Python dict
+    :param execution: Number of execution
+    :param with_html: Whether to write a HTML report
+    :param adapter_url: URL of the NGSI Adapter (if any)
+    :param context_broker_url: URL of the Context Broker (if any)
+    :return: Global status of the region (None if no report was written)
+    """
+    print "Execution {} of Sanity Checks for region {}...".format(execution, region)
+    output_name = DAEMON_OUTPUT_NAME.format(region_name=region)
+    move_reports_to_history(output_name, RegionTestsLoader.history_dir)
+    console_logs = LOGGING_OUTPUT_NOVA_CONSOLE_LOG_TEMPLATE.format(region_name=region.lower(), server_id='*')
+    for filename in glob.glob(console_logs):
+        os.remove(filename)
+
+    region_options = options + ['--with-xunit', '--xunit-file={}.xml'.format(output_name)]
+    if with_html:
+        region_options += ['--with-html', '--html-report={}.html'.format(output_name)]
+    RegionTestsSelector.test_selections = specs
+    RegionTestsLoader.test_regions = [region]
+    start_time = time.time()
+    nose.run(argv=[__file__] + region_options + ['.'], testLoader=RegionTestsLoader, addplugins=[ResultFeed()])
+    elapsed_time = int((time.time() - start_time) * 1000)
+
+    status = None
+    if context_broker_url:
+        update_elapsed_time(context_broker_url, region, elapsed_time)
+    if os.path.isfile(output_name + '.xml'):
+        status = write_summary_report(conf, output_name + '.xml', output_name + '.txt', execution).get(region)
+        if adapter_url:
+            change_status(adapter_url, region, output_name + '.txt', execution)
+    return status
+
+
+class RegionTestSuite(nose.suite.ContextSuite):
+    """
+    Suite running the tests of a region (inside its fixtures) through a scheduler, which takes into account both the
+    prerequisites of tests and the resources they require. When more than one test is allowed to run at the same
+    time, tests are run in worker threads. In any case, their outcomes are recorded and then reported from this
+    thread, as neither nose results nor plugins are thread-safe.
+    """
+
+    concurrency = 1
+
+    def run(self, result):
+        from commons.fiware_cloud_test_case import FiwareTestCase
+
+        region_class = self.context
+        if not (isclass(region_class) and issubclass(region_class, FiwareTestCase)):
+            return super(RegionTestSuite, self).run(result)
+
+        if self.resultProxy:
+            result, orig = self.resultProxy(result, self), result
+        else:
+            result, orig = result, result
+        try:
+            self.setUp()
+        except KeyboardInterrupt:
+            raise
+        except:
+            self.error_context = 'setup'
+            result.addError(self, self._exc_info())
+            return
+        try:
+            tasks = []
+            for test in self._tests:
+                name = test.test._testMethodName
+                tasks.append(ScheduledTask(name, region_class.get_required_resources(name), test,
+                                           region_class.get_prerequisites(name)))
+            capacity = region_class.get_resource_capacity() if self.concurrency > 1 else {}
+            scheduler = RegionTestScheduler(region_class.logger, self.concurrency, capacity)
+            scheduler.run(tasks, execute=self.__run_test__,
+                          completed=lambda task, recorder: self.__report_test__(task.test, recorder, orig))
+        finally:
+            self.has_run = True
+            try:
+                self.tearDown()
+            except KeyboardInterrupt:
+                raise
+            except:
+                self.error_context = 'teardown'
+                result.addError(self, self._exc_info())
+
+    @staticmethod
+    def __run_test__(task):
+        """
+        Run a test (maybe in a worker thread), recording its outcomes.
+        :param task: ScheduledTask wrapping the nose test case
+        :return: The TestEventRecorder with the outcomes of the test
+        """
+        recorder = TestEventRecorder()
+        task.test.test.blocked_by = task.blocked_by
+        task.test.test.run(recorder)
+        return recorder
+
+    def __report_test__(self, test, recorder, result):
+        """
+        Report the recorded outcomes of a test, as nose would do when running it.
+        :param test: nose test case
+        :param recorder: TestEventRecorder with the outcomes of the test (None if it could not be run)
+        :param result: Test result
+        :return: True if the test passed (it either succeeded or was skipped)
+        """
+        if test.resultProxy:
+            result = test.resultProxy(result, test)
+        try:
+            test.beforeTest(result)
+            if recorder is None:
+                raise RuntimeError("Test could not be run")
+            for plugin in self.config.plugins.plugins:
+                # xUnit plugin measures test time since `beforeTest`: make it match the actual duration of the test
+                if isinstance(plugin, Xunit):
+                    plugin._timer = time.time() - recorder.duration
+                # Logcapture plugin must only report the log records of the test
+                elif isinstance(plugin, LogCapture):
+                    plugin.handler.truncate()
+                    for record in recorder.log_records:
+                        plugin.handler.handle(record)
+            recorder.replay(result)
+            return recorder.passed
+        except KeyboardInterrupt:
+            raise
+        except:
+            result.addError(test, sys.exc_info())
+            return False
+        finally:
+            test.afterTest(result)
 
 
 class RegionTestsSelector(nose.selector.Selector):
@@ -83,45 +618,94 @@ class RegionTestsLoader(nose.loader.TestLoader):
     logging_conf = None
     test_regions = None
     home_dir = None
+    history_dir = None
+    test_timeout = None
+    region_timeout = None
+    shared_test_vm = False
+    background_teardown = False
+
+    # Test classes of the regions (kept between executions, along with their auth sessions and API clients)
+    test_classes = {}
 
     def __init__(self, config=None, importer=None, workingDir=None, selector=None):
         super(RegionTestsLoader, self).__init__(config, importer, workingDir, RegionTestsSelector(config))
+        self.suiteClass = nose.suite.ContextSuiteFactory(config=self.config, suiteClass=RegionTestSuite)
 
-        with open(self.settings_file) as settings:
-            try:
-                self.conf = json.load(settings)
-            except Exception as e:
-                print "Error parsing settings file '{}': {}".format(self.settings_file, e)
-                sys.exit(-1)
-
-            region_conf = self.conf[PROPERTIES_CONFIG_REGION]
-            region_list = [str(region) for region in region_conf.keys()]
+        self.conf = read_settings(self.settings_file)
+        region_conf = self.conf[PROPERTIES_CONFIG_REGION]
+        region_list = [str(region) for region in region_conf.keys()]
 
-            # Filter out regions to test, if given at command line
-            self.test_regions = list(set(self.test_regions or region_list) & set(region_list))
+        # Filter out regions to test, if given at command line
+        self.test_regions = list(set(self.test_regions or region_list) & set(region_list))
 
-            self.regions_with_network = [
-                region for region in region_list if PROPERTIES_CONFIG_REGION_SHARED_NET in region_conf[region]
-            ]
-            self.regions_with_storage = [
-                region for region in region_list if region_conf[region].get(PROPERTIES_CONFIG_SWIFT_ENABLED, False)
-            ]
+        self.regions_with_network = [
+            region for region in region_list if PROPERTIES_CONFIG_REGION_SHARED_NET in region_conf[region]
+        ]
+        self.regions_with_storage = [
+            region for region in region_list if region_conf[region].get(PROPERTIES_CONFIG_SWIFT_ENABLED, False)
+        ]
+        self.regions_with_batch = [
+            region for region in region_list if region_conf[region].get(PROPERTIES_CONFIG_REGION_TEST_BATCH_SIZE)
+        ]
 
     def get_test_class(self, region):
+        # Test modules (and thus the libraries they need) are only loaded for the regions to test
         if region in self.regions_with_network:
+            from tests.fiware_region_with_networks_tests import FiwareRegionWithNetworkTest
             super_classes = [FiwareRegionWithNetworkTest]
         else:
+            from tests.fiware_region_without_networks_tests import FiwareRegionWithoutNetworkTest
             super_classes = [FiwareRegionWithoutNetworkTest]
 
         if region in self.regions_with_storage:
+            from tests.fiware_region_object_storage_tests import FiwareRegionsObjectStorageTests
             super_classes.append(FiwareRegionsObjectStorageTests)
 
-        return type(region, tuple(super_classes), dict(
-            region_name=region,
-            conf=self.conf,
-            home_dir=self.home_dir,
-            settings_file=self.settings_file,
-            logging_conf=self.logging_conf))
+        if region in self.regions_with_batch:
+            from tests.fiware_region_batch_tests import FiwareRegionBatchTests
+            super_classes.append(FiwareRegionBatchTests)
+
+        test_class = self.test_classes.get(region)
+        if test_class is None or test_class.__bases__ != tuple(super_classes):
+            test_class = self.test_classes[region] = type(region, tuple(super_classes), dict(
+                region_name=region,
+                test_timeout=self.test_timeout,
+                region_timeout=self.region_timeout,
+                shared_test_vm=self.shared_test_vm,
+                background_teardown=self.background_teardown,
+                home_dir=self.home_dir,
+                settings_file=self.settings_file,
+                logging_conf=self.logging_conf))
+        test_class.conf = self.conf
+        return test_class
+
+    def getTestCaseNames(self, testCaseClass):
+        names = super(RegionTestsLoader, self).getTestCaseNames(testCaseClass)
+        if RegionTestSuite.concurrency > 1 and self.history_dir:
+            names = self.sort_by_duration(testCaseClass.__name__, names)
+        return names
+
+    def sort_by_duration(self, region, names):
+        """
+        Sort the tests of a region by their duration in latest executions (as found in history), longest first, so
+        that shorter tests fill the gaps while longest ones run concurrently. Tests with no history go first, as
+        their duration is unknown.
+        :param region: Name of the region
+        :param names: List of test names
+        :return: The sorted list of test names
+        """
+        pattern = os.path.join(self.history_dir, HISTORY_REPORT_PATTERN.format(region_name=region))
+        report_files = sorted(glob.glob(pattern))[-HISTORY_MAX_REPORTS:]
+        try:
+            durations = get_test_durations(report_files, region)
+        except Exception as e:
+            print "Could not get durations of tests from history: {}".format(e)
+            return names
+
+        if durations:
+            longest = max(durations.values())
+            names = sorted(names, key=lambda name: durations.get(name, longest), reverse=True)
+        return names
 
     def loadTestsFromDir(self, path):
         test_classes = [self.get_test_class(region) for region in self.test_regions]
@@ -133,10 +717,41 @@ if __name__ == '__main__':
     # Get nose options and regions to test from command line
     parser = argparse.ArgumentParser()
     parser.add_argument('tests', metavar='test_spec', type=str, nargs='*')
+    parser.add_argument('--parallel-regions', metavar='N', type=int, default=1)
+    parser.add_argument('--region-concurrency', metavar='N', type=int, default=1)
+    parser.add_argument('--test-timeout', metavar='SECONDS', type=int, default=0)
+    parser.add_argument('--region-timeout', metavar='SECONDS', type=int, default=0)
+    parser.add_argument('--shared-test-vm', action='store_true')
+    parser.add_argument('--background-teardown', action='store_true')
+    parser.add_argument('--daemon-interval', metavar='SECONDS', type=int, default=0)
+    parser.add_argument('--daemon-schedule', metavar='SCHEDULE', type=str, default=DAEMON_SCHEDULE_PASSES,
+                        choices=[DAEMON_SCHEDULE_PASSES, DAEMON_SCHEDULE_STALENESS])
+    parser.add_argument('--coordinator', metavar='[HOST:]PORT', type=str)
+    parser.add_argument('--worker', metavar='HOST:PORT', type=str)
+    parser.add_argument('--rerun-failed', metavar='XUNIT_FILE', type=str)
     args, options = parser.parse_known_args()
+    if args.rerun_failed and args.daemon_interval > 0:
+        parser.error("argument --rerun-failed not allowed in daemon mode")
+    if args.worker and (args.coordinator or args.rerun_failed or args.daemon_interval > 0):
+        parser.error("argument --worker not allowed along with --coordinator, --rerun-failed or --daemon-interval")
+
+    # Work queue is served over TCP and messages are pickled: a secret key must be given to authenticate the peers
+    authkey = os.environ.get('FIHEALTH_WORK_QUEUE_AUTHKEY')
+    if (args.coordinator or args.worker) and not authkey:
+        parser.error("arguments --coordinator and --worker require a secret key in $FIHEALTH_WORK_QUEUE_AUTHKEY")
+
+    # Only failed tests (in the given regions) are run again; the previous report is read in advance, as the new one
+    # may overwrite it
+    if args.rerun_failed:
+        with open(args.rerun_failed) as previous_report_file:
+            previous_report = previous_report_file.read()
+        failed_tests = [test for test in get_failed_tests(StringIO(previous_report))
+                        if get_failed_test_specs([test], args.tests)]
+        args.tests = get_failed_test_specs(failed_tests, args.tests)
+        print "Tests to run again: {}".format(' '.join(args.tests) or 'none')
     argv = [__file__] + options + ['.']
     RegionTestsSelector.test_selections = args.tests
-    RegionTestsLoader.test_regions = [re.sub(r'^(\w+)\.\S+$', '\g<1>', test) for test in args.tests]
+    RegionTestsLoader.test_regions = [get_region_of_test_spec(test) for test in args.tests]
 
     # Configuration files
     default_settings_file = os.path.join(parentdir, DEFAULT_SETTINGS_FILE)
@@ -144,6 +759,45 @@ if __name__ == '__main__':
     RegionTestsLoader.settings_file = os.environ.get('SANITY_CHECKS_SETTINGS', default_settings_file)
     RegionTestsLoader.logging_conf = os.environ.get('SANITY_CHECKS_LOGGING', default_logging_conf)
     RegionTestsLoader.home_dir = parentdir
+    RegionTestsLoader.history_dir = os.environ.get('FIHEALTH_HISTORY')
+    RegionTestsLoader.test_timeout = args.test_timeout
+    RegionTestsLoader.region_timeout = args.region_timeout
+    RegionTestsLoader.shared_test_vm = args.shared_test_vm
+    RegionTestsLoader.background_teardown = args.background_teardown
+    RegionTestSuite.concurrency = max(1, args.region_concurrency)
+
+    # Run tests (either forever, in workers at other hosts, in parallel worker processes or in this one)
+    worker_options = ['--region-concurrency={}'.format(RegionTestSuite.concurrency),
+                      '--test-timeout={}'.format(args.test_timeout),
+                      '--region-timeout={}'.format(args.region_timeout)] + options
+    if args.shared_test_vm:
+        worker_options.append('--shared-test-vm')
+    if args.background_teardown:
+        worker_options.append('--background-teardown')
+    if args.daemon_interval > 0:
+        run_daemon(options, args.tests, args.daemon_interval, args.daemon_schedule)
+    elif args.worker:
+        sys.exit(run_worker(worker_options, args.worker, authkey))
+    elif not args.rerun_failed:
+        if args.coordinator:
+            sys.exit(run_coordinator(options, args.tests, args.coordinator, authkey))
+        elif args.parallel_regions > 1:
+            sys.exit(run_regions_in_parallel(worker_options, args.tests, args.parallel_regions))
+        nose.main(argv=argv, testLoader=RegionTestsLoader, addplugins=[ResultFeed()])
 
-    # Run tests
-    nose.main(argv=argv, testLoader=RegionTestsLoader)
+    # Run failed tests again (if any), then update the outcomes of the previous report into the new one
+    xunit_file = pop_option(list(options), '--xunit-file') or ('--with-xunit' in options and DEFAULT_XUNIT_FILE)
+    result_code = 0
+    if args.tests and args.coordinator:
+        result_code = run_coordinator(options, args.tests, args.coordinator, authkey)
+    elif args.tests and args.parallel_regions > 1:
+        result_code = run_regions_in_parallel(worker_options, args.tests, args.parallel_regions)
+    elif args.tests:
+        result_code = 0 if nose.run(argv=argv, testLoader=RegionTestsLoader, addplugins=[ResultFeed()]) else 1
+    if args.tests and xunit_file and os.path.isfile(xunit_file):
+        print "Updating outcomes of previous report {} into {}".format(args.rerun_failed, xunit_file)
+        update_report(StringIO(previous_report), xunit_file, failed_tests)
+    elif xunit_file:
+        with open(xunit_file, 'w') as report:
+            report.write(previous_report)
+    sys.exit(result_code)